@@ -0,0 +1,274 @@
+"""
+Benchmark every API endpoint and compare with a JSON baseline
+"""
+import gc
+import json
+import logging
+import re
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils import timezone
+
+from appointments.models import Appointment, SlotHold
+from doctors.models import DoctorPatientAssignment, DoctorProfile, ScheduleException
+from healthcare_backend.synthetic import SyntheticData
+from lab_reports.models import LabReport, LabTestParameter
+from lab_reports.previews import PREVIEW_SIZES
+from patients.models import MedicalHistory
+from prescriptions.models import Medicine, Prescription
+
+User = get_user_model()
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'api_baseline.json'
+
+
+def _patterns(resolver, prefix=''):
+    """(route, URLPattern) of every endpoint below a resolver"""
+    for pattern in resolver.url_patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from _patterns(pattern, route)
+        elif isinstance(pattern, URLPattern):
+            yield route, pattern
+
+
+def _url(route, values):
+    """route with its <converter:name> parts replaced by values[name]"""
+    return '/' + re.sub(r'<(?:\w+:)?(\w+)>', lambda match: str(values[match[1]]), route)
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Call every GET endpoint of the API as a doctor or a patient and record "
+        "query count, p50/p95 latency and response size. Compares the results "
+        "with a JSON baseline and fails on regressions beyond the thresholds. "
+        "Latencies depend on the machine and the data: make the baseline where "
+        "it is checked, on the same data set."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+        parser.add_argument('--update-baseline', action='store_true',
+                            help="Write the results as the new baseline instead of comparing")
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', help="Only endpoints whose route contains this text")
+        parser.add_argument('--p50-threshold', type=float, default=1.5,
+                            help="Allowed p50 latency growth factor (default 1.5)")
+        parser.add_argument('--p95-threshold', type=float, default=2.0,
+                            help="Allowed p95 latency growth factor (default 2)")
+        parser.add_argument('--latency-slack', type=float, default=5.0,
+                            help="Milliseconds of latency growth always allowed (default 5)")
+        parser.add_argument('--bytes-threshold', type=float, default=1.2,
+                            help="Allowed response size growth factor (default 1.2)")
+        parser.add_argument('--generate', action='store_true',
+                            help="Write synthetic data first (see --doctors and --patients)")
+        parser.add_argument('--doctors', type=int, default=20)
+        parser.add_argument('--patients', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['generate']:
+            try:
+                counts = SyntheticData(options['seed'], log=self.stdout.write).generate(
+                    doctors=options['doctors'], patients=options['patients']
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"Wrote {sum(counts.values())} rows")
+
+        subject = self._subject()
+        results, requests, skipped = {}, {}, []
+        # 4xx answers are expected for some endpoints; keep them out of the output
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        for route, pattern in _patterns(get_resolver()):
+            if route.startswith('admin/') or (options['only'] and options['only'] not in route):
+                continue
+            methods = getattr(getattr(pattern.callback, 'cls', None), 'http_method_names', ())
+            if 'get' not in methods:
+                skipped.append(route)
+                continue
+            if any(subject.get(name) is None for name in pattern.pattern.converters):
+                skipped.append(route)
+                continue
+            key = f'GET /{route}'
+            requests[key] = (_url(route, subject), subject['query'].get(pattern.name, {}))
+            results[key] = self._measure(*requests[key], subject, options)
+
+        self.stdout.write(f"{len(results)} endpoints measured, {len(skipped)} skipped (no GET or no sample object)")
+        for key, result in sorted(results.items()):
+            self.stdout.write(
+                f"{key:72} {result['role']:7} {result['status']:3} {result['queries']:4} q "
+                f"p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  {result['bytes']:8} B"
+            )
+
+        if options['update_baseline']:
+            options['baseline'].parent.mkdir(parents=True, exist_ok=True)
+            options['baseline'].write_text(json.dumps({
+                'created_at': timezone.now().isoformat(),
+                'iterations': options['iterations'],
+                'endpoints': results,
+            }, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        if not options['baseline'].exists():
+            raise CommandError(f"No baseline at {options['baseline']}; run with --update-baseline first")
+        baseline = json.loads(options['baseline'].read_text())['endpoints']
+        regressions = self._compare(baseline, results, options, requests, subject)
+        if regressions:
+            for line in regressions:
+                self.stdout.write(self.style.ERROR(line))
+            raise CommandError(f"{len(regressions)} regressions against {options['baseline']}")
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
+
+    def _subject(self):
+        """
+        A doctor and an assigned patient with records of every kind, and the
+        values to fill each URL parameter and query string with
+        """
+        assignments = DoctorPatientAssignment.objects.filter(
+            is_active=True,
+            doctor__doctor_profile__isnull=False,
+            patient__patient_profile__isnull=False
+        ).order_by('id').values_list('doctor_id', 'patient_id')[:200]
+        for doctor_id, patient_id in assignments:
+            report = LabReport.objects.filter(patient_id=patient_id).order_by('id').first()
+            prescription = Prescription.objects.filter(patient_id=patient_id).order_by('id').first()
+            if report and prescription:
+                break
+        else:
+            raise CommandError(
+                "No assigned doctor and patient with lab reports and prescriptions; "
+                "load data or run with --generate"
+            )
+
+        parameters = list(LabTestParameter.objects.filter(lab_report=report).order_by(
+            'parameter_name'
+        ).values_list('parameter_name', flat=True)[:2])
+        next_weekday = date.today() + timedelta(days=1)
+        while next_weekday.weekday() >= 5:
+            next_weekday += timedelta(days=1)
+        profile = DoctorProfile.objects.get(user_id=doctor_id)
+        exception = ScheduleException.objects.filter(profile=profile).order_by('id').first()
+        hold = SlotHold.objects.filter(patient_id=patient_id).first()
+        appointment = Appointment.objects.filter(patient_id=patient_id, doctor_id=doctor_id).order_by('id').first()
+        history = MedicalHistory.objects.filter(patient_id=patient_id).order_by('id').first()
+        medicine = Medicine.objects.filter(prescription=prescription).order_by('id').first()
+        return {
+            'doctor': User.objects.get(id=doctor_id),
+            'patient': User.objects.get(id=patient_id),
+            'doctor_id': doctor_id,
+            'patient_id': patient_id,
+            'report_id': report.id,
+            'prescription_id': prescription.id,
+            'medicine_id': medicine and medicine.id,
+            'appointment_id': appointment and appointment.id,
+            'history_id': history and history.id,
+            'exception_id': exception and exception.id,
+            'token': hold and hold.token,
+            'size': next(iter(PREVIEW_SIZES)),
+            'query': {
+                'available-slots': {'date': next_weekday.isoformat()},
+                'search-availability': {'specialization': profile.specialization},
+                'search-doctors': {'specialization': profile.specialization},
+                'visualize-parameter-trend': {'parameter': parameters[:1]},
+                'parameter-trend-image': {'parameter': parameters[:1]},
+                'parameter-statistics': {'parameter': parameters[:1]},
+                'visualize-multiple-parameters': {'parameter': parameters},
+                'parameter-trend-data': {'parameter': parameters},
+            },
+        }
+
+    def _client(self, user):
+        host = next((host for host in settings.ALLOWED_HOSTS if host not in ('*', '') and not host.startswith('.')), 'localhost')
+        # Server errors are results to record, not exceptions to stop on
+        client = Client(raise_request_exception=False, HTTP_HOST=host)
+        client.force_login(user)
+        return client
+
+    def _get(self, client, url, query):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        # A wrapper rather than connection.queries, which every request resets
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            response = client.get(url, query)
+            size = len(b''.join(response.streaming_content) if response.streaming else response.content)
+            elapsed = (time.perf_counter() - started) * 1000
+        return response.status_code, queries, elapsed, size
+
+    def _measure(self, url, query, subject, options):
+        # Patients first; endpoints that refuse them are doctor endpoints
+        role = 'patient'
+        client = self._client(subject['patient'])
+        status, *_ = self._get(client, url, query)
+        if status == 403:
+            role = 'doctor'
+            client = self._client(subject['doctor'])
+        for _ in range(options['warmup']):
+            self._get(client, url, query)
+
+        # Garbage left by earlier endpoints is not this one's cost
+        gc.collect()
+        runs = [self._get(client, url, query) for _ in range(max(options['iterations'], 1))]
+        latencies = [elapsed for _, _, elapsed, _ in runs]
+        status, queries, _, size = runs[-1]
+        return {
+            'role': role,
+            'status': status,
+            'queries': max(queries for _, queries, _, _ in runs),
+            'p50_ms': round(_percentile(latencies, 0.5), 3),
+            'p95_ms': round(_percentile(latencies, 0.95), 3),
+            'bytes': size,
+        }
+
+    def _slower(self, old, result, options):
+        """'p50 a -> b ms' for each percentile that grew beyond its threshold"""
+        return [
+            f"{percentile} {old[f'{percentile}_ms']:.2f} -> {result[f'{percentile}_ms']:.2f} ms"
+            for percentile in ('p50', 'p95')
+            if result[f'{percentile}_ms'] > (
+                old[f'{percentile}_ms'] * options[f'{percentile}_threshold'] + options['latency_slack']
+            )
+        ]
+
+    def _compare(self, baseline, results, options, requests, subject):
+        regressions = []
+        for key, result in sorted(results.items()):
+            old = baseline.get(key)
+            if old is None:
+                self.stdout.write(f"{key}: new endpoint, not in the baseline")
+                continue
+            if result['status'] != old['status']:
+                regressions.append(f"{key}: status {old['status']} -> {result['status']}")
+            if result['queries'] > old['queries']:
+                regressions.append(f"{key}: {old['queries']} -> {result['queries']} queries")
+            if self._slower(old, result, options):
+                # A slow run can be noise; it counts when the next one is slow too
+                result = results[key] = self._measure(*requests[key], subject, options)
+                regressions.extend(f"{key}: {change}" for change in self._slower(old, result, options))
+            if result['bytes'] > old['bytes'] * options['bytes_threshold']:
+                regressions.append(f"{key}: {old['bytes']} -> {result['bytes']} bytes")
+        for key in sorted(set(baseline) - set(results)):
+            if not options['only']:
+                self.stdout.write(f"{key}: in the baseline but not measured")
+        return regressions
@@ -0,0 +1,95 @@
+"""
+Fill the database with a large synthetic data set
+"""
+from datetime import date
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from healthcare_backend.synthetic import LAB_PANELS, SyntheticData
+
+
+class Command(BaseCommand):
+    help = (
+        "Write a deterministic synthetic data set: doctors, their patients and "
+        "the patients' appointments, prescriptions, lab reports and medical "
+        "history, with realistic skew. The defaults make about 10 million rows. "
+        "Pass --today to get identical rows on every run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=2000)
+        parser.add_argument('--patients-per-doctor', type=float, default=100,
+                            help="Average panel size; panels vary log-normally around it")
+        parser.add_argument('--appointments-per-patient', type=float, default=6)
+        parser.add_argument('--prescriptions-per-patient', type=float, default=2)
+        parser.add_argument('--reports-per-patient', type=float, default=4,
+                            help="Average lab reports per patient (report density)")
+        parser.add_argument('--parameters-per-report', type=float,
+                            help="Average results per lab report (default: the panel's size)")
+        parser.add_argument('--history-per-patient', type=float, default=2)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--today', type=date.fromisoformat,
+                            help="Anchor date for all dates, YYYY-MM-DD (default: the current date)")
+        parser.add_argument('--chunk-size', type=int, default=10000, help="Rows per INSERT batch")
+        parser.add_argument('--dry-run', action='store_true', help="Only print the expected row counts")
+
+    def handle(self, *args, **options):
+        if options['doctors'] < 1 or options['patients_per_doctor'] <= 0:
+            raise CommandError("--doctors and --patients-per-doctor must be positive")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive")
+
+        patients = round(options['doctors'] * options['patients_per_doctor'])
+        expected = self._expected(options, patients)
+        self.stdout.write(f"{options['doctors']} doctors, {patients} patients, about {sum(expected.values())} rows and the lab parameter catalog:")
+        for name, rows in expected.items():
+            self.stdout.write(f"  {name:22} {rows:>12}")
+        if options['dry_run']:
+            return
+
+        started = perf_counter()
+        writer = SyntheticData(
+            options['seed'], chunk_size=options['chunk_size'], log=self.stdout.write, today=options['today']
+        )
+        try:
+            counts = writer.generate(
+                doctors=options['doctors'],
+                patients=patients,
+                appointments=options['appointments_per_patient'],
+                prescriptions=options['prescriptions_per_patient'],
+                reports=options['reports_per_patient'],
+                parameters=options['parameters_per_report'],
+                history=options['history_per_patient']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        elapsed = perf_counter() - started
+        total = sum(counts.values())
+        for label, rows in sorted(counts.items()):
+            self.stdout.write(f"  {label:36} {rows:>12}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {total} rows in {elapsed:.0f}s ({total / max(elapsed, 1e-6):.0f} rows/s)"
+        ))
+
+    def _expected(self, options, patients):
+        """Approximate rows per kind of record"""
+        weights = [weight for *_, weight in LAB_PANELS]
+        panel_size = sum(len(names) * weight for _, _, names, weight in LAB_PANELS) / sum(weights)
+        reports = patients * options['reports_per_patient']
+        appointments = patients * options['appointments_per_patient']
+        prescriptions = patients * options['prescriptions_per_patient']
+        expected = {
+            # Users and profiles, one each per person
+            'people': 2 * (options['doctors'] + patients),
+            'assignments': patients,
+            # Active future appointments claim their slot in 5-minute blocks
+            'appointments': appointments * 1.67,
+            # About two medicines each
+            'prescriptions': prescriptions * 3.05,
+            'lab reports': reports,
+            'lab results': reports * (options['parameters_per_report'] or panel_size),
+            'history entries': patients * options['history_per_patient'],
+        }
+        return {name: round(rows) for name, rows in expected.items()}
@@ -1,8 +1,9 @@
 """
 Admin configuration for Appointment model
 """
-from django.contrib import admin
-from .models import Appointment
+from django.contrib import admin, messages
+from .booking import SlotTaken, save_booking
+from .models import Appointment, SlotHold
 
 @admin.register(Appointment)
 class AppointmentAdmin(admin.ModelAdmin):
@@ -30,14 +31,38 @@ class AppointmentAdmin(admin.ModelAdmin):
     
     actions = ['mark_confirmed', 'mark_completed', 'mark_cancelled']
     
+    def _set_status(self, request, queryset, status):
+        # Saved one by one so slot claims follow the status
+        conflicts = 0
+        for appointment in queryset:
+            appointment.status = status
+            try:
+                save_booking(appointment.save)
+            except SlotTaken:
+                conflicts += 1
+        if conflicts:
+            self.message_user(
+                request,
+                f"{conflicts} appointment(s) overlap another booking and were left unchanged",
+                messages.WARNING
+            )
+    
     def mark_confirmed(self, request, queryset):
-        queryset.update(status='CONFIRMED')
+        self._set_status(request, queryset, 'CONFIRMED')
     mark_confirmed.short_description = "Mark selected as Confirmed"
     
     def mark_completed(self, request, queryset):
-        queryset.update(status='COMPLETED')
+        self._set_status(request, queryset, 'COMPLETED')
     mark_completed.short_description = "Mark selected as Completed"
     
     def mark_cancelled(self, request, queryset):
-        queryset.update(status='CANCELLED')
-    mark_cancelled.short_description = "Mark selected as Cancelled"
\ No newline at end of file
+        self._set_status(request, queryset, 'CANCELLED')
+    mark_cancelled.short_description = "Mark selected as Cancelled"
+
+
+@admin.register(SlotHold)
+class SlotHoldAdmin(admin.ModelAdmin):
+    list_display = ['doctor', 'patient', 'appointment_date', 'appointment_time', 'expires_at']
+    list_filter = ['appointment_date']
+    search_fields = ['patient__username', 'doctor__username']
+    readonly_fields = ['token', 'created_at']
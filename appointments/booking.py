@@ -0,0 +1,144 @@
+"""
+Race-free Appointment Booking
+An active appointment claims every CLAIM_MINUTES block of the doctor's day
+it touches, one AppointmentSlotClaim row per block. The claims are written
+in the same transaction as the appointment, so of two overlapping bookings
+made at the same moment the database accepts exactly one; the other gets
+SlotTaken, which views answer with 409 Conflict.
+
+Claims are kept in step with appointments by a post_save signal, and
+Appointment.save() runs in a transaction, so a conflict rolls the whole
+save back however the appointment is saved. save_booking() also turns a
+clash on the appointment row itself into SlotTaken and can release a hold.
+
+A slot hold claims its blocks the same way for a few minutes, so the
+patient who picked a slot can finish booking it. Booking with the hold's
+token hands its blocks to the appointment in one transaction. Expired
+holds stop blocking at once; their rows are deleted before the doctor's
+day is next claimed, and by sweep_expired_holds().
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import AppointmentSlotClaim, SlotHold
+from .slots import BLOCKING_STATUSES
+
+CLAIM_MINUTES = 5
+
+DEFAULT_HOLD_TTL = 5 * 60
+
+SLOT_TAKEN_MESSAGE = "This time slot is already booked or held for this doctor"
+
+
+class SlotTaken(Exception):
+    """Raised when an appointment overlaps one that holds the time"""
+
+
+def _block_starts(start_time, duration):
+    start = start_time.hour * 60 + start_time.minute
+    end = min(start + max(duration, 1), 24 * 60)
+    return range(start - start % CLAIM_MINUTES, end, CLAIM_MINUTES)
+
+
+def claimed_minutes(appointment):
+    """
+    Start minutes of the blocks an appointment holds
+    Times off the CLAIM_MINUTES grid claim the blocks they partly cover
+    """
+    if appointment.status not in BLOCKING_STATUSES:
+        return range(0)
+    return _block_starts(appointment.appointment_time, appointment.duration_minutes)
+
+
+def _write_claims(doctor_id, day, minutes, **owner):
+    # Expired holds on this day must not block the new claims
+    SlotHold.objects.filter(
+        doctor_id=doctor_id,
+        appointment_date=day,
+        expires_at__lte=timezone.now()
+    ).delete()
+    AppointmentSlotClaim.objects.bulk_create([
+        AppointmentSlotClaim(doctor_id=doctor_id, date=day, minute=minute, **owner)
+        for minute in minutes
+    ])
+
+
+def claim_slots(appointment):
+    """Replace an appointment's claims with those of its current time and status"""
+    try:
+        with transaction.atomic():
+            AppointmentSlotClaim.objects.filter(appointment=appointment).delete()
+            _write_claims(
+                appointment.doctor_id,
+                appointment.appointment_date,
+                claimed_minutes(appointment),
+                appointment=appointment
+            )
+    except IntegrityError:
+        raise SlotTaken(SLOT_TAKEN_MESSAGE)
+
+
+def save_booking(save, *args, hold=None, **kwargs):
+    """
+    Call save (a serializer's or model's save method) in a transaction
+    A given SlotHold is released in the same transaction, so its time
+    passes straight to the appointment. Returns save's result; raises
+    SlotTaken and rolls back if the appointment overlaps another
+    """
+    try:
+        with transaction.atomic():
+            if hold is not None:
+                hold.delete()
+            return save(*args, **kwargs)
+    except IntegrityError:
+        # The appointment row itself hit appointment_active_time_uniq
+        raise SlotTaken(SLOT_TAKEN_MESSAGE)
+
+
+def hold_ttl():
+    return getattr(settings, 'APPOINTMENT_HOLDS', {}).get('TTL', DEFAULT_HOLD_TTL)
+
+
+def hold_slot(patient, doctor_id, day, start_time, duration):
+    """
+    Reserve a slot for a patient for hold_ttl() seconds
+    A patient keeps one hold per doctor: a new one replaces the last.
+    Raises SlotTaken if the time is booked or held by someone else
+    """
+    try:
+        with transaction.atomic():
+            SlotHold.objects.filter(patient=patient, doctor_id=doctor_id).delete()
+            hold = SlotHold.objects.create(
+                doctor_id=doctor_id,
+                patient=patient,
+                appointment_date=day,
+                appointment_time=start_time,
+                duration_minutes=duration,
+                expires_at=timezone.now() + timedelta(seconds=hold_ttl())
+            )
+            _write_claims(doctor_id, day, _block_starts(start_time, duration), hold=hold)
+    except IntegrityError:
+        raise SlotTaken(SLOT_TAKEN_MESSAGE)
+    return hold
+
+
+def patient_hold(patient, doctor_id, token=None):
+    """
+    The hold a booking by patient with a doctor takes over: the one with
+    token if given, else the patient's hold on that doctor. None if there is
+    none or it expired
+    """
+    holds = SlotHold.objects.filter(patient=patient, expires_at__gt=timezone.now())
+    if token is not None:
+        return holds.filter(token=token).first()
+    return holds.filter(doctor_id=doctor_id).first()
+
+
+def sweep_expired_holds():
+    """Delete expired holds and their claims; returns how many were deleted"""
+    return SlotHold.objects.filter(expires_at__lte=timezone.now()).delete()[1].get(
+        SlotHold._meta.label, 0
+    )
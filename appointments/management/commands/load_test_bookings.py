@@ -0,0 +1,155 @@
+"""
+Fire concurrent bookings at the same slots and check none overlap
+"""
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from appointments.models import Appointment
+from appointments.slots import BLOCKING_STATUSES, available_slots
+from appointments.views import create_appointment
+from doctors.models import DoctorProfile
+from doctors.schedule import get_schedule
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Book the same few slots of one doctor from many threads at once and "
+        "verify that exactly one booking wins each contested time. Creates "
+        "temporary patients; run it against a development or staging database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', type=int,
+                            help="Doctor user id (default: the first doctor with a profile)")
+        parser.add_argument('--date', type=date.fromisoformat,
+                            help="YYYY-MM-DD (default: the doctor's next working day)")
+        parser.add_argument('--requests', type=int, default=300)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--slots', type=int, default=5,
+                            help="Number of adjacent slots all requests compete for")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true',
+                            help="Keep the temporary patients and their bookings")
+
+    def handle(self, *args, **options):
+        doctor_id = options['doctor'] or DoctorProfile.objects.order_by('id').values_list(
+            'user_id', flat=True
+        ).first()
+        if doctor_id is None:
+            raise CommandError("No doctor profiles found")
+        schedule = get_schedule(doctor_id)
+
+        day, starts = self._target_slots(doctor_id, options['date'], options['slots'])
+        self.stdout.write(
+            f"Doctor {doctor_id} on {day}: {options['requests']} bookings for "
+            f"{len(starts)} slots from {options['concurrency']} threads"
+        )
+
+        tag = uuid.uuid4().hex[:8]
+        patients = User.objects.bulk_create([
+            User(username=f'loadtest-{tag}-{i}', role='PATIENT', password='!')
+            for i in range(options['concurrency'])
+        ])
+        patients = list(User.objects.filter(username__startswith=f'loadtest-{tag}-'))
+
+        rng = random.Random(options['seed'])
+        # Durations of one or two slots, so bookings also overlap partially
+        requests = [
+            (
+                patients[i % len(patients)],
+                rng.choice(starts),
+                schedule.slot_minutes * rng.choice((1, 2)),
+            )
+            for i in range(options['requests'])
+        ]
+
+        barrier = threading.Barrier(options['concurrency'])
+        factory = APIRequestFactory()
+
+        def book(args):
+            patient, start, duration = args
+            try:
+                barrier.wait(timeout=1)
+            except threading.BrokenBarrierError:
+                pass
+            request = factory.post('/api/appointments/create/', {
+                'patient': patient.id,
+                'doctor': doctor_id,
+                'appointment_date': day.isoformat(),
+                'appointment_time': start.strftime('%H:%M'),
+                'duration_minutes': duration,
+                'reason': 'Load test',
+            }, format='json')
+            force_authenticate(request, user=patient)
+            started = time.perf_counter()
+            try:
+                outcome = create_appointment(request).status_code
+            except Exception as e:
+                outcome = type(e).__name__
+            finally:
+                connection.close()
+            return outcome, (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(book, requests))
+        elapsed = time.perf_counter() - started
+
+        outcomes = Counter(outcome for outcome, _ in results)
+        latencies = sorted(latency for _, latency in results)
+        for outcome, count in sorted(outcomes.items(), key=str):
+            self.stdout.write(f"  {outcome}: {count}")
+        self.stdout.write(
+            f"{len(results) / elapsed:.0f} bookings/s, p50 {latencies[len(latencies) // 2]:.1f} ms, "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms"
+        )
+
+        overlaps = self._overlaps(doctor_id, day)
+        try:
+            if overlaps:
+                raise CommandError(f"{overlaps} overlapping bookings were accepted")
+            unexpected = {outcome for outcome in outcomes if outcome not in (201, 409)}
+            if unexpected:
+                raise CommandError(f"Unexpected outcomes: {sorted(unexpected, key=str)}")
+            self.stdout.write(self.style.SUCCESS(
+                f"{outcomes[201]} bookings accepted, no overlaps"
+            ))
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__startswith=f'loadtest-{tag}-').delete()
+
+    def _target_slots(self, doctor_id, day, count):
+        """The first count free slots of the given day or the next working day"""
+        first = day or date.today() + timedelta(days=1)
+        last = day or first + timedelta(days=30)
+        for slot_day, times in available_slots(doctor_id, first, last).items():
+            if len(times) >= count:
+                return slot_day, times[:count]
+        raise CommandError(f"No day with {count} free slots found")
+
+    def _overlaps(self, doctor_id, day):
+        bookings = Appointment.objects.filter(
+            doctor_id=doctor_id,
+            appointment_date=day,
+            status__in=BLOCKING_STATUSES
+        ).order_by('appointment_time').values_list('appointment_time', 'duration_minutes')
+        overlaps = 0
+        busy_until = -1
+        for start_time, duration in bookings:
+            start = start_time.hour * 60 + start_time.minute
+            if start < busy_until:
+                overlaps += 1
+            busy_until = max(busy_until, start + duration)
+        return overlaps
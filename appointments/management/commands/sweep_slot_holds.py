@@ -0,0 +1,28 @@
+"""
+Delete expired slot holds
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from appointments.booking import sweep_expired_holds
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired slot holds and their claims. Expired holds already "
+        "stop blocking their slots; this keeps the tables small."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll', type=float,
+                            help="Keep running, sweeping every POLL seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            swept = sweep_expired_holds()
+            if swept or not options['poll']:
+                self.stdout.write(self.style.SUCCESS(f"Deleted {swept} expired holds"))
+            if not options['poll']:
+                break
+            time.sleep(options['poll'])
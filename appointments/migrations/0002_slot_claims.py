@@ -0,0 +1,88 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Frozen copy of appointments.booking, so later changes there do not
+# change what this migration does
+CLAIM_MINUTES = 5
+
+
+def claimed_minutes(appointment):
+    time = appointment.appointment_time
+    start = time.hour * 60 + time.minute
+    end = min(start + max(appointment.duration_minutes, 1), 24 * 60)
+    return range(start - start % CLAIM_MINUTES, end, CLAIM_MINUTES)
+
+
+def claim_booked_slots(apps, schema_editor):
+    """
+    Claim the time of existing active appointments
+    Bookings made before overlaps were checked may overlap; the earlier
+    booking keeps the shared blocks
+    """
+    Appointment = apps.get_model('appointments', 'Appointment')
+    AppointmentSlotClaim = apps.get_model('appointments', 'AppointmentSlotClaim')
+    appointments = Appointment.objects.filter(status__in=['PENDING', 'CONFIRMED']).order_by('id')
+    claims = []
+    for appointment in appointments.iterator():
+        claims.extend(
+            AppointmentSlotClaim(
+                doctor_id=appointment.doctor_id,
+                appointment_id=appointment.id,
+                date=appointment.appointment_date,
+                minute=minute
+            )
+            for minute in claimed_minutes(appointment)
+        )
+        if len(claims) >= 1000:
+            AppointmentSlotClaim.objects.bulk_create(claims, ignore_conflicts=True)
+            claims = []
+    AppointmentSlotClaim.objects.bulk_create(claims, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('appointments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentSlotClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('minute', models.PositiveSmallIntegerField(help_text='Start of the block, in minutes since midnight')),
+            ],
+            options={
+                'verbose_name': 'Appointment Slot Claim',
+                'verbose_name_plural': 'Appointment Slot Claims',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='appointment',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['PENDING', 'CONFIRMED'])), fields=('doctor', 'appointment_date', 'appointment_time'), name='appointment_active_time_uniq'),
+        ),
+        migrations.AddField(
+            model_name='appointmentslotclaim',
+            name='appointment',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_claims', to='appointments.appointment'),
+        ),
+        migrations.AddField(
+            model_name='appointmentslotclaim',
+            name='doctor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_claims', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='appointmentslotclaim',
+            constraint=models.UniqueConstraint(fields=('doctor', 'date', 'minute'), name='slotclaim_doctor_minute_uniq'),
+        ),
+        migrations.RunPython(claim_booked_slots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('appointments', '0002_slot_claims'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('appointment_date', models.DateField()),
+                ('appointment_time', models.TimeField()),
+                ('duration_minutes', models.PositiveIntegerField(default=30)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Slot Hold',
+                'verbose_name_plural': 'Slot Holds',
+            },
+        ),
+        migrations.AlterField(
+            model_name='appointmentslotclaim',
+            name='appointment',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='slot_claims', to='appointments.appointment'),
+        ),
+        migrations.AddField(
+            model_name='slothold',
+            name='doctor',
+            field=models.ForeignKey(limit_choices_to={'role': 'DOCTOR'}, on_delete=django.db.models.deletion.CASCADE, related_name='slot_holds_as_doctor', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='slothold',
+            name='patient',
+            field=models.ForeignKey(limit_choices_to={'role': 'PATIENT'}, on_delete=django.db.models.deletion.CASCADE, related_name='slot_holds', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='appointmentslotclaim',
+            name='hold',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='slot_claims', to='appointments.slothold'),
+        ),
+        migrations.AddIndex(
+            model_name='slothold',
+            index=models.Index(fields=['doctor', 'appointment_date'], name='slothold_doctor_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointmentslotclaim',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('appointment__isnull', False), ('hold__isnull', True)), models.Q(('appointment__isnull', True), ('hold__isnull', False)), _connector='OR'), name='slotclaim_single_owner'),
+        ),
+    ]
@@ -1,7 +1,9 @@
 """
 Appointment Management Models
 """
-from django.db import models
+import uuid
+
+from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
 
@@ -48,17 +50,120 @@ class Appointment(models.Model):
     def __str__(self):
         return f"{self.patient.username} with Dr. {self.doctor.username} on {self.appointment_date}"
     
+    def save(self, *args, **kwargs):
+        """
+        Saved in a transaction with its slot claims, so a save that would
+        overlap another booking raises SlotTaken and leaves no row behind
+        """
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
     @property
     def is_past(self):
         """Check if appointment date/time has passed"""
-        appointment_datetime = timezone.datetime.combine(
+        appointment_datetime = timezone.make_aware(timezone.datetime.combine(
             self.appointment_date, 
             self.appointment_time
-        )
+        ))
         return appointment_datetime < timezone.now()
     
     class Meta:
         verbose_name = "Appointment"
         verbose_name_plural = "Appointments"
         ordering = ['-appointment_date', '-appointment_time']
-        unique_together = ['doctor', 'appointment_date', 'appointment_time']
\ No newline at end of file
+        indexes = [
+            models.Index(fields=['patient', 'appointment_date', 'appointment_time'], name='appt_patient_date_idx'),
+            models.Index(fields=['doctor', 'appointment_date', 'appointment_time'], name='appt_doctor_date_idx'),
+        ]
+        constraints = [
+            # Cancelled and completed appointments do not hold their time
+            models.UniqueConstraint(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                condition=models.Q(status__in=['PENDING', 'CONFIRMED']),
+                name='appointment_active_time_uniq'
+            ),
+        ]
+
+
+class SlotHold(models.Model):
+    """
+    A short-lived reservation of a slot while a patient completes booking
+    Holds past expires_at no longer block the slot and are deleted by the
+    sweeper or by the next booking of the same doctor and day
+    """
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    doctor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='slot_holds_as_doctor',
+        limit_choices_to={'role': 'DOCTOR'}
+    )
+    patient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='slot_holds',
+        limit_choices_to={'role': 'PATIENT'}
+    )
+    appointment_date = models.DateField()
+    appointment_time = models.TimeField()
+    duration_minutes = models.PositiveIntegerField(default=30)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Hold for {self.patient_id} with Dr. {self.doctor_id} on {self.appointment_date} {self.appointment_time}"
+    
+    class Meta:
+        verbose_name = "Slot Hold"
+        verbose_name_plural = "Slot Holds"
+        indexes = [
+            models.Index(fields=['doctor', 'appointment_date'], name='slothold_doctor_date_idx'),
+        ]
+
+
+class AppointmentSlotClaim(models.Model):
+    """
+    One CLAIM_MINUTES block of a doctor's day held by an active appointment
+    or a slot hold
+    The unique constraint makes the database reject overlapping bookings,
+    however many are made at once
+    """
+    doctor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='slot_claims'
+    )
+    appointment = models.ForeignKey(
+        Appointment,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='slot_claims'
+    )
+    hold = models.ForeignKey(
+        SlotHold,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='slot_claims'
+    )
+    date = models.DateField()
+    minute = models.PositiveSmallIntegerField(help_text="Start of the block, in minutes since midnight")
+    
+    def __str__(self):
+        return f"Dr. {self.doctor_id} {self.date} {self.minute // 60:02d}:{self.minute % 60:02d}"
+    
+    class Meta:
+        verbose_name = "Appointment Slot Claim"
+        verbose_name_plural = "Appointment Slot Claims"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'minute'],
+                name='slotclaim_doctor_minute_uniq'
+            ),
+            models.CheckConstraint(
+                check=(
+                    models.Q(appointment__isnull=False, hold__isnull=True)
+                    | models.Q(appointment__isnull=True, hold__isnull=False)
+                ),
+                name='slotclaim_single_owner'
+            ),
+        ]
\ No newline at end of file
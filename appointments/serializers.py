@@ -2,7 +2,7 @@
 Serializers for Appointment Management
 """
 from rest_framework import serializers
-from .models import Appointment
+from .models import Appointment, SlotHold
 from django.utils import timezone
 
 class AppointmentSerializer(serializers.ModelSerializer):
@@ -22,39 +22,72 @@ class AppointmentSerializer(serializers.ModelSerializer):
             'is_past', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        select_related = ['patient', 'doctor']
+
+
+def validate_working_hours(data):
+    """
+    Check a requested slot is in the doctor's working hours
+    Fills in the doctor's slot length when no duration is given
+    """
+    from doctors.schedule import get_schedule
+    
+    doctor = data.get('doctor')
+    appointment_date = data.get('appointment_date')
+    appointment_time = data.get('appointment_time')
+    
+    schedule = get_schedule(doctor.id)
+    if 'duration_minutes' not in data:
+        data['duration_minutes'] = schedule.slot_minutes
+    start = appointment_time.hour * 60 + appointment_time.minute
+    
+    if not schedule.covers(appointment_date, start, max(data['duration_minutes'], 1)):
+        raise serializers.ValidationError(
+            "The doctor is not available at this time"
+        )
+    return data
 
 
 class AppointmentCreateSerializer(serializers.ModelSerializer):
     """
     Serializer for creating appointments
+    hold_token books a slot reserved with a slot hold
     """
+    hold_token = serializers.UUIDField(write_only=True, required=False)
+    
     class Meta:
         model = Appointment
         fields = [
             'patient', 'doctor', 'appointment_date', 'appointment_time',
-            'duration_minutes', 'reason', 'symptoms'
+            'duration_minutes', 'reason', 'symptoms', 'hold_token'
         ]
     
     def validate(self, data):
-        """Validate appointment doesn't conflict with existing ones"""
-        doctor = data.get('doctor')
-        appointment_date = data.get('appointment_date')
-        appointment_time = data.get('appointment_time')
-        
-        # Check for conflicts
-        conflicts = Appointment.objects.filter(
-            doctor=doctor,
-            appointment_date=appointment_date,
-            appointment_time=appointment_time,
-            status__in=['PENDING', 'CONFIRMED']
-        )
-        
-        if conflicts.exists():
-            raise serializers.ValidationError(
-                "This time slot is already booked for this doctor"
-            )
-        
-        return data
+        """
+        Validate the appointment is in the doctor's working hours
+        Overlaps with other bookings are caught when it is saved, see booking.py
+        """
+        return validate_working_hours(data)
+    
+    def create(self, validated_data):
+        validated_data.pop('hold_token', None)
+        return super().create(validated_data)
+
+
+class SlotHoldSerializer(serializers.ModelSerializer):
+    """
+    Serializer for reserving a slot before booking it
+    """
+    class Meta:
+        model = SlotHold
+        fields = [
+            'token', 'doctor', 'appointment_date', 'appointment_time',
+            'duration_minutes', 'expires_at'
+        ]
+        read_only_fields = ['token', 'expires_at']
+    
+    def validate(self, data):
+        return validate_working_hours(data)
 
 
 class AppointmentUpdateSerializer(serializers.ModelSerializer):
@@ -0,0 +1,40 @@
+"""
+Signal handlers for Appointments
+Keeps each appointment's slot claims in step with its time and status
+"""
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from .booking import claim_slots
+from .models import Appointment
+from .slots import BLOCKING_STATUSES
+
+SLOT_FIELDS = {'doctor_id', 'appointment_date', 'appointment_time', 'duration_minutes', 'status'}
+
+
+def _slot(appointment):
+    return (
+        appointment.doctor_id,
+        appointment.appointment_date,
+        appointment.appointment_time,
+        appointment.duration_minutes,
+        appointment.status in BLOCKING_STATUSES
+    )
+
+
+@receiver(post_init, sender=Appointment)
+def remember_slot(sender, instance, **kwargs):
+    """Remember the loaded slot so saves that leave it alone skip the claims"""
+    if instance.pk is None or SLOT_FIELDS & instance.get_deferred_fields():
+        instance._loaded_slot = None
+    else:
+        instance._loaded_slot = _slot(instance)
+
+
+@receiver(post_save, sender=Appointment)
+def sync_slot_claims(sender, instance, created, **kwargs):
+    """Claim the appointment's time, or release it once it no longer blocks"""
+    slot = _slot(instance)
+    if created or slot != instance._loaded_slot:
+        claim_slots(instance)
+    instance._loaded_slot = slot
@@ -0,0 +1,196 @@
+"""
+Appointment Slot Engine
+Computes a doctor's free slots by subtracting booked intervals from working
+hours
+
+Intervals are (start, end) pairs of minutes since midnight, end exclusive.
+Working hours come from the doctor's compiled schedule (doctors.schedule);
+a date range is answered with one query for its bookings, which arrive
+sorted, so each day is a linear sweep. Slots sit on a grid of the doctor's
+slot length unless a step is given.
+"""
+import heapq
+from datetime import time, timedelta
+from itertools import islice
+
+from django.utils import timezone
+
+from doctors.schedule import get_schedules
+
+from .models import Appointment, SlotHold
+
+# Statuses that occupy the doctor's time
+BLOCKING_STATUSES = ('PENDING', 'CONFIRMED')
+
+SLOT_STEP = 30
+
+MAX_RANGE_DAYS = 62
+
+def merge(intervals):
+    """Sort intervals and join the overlapping or touching ones"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract(free, busy):
+    """free minus busy; both sorted and merged"""
+    result = []
+    i = 0
+    for start, end in free:
+        while i < len(busy) and busy[i][1] <= start:
+            i += 1
+        j = i
+        while j < len(busy) and busy[j][0] < end:
+            if busy[j][0] > start:
+                result.append((start, busy[j][0]))
+            start = max(start, busy[j][1])
+            j += 1
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def slot_starts(free, duration, step=SLOT_STEP, grid=None):
+    """
+    Start minutes of every slot of duration that fits in the free intervals
+    Slots sit on a step grid anchored at grid (default: each interval's start)
+    """
+    starts = []
+    for start, end in free:
+        anchor = start if grid is None else grid
+        first = start + (anchor - start) % step
+        starts.extend(range(first, end - duration + 1, step))
+    return starts
+
+
+def booked_intervals(doctor_ids, date_from, date_to, holder=None):
+    """
+    {(doctor_id, date): merged busy intervals} for a date range
+    Busy time is active appointments, read in one query, and unexpired slot
+    holds other than holder's, read in another
+    """
+    rows = Appointment.objects.filter(
+        doctor_id__in=doctor_ids,
+        appointment_date__range=(date_from, date_to),
+        status__in=BLOCKING_STATUSES
+    ).order_by('doctor_id', 'appointment_date', 'appointment_time').values_list(
+        'doctor_id', 'appointment_date', 'appointment_time', 'duration_minutes'
+    )
+
+    booked = {}
+    for doctor_id, day, start_time, duration in rows:
+        start = start_time.hour * 60 + start_time.minute
+        # Rows are sorted by start, so merging is a single pass
+        intervals = booked.setdefault((doctor_id, day), [])
+        end = min(start + max(duration, 1), 24 * 60)
+        if intervals and start <= intervals[-1][1]:
+            intervals[-1] = (intervals[-1][0], max(intervals[-1][1], end))
+        else:
+            intervals.append((start, end))
+
+    holds = SlotHold.objects.filter(
+        doctor_id__in=doctor_ids,
+        appointment_date__range=(date_from, date_to),
+        expires_at__gt=timezone.now()
+    ).exclude(patient_id=holder).values_list(
+        'doctor_id', 'appointment_date', 'appointment_time', 'duration_minutes'
+    )
+    for doctor_id, day, start_time, duration in holds:
+        start = start_time.hour * 60 + start_time.minute
+        intervals = booked.setdefault((doctor_id, day), [])
+        intervals.append((start, min(start + max(duration, 1), 24 * 60)))
+        booked[(doctor_id, day)] = merge(intervals)
+    return booked
+
+
+def daterange(date_from, date_to):
+    for offset in range((date_to - date_from).days + 1):
+        yield date_from + timedelta(days=offset)
+
+
+def clip(free, window):
+    """Parts of the free intervals inside a (start, end) window"""
+    low, high = window
+    return [(max(start, low), min(end, high)) for start, end in free if start < high and end > low]
+
+
+def day_slots(working, busy, duration, step=SLOT_STEP, window=None):
+    """Start minutes of one day's free slots, optionally within a time window"""
+    if not working:
+        return []
+    free = subtract(working, busy)
+    if window is not None:
+        free = clip(free, window)
+    return slot_starts(free, duration, step, grid=working[0][0])
+
+
+def _as_time(minute):
+    return time(minute // 60, minute % 60)
+
+
+def available_slots(doctor_id, date_from, date_to, duration=None, step=None, hours=None,
+                    holder=None):
+    """
+    {date: [start times]} of a doctor's free slots between two dates
+    hours defaults to the doctor's compiled schedule; duration and step
+    default to its slot length. Slots held by holder count as free
+    """
+    if hours is None:
+        hours = get_schedules([doctor_id])[doctor_id]
+    duration = duration or hours.slot_minutes
+    step = step or hours.slot_minutes
+    booked = booked_intervals([doctor_id], date_from, date_to, holder)
+    return {
+        day: [
+            _as_time(minute)
+            for minute in day_slots(hours.on(day), booked.get((doctor_id, day), []), duration, step)
+        ]
+        for day in daterange(date_from, date_to)
+    }
+
+
+def _doctor_stream(doctor_id, hours, booked, days, duration, step, window, not_before):
+    """(date, minute, doctor_id) of a doctor's free slots in time order, computed lazily"""
+    for day in days:
+        day_window = window
+        if not_before is not None and day <= not_before.date():
+            if day < not_before.date():
+                continue
+            now = not_before.hour * 60 + not_before.minute + (not_before.second > 0)
+            day_window = (max(window[0], now), window[1])
+        for minute in day_slots(hours.on(day), booked.get((doctor_id, day), []), duration, step, day_window):
+            yield day, minute, doctor_id
+
+
+def earliest_slots(hours, date_from, date_to, duration=30, limit=10, window=None,
+                   not_before=None, step=None, holder=None):
+    """
+    The first limit free slots across several doctors, earliest first
+    hours is {doctor_id: CompiledSchedule}; step defaults to each doctor's
+    slot length; window limits slots to a (start, end) time of day in
+    minutes; slots starting before not_before (a naive datetime) are
+    skipped, and slots held by holder count as free. Bookings of all
+    doctors are read at once and the per-doctor streams are merged with a
+    heap, so only the days needed to find limit slots are computed.
+    Returns [(date, time, doctor_id)]
+    """
+    if not hours:
+        return []
+    booked = booked_intervals(list(hours), date_from, date_to, holder)
+    days = list(daterange(date_from, date_to))
+    streams = [
+        _doctor_stream(doctor_id, schedule, booked, days, duration,
+                       step or schedule.slot_minutes, window or (0, 24 * 60), not_before)
+        for doctor_id, schedule in hours.items()
+    ]
+    return [
+        (day, _as_time(minute), doctor_id)
+        for day, minute, doctor_id in islice(heapq.merge(*streams), limit)
+    ]
+
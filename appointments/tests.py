@@ -1,3 +1,250 @@
-from django.test import TestCase
+import random
+from datetime import date, time, timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from doctors.schedule import CompiledSchedule, intervals_of, minute_mask
+from healthcare_backend.pagination import KeysetPagination
+from .booking import SlotTaken
+from .models import Appointment, AppointmentSlotClaim
+from .slots import available_slots, day_slots, merge
+
+User = get_user_model()
+
+
+def reference_slots(working, busy, duration, step, window=None):
+    """Slot starts found by checking every minute, to compare the engine against"""
+    free = set()
+    for start, end in working:
+        free.update(range(start, end))
+    for start, end in busy:
+        free.difference_update(range(start, end))
+    if window is not None:
+        free.intersection_update(range(*window))
+    grid = working[0][0]
+    return [
+        minute for minute in range(grid % step, 24 * 60, step)
+        if all(m in free for m in range(minute, minute + duration))
+    ]
+
+
+def random_intervals(rng, count, longest):
+    intervals = []
+    for _ in range(count):
+        start = rng.randrange(0, 24 * 60 - 1)
+        intervals.append((start, min(start + rng.randint(1, longest), 24 * 60)))
+    return intervals
+
+
+class SlotEngineTests(SimpleTestCase):
+
+    def test_matches_minute_by_minute_reference(self):
+        rng = random.Random(16)
+        for _ in range(500):
+            mask = 0
+            for start, end in random_intervals(rng, rng.randint(1, 4), 300):
+                mask |= minute_mask(start, end)
+            working = intervals_of(mask)
+            busy = merge(random_intervals(rng, rng.randint(0, 8), 90))
+            duration = rng.choice([5, 10, 15, 20, 30, 45, 60, 90])
+            step = rng.choice([5, 10, 15, 30, 60])
+            window = None
+            if rng.random() < 0.3:
+                low = rng.randrange(0, 24 * 60)
+                window = (low, rng.randint(low + 1, 24 * 60))
+            with self.subTest(working=working, busy=busy, duration=duration, step=step, window=window):
+                self.assertEqual(
+                    day_slots(working, busy, duration, step, window),
+                    reference_slots(working, busy, duration, step, window)
+                )
+
+    def test_merge_joins_touching_intervals(self):
+        self.assertEqual(merge([(30, 40), (0, 10), (10, 20), (35, 50)]), [(0, 20), (30, 50)])
+
+    def test_no_working_hours(self):
+        self.assertEqual(day_slots([], [(0, 60)], 30, 30), [])
+
+
+class AvailableSlotsTests(TestCase):
+
+    def setUp(self):
+        self.doctor = User.objects.create_user('doc', password='pw', role='DOCTOR')
+        self.patient = User.objects.create_user('pat', password='pw', role='PATIENT')
+
+    def test_bookings_match_reference(self):
+        rng = random.Random(160)
+        hours = minute_mask(8 * 60, 12 * 60) | minute_mask(13 * 60, 18 * 60)
+        schedule = CompiledSchedule([hours] * 7, slot_minutes=15)
+        day = date(2030, 1, 7)
+        for start in range(8 * 60, 18 * 60, 15):
+            if rng.random() < 0.3:
+                Appointment.objects.create(
+                    patient=self.patient,
+                    doctor=self.doctor,
+                    appointment_date=day,
+                    appointment_time=time(start // 60, start % 60),
+                    duration_minutes=15,
+                    status=rng.choice(['PENDING', 'CONFIRMED', 'CANCELLED']),
+                    reason='Checkup'
+                )
+        busy = [
+            (a.appointment_time.hour * 60 + a.appointment_time.minute,
+             a.appointment_time.hour * 60 + a.appointment_time.minute + a.duration_minutes)
+            for a in Appointment.objects.filter(status__in=['PENDING', 'CONFIRMED'])
+        ]
+        expected = [
+            time(minute // 60, minute % 60)
+            for minute in reference_slots(schedule.on(day), busy, 30, 15)
+        ]
+        slots = available_slots(self.doctor.id, day, day, duration=30, hours=schedule)
+        self.assertEqual(slots, {day: expected})
+
+
+class AppointmentSaveTests(TestCase):
+
+    def setUp(self):
+        self.doctor = User.objects.create_user('doc', password='pw', role='DOCTOR')
+        self.patient = User.objects.create_user('pat', password='pw', role='PATIENT')
+
+    def book(self, start, **fields):
+        return Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            appointment_date=date(2030, 1, 7),
+            appointment_time=start,
+            duration_minutes=30,
+            reason='Checkup',
+            **fields
+        )
+
+    def test_overlapping_save_leaves_no_row(self):
+        self.book(time(9, 0))
+        with self.assertRaises(SlotTaken):
+            self.book(time(9, 15))
+        self.assertEqual(Appointment.objects.count(), 1)
+        self.assertEqual(AppointmentSlotClaim.objects.count(), 6)
+
+    def test_cancelled_appointment_releases_its_time(self):
+        first = self.book(time(9, 0))
+        first.status = 'CANCELLED'
+        first.save()
+        self.book(time(9, 15))
+        self.assertEqual(
+            sorted(AppointmentSlotClaim.objects.values_list('minute', flat=True)),
+            list(range(555, 585, 5))
+        )
+
+
+class ListQueryTests(TestCase):
+    """Each list costs the same number of queries for one row and for many"""
+
+    def setUp(self):
+        self.doctor = User.objects.create_user('doc', password='pw', role='DOCTOR')
+        self.patient = User.objects.create_user('pat', password='pw', role='PATIENT')
+        self.client = APIClient()
+        self.rows = 0
+
+    def seed(self, count):
+        today = date.today()
+        for day in range(self.rows, count):
+            Appointment.objects.create(
+                patient=self.patient,
+                doctor=self.doctor,
+                appointment_date=today + timedelta(days=day + 1),
+                appointment_time=time(9, 0),
+                reason='Checkup'
+            )
+        self.rows = count
+
+    def assertListQueries(self, name, user, expected):
+        self.client.force_authenticate(user)
+        for count in (1, 5):
+            self.seed(count)
+            with self.assertNumQueries(expected):
+                response = self.client.get(reverse(name), {'page_size': count})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), count)
+
+    def test_patient_list(self):
+        self.assertListQueries('appointment-list', self.patient, 1)
+
+    def test_doctor_list(self):
+        self.assertListQueries('appointment-list', self.doctor, 1)
+
+    def test_upcoming(self):
+        self.assertListQueries('upcoming-appointments', self.doctor, 1)
+
+    def test_pending(self):
+        self.assertListQueries('pending-appointments', self.doctor, 1)
+
+
+class KeysetPaginationTests(TestCase):
+    """Walking every page returns each row once, in order, for any ordering"""
+
+    def setUp(self):
+        doctor = User.objects.create_user('doc', password='pw', role='DOCTOR')
+        patient = User.objects.create_user('pat', password='pw', role='PATIENT')
+        rng = random.Random(21)
+        # Few distinct dates and times, so most rows tie on the ordering
+        # columns; cancelled rows may share a time
+        Appointment.objects.bulk_create([
+            Appointment(
+                patient=patient,
+                doctor=doctor,
+                appointment_date=date(2030, 1, rng.randint(1, 3)),
+                appointment_time=time(rng.choice([9, 10]), 0),
+                status='CANCELLED',
+                reason='Checkup'
+            )
+            for _ in range(40)
+        ])
+
+    def walk(self, ordering, page_size):
+        factory = APIRequestFactory()
+        params = {'page_size': page_size}
+        ids = []
+        for _ in range(100):
+            paginator = KeysetPagination(ordering)
+            request = Request(factory.get('/', params))
+            rows = paginator.paginate_queryset(Appointment.objects.all(), request)
+            self.assertLessEqual(len(rows), page_size)
+            ids.extend(row.id for row in rows)
+            if paginator.next_cursor is None:
+                return ids
+            params['cursor'] = paginator.next_cursor
+        self.fail("Pagination did not end")
+
+    def expected(self, key):
+        return [a.id for a in sorted(Appointment.objects.all(), key=key)]
+
+    def test_descending_meta_ordering(self):
+        # Appointment orders by -appointment_date, -appointment_time; the
+        # pk tie-break follows the leading column
+        expected = self.expected(lambda a: (a.appointment_date, a.appointment_time, a.id))[::-1]
+        for page_size in (1, 3, 7, 40, 50):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(self.walk(None, page_size), expected)
+
+    def test_ascending(self):
+        expected = self.expected(lambda a: (a.appointment_date, a.appointment_time, a.id))
+        for page_size in (1, 4, 39):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(self.walk(['appointment_date', 'appointment_time'], page_size), expected)
+
+    def test_mixed_directions(self):
+        expected = self.expected(lambda a: (a.appointment_date, -a.appointment_time.hour, a.id))
+        self.assertEqual(self.walk(['appointment_date', '-appointment_time'], 6), expected)
+
+    def test_all_rows_tie(self):
+        expected = self.expected(lambda a: (a.status, a.id))
+        self.assertEqual(self.walk(['status'], 9), expected)
+
+    def test_invalid_cursor(self):
+        request = Request(APIRequestFactory().get('/', {'cursor': 'not-a-cursor'}))
+        with self.assertRaises(NotFound):
+            KeysetPagination().paginate_queryset(Appointment.objects.all(), request)
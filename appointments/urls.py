@@ -18,4 +18,7 @@ urlpatterns = [
     
     # Availability
     path('available-slots/<int:doctor_id>/', views.available_slots, name='available-slots'),
+    path('availability/', views.search_availability, name='search-availability'),
+    path('holds/', views.hold_appointment_slot, name='hold-appointment-slot'),
+    path('holds/<uuid:token>/', views.release_appointment_slot, name='release-appointment-slot'),
 ]
\ No newline at end of file
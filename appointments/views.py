@@ -6,16 +6,20 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from .models import Appointment
+from .booking import SlotTaken, hold_slot, hold_ttl, patient_hold, save_booking
+from .models import Appointment, SlotHold
 from .serializers import (
     AppointmentSerializer,
     AppointmentCreateSerializer,
-    AppointmentUpdateSerializer
+    AppointmentUpdateSerializer,
+    SlotHoldSerializer
 )
 from patients.permissions import IsPatient
 from doctors.permissions import IsDoctor
+from healthcare_backend.pagination import KeysetPagination
+from healthcare_backend.prefetch import with_relations
 
 
 @api_view(['GET'])
@@ -46,8 +50,10 @@ def appointment_list(request):
     if date_to:
         appointments = appointments.filter(appointment_date__lte=date_to)
     
-    serializer = AppointmentSerializer(appointments, many=True)
-    return Response(serializer.data)
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(with_relations(appointments, AppointmentSerializer), request)
+    serializer = AppointmentSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['POST'])
@@ -58,7 +64,18 @@ def create_appointment(request):
     """
     serializer = AppointmentCreateSerializer(data=request.data)
     if serializer.is_valid():
-        serializer.save(patient=request.user, status='PENDING')
+        # A slot hold of the patient passes its time to the appointment
+        hold = patient_hold(
+            request.user,
+            serializer.validated_data['doctor'].id,
+            serializer.validated_data.get('hold_token')
+        )
+        try:
+            save_booking(serializer.save, hold=hold, patient=request.user, status='PENDING')
+        except SlotTaken as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_409_CONFLICT)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -108,13 +125,19 @@ def update_appointment_status(request, appointment_id):
     if request.user.role == 'DOCTOR':
         serializer = AppointmentUpdateSerializer(appointment, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            # Re-activating a cancelled appointment claims its time again
+            try:
+                save_booking(serializer.save)
+            except SlotTaken as e:
+                return Response({
+                    'error': str(e)
+                }, status=status.HTTP_409_CONFLICT)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     # For patients (cancellation)
     appointment.status = new_status
-    appointment.save()
+    save_booking(appointment.save)
     
     serializer = AppointmentSerializer(appointment)
     return Response(serializer.data)
@@ -139,7 +162,7 @@ def cancel_appointment(request, appointment_id):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     appointment.status = 'CANCELLED'
-    appointment.save()
+    save_booking(appointment.save)
     
     return Response({
         'message': 'Appointment cancelled successfully'
@@ -159,10 +182,12 @@ def upcoming_appointments(request):
         doctor=request.user,
         appointment_date__gte=today,
         status__in=['PENDING', 'CONFIRMED']
-    ).order_by('appointment_date', 'appointment_time')
+    )
     
-    serializer = AppointmentSerializer(appointments, many=True)
-    return Response(serializer.data)
+    paginator = KeysetPagination(['appointment_date', 'appointment_time'])
+    page = paginator.paginate_queryset(with_relations(appointments, AppointmentSerializer), request)
+    serializer = AppointmentSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['GET'])
@@ -174,50 +199,211 @@ def pending_appointments(request):
     appointments = Appointment.objects.filter(
         doctor=request.user,
         status='PENDING'
-    ).order_by('appointment_date', 'appointment_time')
+    )
     
-    serializer = AppointmentSerializer(appointments, many=True)
-    return Response(serializer.data)
+    paginator = KeysetPagination(['appointment_date', 'appointment_time'])
+    page = paginator.paginate_queryset(with_relations(appointments, AppointmentSerializer), request)
+    serializer = AppointmentSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def available_slots(request, doctor_id):
     """
-    Get available time slots for a doctor on a specific date
+    Get available time slots for a doctor on a date or a date range
+    Query params: date, or date_from and date_to; duration (minutes,
+    default the doctor's slot length)
     """
-    appointment_date = request.query_params.get('date')
+    from doctors.schedule import get_schedule
+    from .slots import MAX_RANGE_DAYS, available_slots as free_slots
     
-    if not appointment_date:
+    single_date = request.query_params.get('date')
+    try:
+        date_from = datetime.strptime(
+            single_date or request.query_params.get('date_from', ''), '%Y-%m-%d'
+        ).date()
+        date_to = datetime.strptime(
+            single_date or request.query_params.get('date_to', ''), '%Y-%m-%d'
+        ).date()
+    except ValueError:
         return Response({
-            'error': 'date parameter is required'
+            'error': 'date, or date_from and date_to, are required as YYYY-MM-DD'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    # Get booked slots
-    booked_appointments = Appointment.objects.filter(
-        doctor_id=doctor_id,
-        appointment_date=appointment_date,
-        status__in=['PENDING', 'CONFIRMED']
-    ).values_list('appointment_time', flat=True)
+    if not 0 <= (date_to - date_from).days < MAX_RANGE_DAYS:
+        return Response({
+            'error': f'date_to must be on or after date_from and at most {MAX_RANGE_DAYS} days later'
+        }, status=status.HTTP_400_BAD_REQUEST)
     
-    # Generate time slots (9 AM to 5 PM, 30-minute intervals)
-    from datetime import time, timedelta
+    try:
+        duration = int(request.query_params.get('duration') or 0) or None
+    except ValueError:
+        duration = 0
+    if duration is not None and not 5 <= duration <= 8 * 60:
+        return Response({
+            'error': 'duration must be between 5 and 480 minutes'
+        }, status=status.HTTP_400_BAD_REQUEST)
     
-    available_slots = []
-    current_time = time(9, 0)
-    end_time = time(17, 0)
+    # Working hours minus booked intervals, one bookings query for the whole range
+    schedule = get_schedule(doctor_id)
+    duration = duration or schedule.slot_minutes
+    slots = free_slots(
+        doctor_id, date_from, date_to, duration=duration, hours=schedule, holder=request.user.id
+    )
     
-    while current_time < end_time:
-        if current_time not in booked_appointments:
-            available_slots.append(current_time.strftime('%H:%M'))
-        
-        # Add 30 minutes
-        current_datetime = datetime.combine(datetime.today(), current_time)
-        current_datetime += timedelta(minutes=30)
-        current_time = current_datetime.time()
+    if single_date:
+        return Response({
+            'date': single_date,
+            'doctor_id': doctor_id,
+            'duration': duration,
+            'available_slots': [t.strftime('%H:%M') for t in slots[date_from]]
+        })
     
     return Response({
-        'date': appointment_date,
         'doctor_id': doctor_id,
-        'available_slots': available_slots
-    })
\ No newline at end of file
+        'date_from': date_from,
+        'date_to': date_to,
+        'duration': duration,
+        'days': [
+            {'date': day, 'available_slots': [t.strftime('%H:%M') for t in times]}
+            for day, times in slots.items()
+        ]
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsPatient])
+def hold_appointment_slot(request):
+    """
+    Reserve a slot for a few minutes while the patient completes booking
+    Pass the returned token as hold_token when creating the appointment
+    """
+    serializer = SlotHoldSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = serializer.validated_data
+    try:
+        hold = hold_slot(
+            request.user,
+            data['doctor'].id,
+            data['appointment_date'],
+            data['appointment_time'],
+            data['duration_minutes']
+        )
+    except SlotTaken as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_409_CONFLICT)
+    
+    response = SlotHoldSerializer(hold).data
+    response['ttl'] = hold_ttl()
+    return Response(response, status=status.HTTP_201_CREATED)
+
+
+@api_view(['DELETE'])
+@permission_classes([IsAuthenticated, IsPatient])
+def release_appointment_slot(request, token):
+    """
+    Release a slot hold before it expires
+    """
+    hold = get_object_or_404(SlotHold, token=token, patient=request.user)
+    hold.delete()
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+MAX_SEARCH_RESULTS = 100
+
+
+def _minute_of_day(value, default):
+    """Minutes since midnight of an HH:MM query param"""
+    if not value:
+        return default
+    parsed = datetime.strptime(value, '%H:%M')
+    return parsed.hour * 60 + parsed.minute
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_availability(request):
+    """
+    Earliest open slots across all doctors of a specialization
+    Query params: specialization, date_from (default today), date_to
+    (default a week later), time_from / time_to (HH:MM), duration, limit
+    """
+    from django.utils import timezone
+    from doctors.models import DoctorProfile
+    from doctors.schedule import get_schedules
+    from .slots import MAX_RANGE_DAYS, earliest_slots
+    
+    now = timezone.localtime().replace(tzinfo=None)
+    try:
+        date_from = request.query_params.get('date_from')
+        date_from = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else now.date()
+        date_to = request.query_params.get('date_to')
+        date_to = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else date_from + timedelta(days=6)
+        # Slots must fit inside this time of day window
+        window = (
+            _minute_of_day(request.query_params.get('time_from'), 0),
+            _minute_of_day(request.query_params.get('time_to'), 24 * 60),
+        )
+    except ValueError:
+        return Response({
+            'error': 'Dates must be YYYY-MM-DD and times HH:MM'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not 0 <= (date_to - date_from).days < MAX_RANGE_DAYS:
+        return Response({
+            'error': f'date_to must be on or after date_from and at most {MAX_RANGE_DAYS} days later'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        duration = int(request.query_params.get('duration', 30))
+        limit = int(request.query_params.get('limit', 10))
+    except ValueError:
+        duration = limit = 0
+    if not 5 <= duration <= 8 * 60 or not 1 <= limit <= MAX_SEARCH_RESULTS:
+        return Response({
+            'error': f'duration must be between 5 and 480 minutes and limit between 1 and {MAX_SEARCH_RESULTS}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    doctors = DoctorProfile.objects.all()
+    specialization = request.query_params.get('specialization')
+    if specialization:
+        doctors = doctors.filter(specialization__iexact=specialization)
+    doctors = {
+        row[0]: row
+        for row in doctors.values_list(
+            'user_id', 'user__first_name', 'user__last_name', 'specialization', 'updated_at'
+        )
+    }
+    
+    # One bookings query for every doctor, merged into a single time-ordered stream
+    slots = earliest_slots(
+        get_schedules(list(doctors), {doctor_id: row[4] for doctor_id, row in doctors.items()}),
+        date_from,
+        date_to,
+        duration=duration,
+        limit=limit,
+        window=window,
+        not_before=now,
+        holder=request.user.id
+    )
+    
+    return Response({
+        'specialization': specialization,
+        'date_from': date_from,
+        'date_to': date_to,
+        'duration': duration,
+        'slots': [
+            {
+                'doctor_id': doctor_id,
+                'doctor_name': f"{doctors[doctor_id][1]} {doctors[doctor_id][2]}".strip(),
+                'specialization': doctors[doctor_id][3],
+                'date': day,
+                'time': start.strftime('%H:%M'),
+            }
+            for day, start, doctor_id in slots
+        ]
+    })
@@ -0,0 +1,47 @@
+"""
+Doctor-Patient Access
+Answers "is this patient assigned to the requesting doctor?" from the
+doctor's set of actively assigned patient ids, loaded in one query the
+first time a request asks and kept on the request, so permission classes
+and the view share one lookup.
+
+The set is deliberately not cached across requests: the default cache is
+per process, and a revoked assignment must stop granting access on the
+very next request in every worker. List queries filter with
+assigned_patients_query() instead, which stays a subquery however large
+the doctor's panel is.
+"""
+from .models import DoctorPatientAssignment
+
+
+def assigned_patients_query(doctor):
+    """Ids of a doctor's actively assigned patients, as a queryset for __in filters"""
+    return DoctorPatientAssignment.objects.filter(
+        doctor=doctor,
+        is_active=True
+    ).values_list('patient_id', flat=True)
+
+
+def assigned_patient_ids(request):
+    """
+    frozenset of the ids of the requesting doctor's assigned patients,
+    looked up once per request. Empty for users who are not doctors
+    """
+    ids = getattr(request, '_assigned_patient_ids', None)
+    if ids is None:
+        user = request.user
+        if user.is_authenticated and user.role == 'DOCTOR':
+            ids = frozenset(assigned_patients_query(user))
+        else:
+            ids = frozenset()
+        request._assigned_patient_ids = ids
+    return ids
+
+
+def is_assigned_patient(request, patient):
+    """Whether patient (a user or an id) is actively assigned to the requesting doctor"""
+    patient_id = getattr(patient, 'pk', patient)
+    try:
+        return int(patient_id) in assigned_patient_ids(request)
+    except (TypeError, ValueError):
+        return False
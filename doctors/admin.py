@@ -2,7 +2,18 @@
 Admin configuration for Doctor models
 """
 from django.contrib import admin
-from .models import DoctorProfile, DoctorPatientAssignment
+from .models import DoctorProfile, DoctorPatientAssignment, DoctorSchedule, ScheduleException
+
+
+class DoctorScheduleInline(admin.TabularInline):
+    model = DoctorSchedule
+    extra = 0
+
+
+class ScheduleExceptionInline(admin.TabularInline):
+    model = ScheduleException
+    extra = 0
+
 
 @admin.register(DoctorProfile)
 class DoctorProfileAdmin(admin.ModelAdmin):
@@ -10,6 +21,7 @@ class DoctorProfileAdmin(admin.ModelAdmin):
     list_filter = ['specialization', 'experience_years']
     search_fields = ['user__username', 'user__first_name', 'user__last_name', 'license_number']
     readonly_fields = ['created_at', 'updated_at']
+    inlines = [DoctorScheduleInline, ScheduleExceptionInline]
     
     fieldsets = (
         ('User', {
@@ -22,7 +34,7 @@ class DoctorProfileAdmin(admin.ModelAdmin):
             'fields': ('office_address', 'consultation_fee')
         }),
         ('Availability', {
-            'fields': ('available_days', 'available_time')
+            'fields': ('available_days', 'available_time', 'slot_minutes')
         }),
         ('About', {
             'fields': ('bio',)
@@ -0,0 +1,163 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:26
+
+import re
+from datetime import time
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Frozen copy of the doctors.schedule parsers as of this migration, so
+# later changes to the live module do not change what it writes
+
+MINUTES_PER_DAY = 24 * 60
+
+DEFAULT_HOURS = ((9 * 60, 17 * 60),)
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+TIME_RE = re.compile(r'(\d{1,2})(?:[:.](\d{2}))?\s*([ap])?\.?\s*m?\.?', re.IGNORECASE)
+
+
+def minute_mask(start, end):
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+
+def intervals_of(mask):
+    intervals = []
+    offset = 0
+    while mask:
+        zeros = (mask & -mask).bit_length() - 1
+        mask >>= zeros
+        offset += zeros
+        ones = (~mask & (mask + 1)).bit_length() - 1
+        intervals.append((offset, offset + ones))
+        mask >>= ones
+        offset += ones
+    return intervals
+
+
+def _weekday(word):
+    word = word.strip().casefold()[:3]
+    return WEEKDAYS.index(word) if word in WEEKDAYS else None
+
+
+def parse_days(text):
+    days = set()
+    for part in re.split(r'[,;/&]|\band\b', text or '', flags=re.IGNORECASE):
+        bounds = re.split(r'\s*(?:-|–|\bto\b)\s*', part.strip(), flags=re.IGNORECASE)
+        weekdays = [_weekday(bound) for bound in bounds if bound]
+        if not weekdays or None in weekdays:
+            continue
+        first, last = weekdays[0], weekdays[-1]
+        days.update((first + i) % 7 for i in range((last - first) % 7 + 1))
+    return frozenset(days) or None
+
+
+def _minutes(hour, minute, meridiem):
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem.lower() == 'p' else 0)
+    return hour * 60 + minute
+
+
+def parse_hours(text):
+    mask = 0
+    for part in re.split(r'[,;&]|\band\b', text or '', flags=re.IGNORECASE):
+        times = TIME_RE.findall(part)
+        if len(times) != 2:
+            continue
+        (h1, m1, p1), (h2, m2, p2) = times
+        if p2 and not p1 and int(h1) % 12 > int(h2) % 12:
+            p1 = 'a'
+        elif p2 and not p1:
+            p1 = p2
+        start, end = _minutes(h1, m1, p1), _minutes(h2, m2, p2)
+        if 0 <= start < end <= MINUTES_PER_DAY:
+            mask |= minute_mask(start, end)
+    return tuple(intervals_of(mask)) or DEFAULT_HOURS
+
+
+def _as_time(minute):
+    # TimeField cannot hold 24:00
+    minute = min(minute, 24 * 60 - 1)
+    return time(minute // 60, minute % 60)
+
+
+def schedules_from_text(apps, schema_editor):
+    """Turn each profile's free-text availability into weekly blocks"""
+    DoctorProfile = apps.get_model('doctors', 'DoctorProfile')
+    DoctorSchedule = apps.get_model('doctors', 'DoctorSchedule')
+    blocks = []
+    for profile in DoctorProfile.objects.only('id', 'available_days', 'available_time').iterator():
+        days = parse_days(profile.available_days) or range(7)
+        hours = parse_hours(profile.available_time)
+        blocks.extend(
+            DoctorSchedule(
+                profile_id=profile.id,
+                weekday=weekday,
+                start_time=_as_time(start),
+                end_time=_as_time(end)
+            )
+            for weekday in sorted(days)
+            for start, end in hours
+        )
+    DoctorSchedule.objects.bulk_create(blocks, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='slot_minutes',
+            field=models.PositiveSmallIntegerField(default=30, help_text='Length of a bookable slot in minutes'),
+        ),
+        migrations.CreateModel(
+            name='DoctorSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_blocks', to='doctors.doctorprofile')),
+            ],
+            options={
+                'verbose_name': 'Schedule Block',
+                'verbose_name_plural': 'Weekly Schedule',
+                'ordering': ['profile', 'weekday', 'start_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScheduleException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField(blank=True, null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('is_available', models.BooleanField(default=False, help_text='Extra working hours instead of time off')),
+                ('reason', models.CharField(blank=True, max_length=200)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_exceptions', to='doctors.doctorprofile')),
+            ],
+            options={
+                'verbose_name': 'Schedule Exception',
+                'verbose_name_plural': 'Schedule Exceptions',
+                'ordering': ['profile', 'date', 'start_time'],
+                'indexes': [models.Index(fields=['profile', 'date'], name='schedexc_profile_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='scheduleexception',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('end_time__isnull', True), ('is_available', False), ('start_time__isnull', True)), ('start_time__lt', models.F('end_time')), _connector='OR'), name='scheduleexception_valid_times'),
+        ),
+        migrations.AddConstraint(
+            model_name='doctorschedule',
+            constraint=models.CheckConstraint(check=models.Q(('start_time__lt', models.F('end_time'))), name='doctorschedule_start_before_end'),
+        ),
+        migrations.RunPython(schedules_from_text, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0002_doctor_schedules'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctorpatientassignment',
+            index=models.Index(fields=['doctor', 'is_active', 'assigned_date'], name='assignment_doctor_date_idx'),
+        ),
+    ]
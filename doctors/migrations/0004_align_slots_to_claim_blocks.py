@@ -0,0 +1,69 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:30
+
+from datetime import time
+
+from django.db import migrations
+
+# appointments.booking.CLAIM_MINUTES when this migration was written
+CLAIM_MINUTES = 5
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute + (value.second > 0 or value.microsecond > 0)
+
+
+def _up(value):
+    """The next block boundary at or after value; None past midnight"""
+    minutes = _minutes(value)
+    minutes += -minutes % CLAIM_MINUTES
+    return time(minutes // 60, minutes % 60) if minutes < 24 * 60 else None
+
+
+def _down(value):
+    return time(value.hour, value.minute - value.minute % CLAIM_MINUTES)
+
+
+def align_to_claim_blocks(apps, schema_editor):
+    """
+    Round slot lengths and working time starts to whole booking blocks
+    Working time only shrinks and time off only grows, so no slot is
+    offered outside the hours the doctor gave
+    """
+    DoctorProfile = apps.get_model('doctors', 'DoctorProfile')
+    DoctorSchedule = apps.get_model('doctors', 'DoctorSchedule')
+    ScheduleException = apps.get_model('doctors', 'ScheduleException')
+
+    for profile in DoctorProfile.objects.exclude(slot_minutes__in=range(0, 8 * 60 + 1, CLAIM_MINUTES)):
+        profile.slot_minutes = min(max(profile.slot_minutes + -profile.slot_minutes % CLAIM_MINUTES, CLAIM_MINUTES), 8 * 60)
+        profile.save(update_fields=['slot_minutes'])
+
+    for block in DoctorSchedule.objects.all():
+        start = _up(block.start_time)
+        if start == block.start_time:
+            continue
+        if start is None or start >= block.end_time:
+            block.delete()
+        else:
+            block.start_time = start
+            block.save(update_fields=['start_time'])
+
+    for exception in ScheduleException.objects.filter(start_time__isnull=False):
+        start = _up(exception.start_time) if exception.is_available else _down(exception.start_time)
+        if start == exception.start_time:
+            continue
+        if start is None or start >= exception.end_time:
+            exception.delete()
+        else:
+            exception.start_time = start
+            exception.save(update_fields=['start_time'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0003_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(align_to_claim_blocks, migrations.RunPython.noop),
+    ]
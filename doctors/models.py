@@ -48,6 +48,10 @@ class DoctorProfile(models.Model):
         help_text="e.g., 9:00 AM - 5:00 PM",
         blank=True
     )
+    slot_minutes = models.PositiveSmallIntegerField(
+        default=30,
+        help_text="Length of a bookable slot in minutes"
+    )
     
     # Bio
     bio = models.TextField(blank=True)
@@ -93,4 +97,89 @@ class DoctorPatientAssignment(models.Model):
         verbose_name = "Doctor-Patient Assignment"
         verbose_name_plural = "Doctor-Patient Assignments"
         unique_together = ['doctor', 'patient']
-        ordering = ['-assigned_date']
\ No newline at end of file
+        ordering = ['-assigned_date']
+        indexes = [
+            models.Index(fields=['doctor', 'is_active', 'assigned_date'], name='assignment_doctor_date_idx'),
+        ]
+
+
+class DoctorSchedule(models.Model):
+    """
+    A weekly block of working hours
+    A doctor may have several blocks per weekday (e.g. a lunch break)
+    """
+    WEEKDAY_CHOICES = (
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    )
+    
+    profile = models.ForeignKey(
+        DoctorProfile,
+        on_delete=models.CASCADE,
+        related_name='schedule_blocks'
+    )
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    
+    def __str__(self):
+        return f"{self.profile} {self.get_weekday_display()} {self.start_time:%H:%M}-{self.end_time:%H:%M}"
+    
+    class Meta:
+        verbose_name = "Schedule Block"
+        verbose_name_plural = "Weekly Schedule"
+        ordering = ['profile', 'weekday', 'start_time']
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(start_time__lt=models.F('end_time')),
+                name='doctorschedule_start_before_end'
+            ),
+        ]
+
+
+class ScheduleException(models.Model):
+    """
+    A change to the weekly schedule on one date
+    Time off (holidays, leave) removes the given hours, or the whole day when
+    no times are set; extra hours add working time, even on a day off
+    """
+    profile = models.ForeignKey(
+        DoctorProfile,
+        on_delete=models.CASCADE,
+        related_name='schedule_exceptions'
+    )
+    date = models.DateField()
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    is_available = models.BooleanField(
+        default=False,
+        help_text="Extra working hours instead of time off"
+    )
+    reason = models.CharField(max_length=200, blank=True)
+    
+    def __str__(self):
+        kind = "Extra hours" if self.is_available else "Time off"
+        return f"{self.profile} {kind} on {self.date}"
+    
+    class Meta:
+        verbose_name = "Schedule Exception"
+        verbose_name_plural = "Schedule Exceptions"
+        ordering = ['profile', 'date', 'start_time']
+        indexes = [
+            models.Index(fields=['profile', 'date'], name='schedexc_profile_date_idx'),
+        ]
+        constraints = [
+            # Either the whole day, or a time range; extra hours need a range
+            models.CheckConstraint(
+                check=(
+                    models.Q(start_time__isnull=True, end_time__isnull=True, is_available=False)
+                    | models.Q(start_time__lt=models.F('end_time'))
+                ),
+                name='scheduleexception_valid_times'
+            ),
+        ]
@@ -4,6 +4,8 @@ Handles access control for doctor actions
 """
 from rest_framework.permissions import BasePermission
 
+from .access import is_assigned_patient
+
 
 class IsDoctor(BasePermission):
     """
@@ -26,22 +28,17 @@ class CanAccessAssignedPatient(BasePermission):
             return False
 
         # obj can be PatientProfile / MedicalHistory / Appointment etc.
-        patient = None
+        patient_id = None
 
-        if hasattr(obj, 'patient'):
-            patient = obj.patient
-        elif hasattr(obj, 'user'):
-            patient = obj.user
+        if hasattr(obj, 'patient_id'):
+            patient_id = obj.patient_id
+        elif hasattr(obj, 'user_id'):
+            patient_id = obj.user_id
 
-        if patient is None:
+        if patient_id is None:
             return False
 
-        from doctors.models import DoctorPatientAssignment
-        return DoctorPatientAssignment.objects.filter(
-            doctor=request.user,
-            patient=patient,
-            is_active=True
-        ).exists()
+        return is_assigned_patient(request, patient_id)
 
 
 class CanManageDoctorAppointment(BasePermission):
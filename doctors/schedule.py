@@ -0,0 +1,251 @@
+"""
+Compiled Doctor Schedules
+Turns a doctor's weekly schedule blocks and dated exceptions into one
+bitmap per day, with bit n set when the doctor works minute n after
+midnight. Checking that an appointment falls in working time is then a
+single mask test, and a day's working intervals are read off the bitmap.
+
+Compiled schedules are cached per doctor under a key that includes the
+profile's updated_at, which changes whenever the schedule does, so every
+process sees edits without explicit invalidation. Profiles without
+schedule blocks fall back to their free-text available_days /
+available_time.
+"""
+import re
+
+from django.core.cache import cache
+
+from .models import DoctorProfile, DoctorSchedule, ScheduleException
+
+MINUTES_PER_DAY = 24 * 60
+
+FULL_DAY = (1 << MINUTES_PER_DAY) - 1
+
+# Used when the profile leaves the hours blank or they cannot be read
+DEFAULT_HOURS = ((9 * 60, 17 * 60),)
+
+DEFAULT_SLOT_MINUTES = 30
+
+CACHE_TIMEOUT = 60 * 60
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+TIME_RE = re.compile(r'(\d{1,2})(?:[:.](\d{2}))?\s*([ap])?\.?\s*m?\.?', re.IGNORECASE)
+
+
+def minute_mask(start, end):
+    """Bitmap of the minutes in [start, end)"""
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+
+def intervals_of(mask):
+    """Sorted, merged (start, end) intervals of the set bits of a bitmap"""
+    intervals = []
+    offset = 0
+    while mask:
+        zeros = (mask & -mask).bit_length() - 1
+        mask >>= zeros
+        offset += zeros
+        # Lowest clear bit marks the end of the run of set bits
+        ones = (~mask & (mask + 1)).bit_length() - 1
+        intervals.append((offset, offset + ones))
+        mask >>= ones
+        offset += ones
+    return intervals
+
+
+def _minute(value):
+    return value.hour * 60 + value.minute
+
+
+def _weekday(word):
+    word = word.strip().casefold()[:3]
+    return WEEKDAYS.index(word) if word in WEEKDAYS else None
+
+
+def parse_days(text):
+    """
+    Weekdays (0 = Monday) from text like 'Monday, Wednesday, Friday' or
+    'Mon-Fri'. None means every day, as when the field is blank
+    """
+    days = set()
+    for part in re.split(r'[,;/&]|\band\b', text or '', flags=re.IGNORECASE):
+        bounds = re.split(r'\s*(?:-|–|\bto\b)\s*', part.strip(), flags=re.IGNORECASE)
+        weekdays = [_weekday(bound) for bound in bounds if bound]
+        if not weekdays or None in weekdays:
+            continue
+        first, last = weekdays[0], weekdays[-1]
+        days.update((first + i) % 7 for i in range((last - first) % 7 + 1))
+    return frozenset(days) or None
+
+
+def _minutes(hour, minute, meridiem):
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem.lower() == 'p' else 0)
+    return hour * 60 + minute
+
+
+def parse_hours(text):
+    """
+    Working intervals from text like '9:00 AM - 5:00 PM' or
+    '09:00-13:00, 14:00-18:00'. Falls back to DEFAULT_HOURS. Starts are
+    rounded up to a booking block boundary, like structured schedules
+    """
+    from appointments.booking import CLAIM_MINUTES
+
+    mask = 0
+    for part in re.split(r'[,;&]|\band\b', text or '', flags=re.IGNORECASE):
+        times = TIME_RE.findall(part)
+        if len(times) != 2:
+            continue
+        (h1, m1, p1), (h2, m2, p2) = times
+        # '9 - 5 PM' means 9 AM to 5 PM
+        if p2 and not p1 and int(h1) % 12 > int(h2) % 12:
+            p1 = 'a'
+        elif p2 and not p1:
+            p1 = p2
+        start, end = _minutes(h1, m1, p1), _minutes(h2, m2, p2)
+        start += -start % CLAIM_MINUTES
+        if 0 <= start < end <= MINUTES_PER_DAY:
+            mask |= minute_mask(start, end)
+    return tuple(intervals_of(mask)) or DEFAULT_HOURS
+
+
+class CompiledSchedule:
+    """
+    A doctor's working minutes as bitmaps
+    weekly holds one bitmap per weekday (0 = Monday); exceptions maps a
+    date to (closed, opened) bitmaps applied on top of its weekday, time
+    off taking precedence over extra hours
+    """
+
+    def __init__(self, weekly, exceptions=None, slot_minutes=DEFAULT_SLOT_MINUTES):
+        self.weekly = tuple(weekly)
+        self.exceptions = exceptions or {}
+        self.slot_minutes = slot_minutes
+
+    @classmethod
+    def from_text(cls, available_days='', available_time='', **kwargs):
+        days = parse_days(available_days)
+        hours = 0
+        for start, end in parse_hours(available_time):
+            hours |= minute_mask(start, end)
+        return cls(
+            [hours if days is None or weekday in days else 0 for weekday in range(7)],
+            **kwargs
+        )
+
+    def mask(self, day):
+        """Working minutes of a date"""
+        mask = self.weekly[day.weekday()]
+        if day in self.exceptions:
+            closed, opened = self.exceptions[day]
+            mask = (mask | opened) & ~closed
+        return mask
+
+    def on(self, day):
+        """Working intervals of a date"""
+        return intervals_of(self.mask(day))
+
+    def covers(self, day, start, duration):
+        """Whether the doctor works the whole of [start, start + duration) on a date"""
+        if start < 0 or start + duration > MINUTES_PER_DAY:
+            return False
+        need = minute_mask(start, start + duration)
+        return self.mask(day) & need == need
+
+
+def compile_schedules(profiles):
+    """
+    {doctor_id: CompiledSchedule} for (profile_id, doctor_id, slot_minutes,
+    available_days, available_time) rows, reading blocks and exceptions in
+    one query each
+    """
+    by_profile = {row[0]: row for row in profiles}
+    weekly = {profile_id: [0] * 7 for profile_id in by_profile}
+    structured = set()
+    blocks = DoctorSchedule.objects.filter(profile_id__in=by_profile).values_list(
+        'profile_id', 'weekday', 'start_time', 'end_time'
+    )
+    for profile_id, weekday, start_time, end_time in blocks:
+        weekly[profile_id][weekday] |= minute_mask(_minute(start_time), _minute(end_time))
+        structured.add(profile_id)
+
+    exceptions = {profile_id: {} for profile_id in by_profile}
+    rows = ScheduleException.objects.filter(profile_id__in=by_profile).values_list(
+        'profile_id', 'date', 'start_time', 'end_time', 'is_available'
+    )
+    for profile_id, day, start_time, end_time, is_available in rows:
+        if start_time is None:
+            mask = FULL_DAY
+        else:
+            mask = minute_mask(_minute(start_time), _minute(end_time or start_time))
+        closed, opened = exceptions[profile_id].get(day, (0, 0))
+        if is_available:
+            opened |= mask
+        else:
+            closed |= mask
+        exceptions[profile_id][day] = (closed, opened)
+
+    schedules = {}
+    for profile_id, (_, doctor_id, slot_minutes, available_days, available_time) in by_profile.items():
+        if profile_id in structured:
+            schedules[doctor_id] = CompiledSchedule(
+                weekly[profile_id], exceptions[profile_id], slot_minutes
+            )
+        else:
+            schedules[doctor_id] = CompiledSchedule.from_text(
+                available_days, available_time,
+                exceptions=exceptions[profile_id], slot_minutes=slot_minutes
+            )
+    return schedules
+
+
+def default_schedule():
+    """Schedule of a doctor without a profile"""
+    return CompiledSchedule.from_text()
+
+
+def _cache_key(doctor_id, version):
+    return f'doctor_schedule:{doctor_id}:{version.timestamp()}'
+
+
+def get_schedules(doctor_ids, versions=None):
+    """
+    {doctor_id: CompiledSchedule}, compiled once per schedule change
+    versions is {doctor_id: profile updated_at} when the caller already has
+    it; otherwise it is read in one query. Doctors without a profile get
+    the default hours.
+    """
+    if versions is None:
+        versions = dict(DoctorProfile.objects.filter(user_id__in=doctor_ids).values_list(
+            'user_id', 'updated_at'
+        ))
+    schedules = {}
+
+    keys = {_cache_key(doctor_id, version): doctor_id for doctor_id, version in versions.items()}
+    for key, schedule in cache.get_many(keys).items():
+        schedules[keys[key]] = schedule
+
+    missing = [doctor_id for doctor_id in versions if doctor_id not in schedules]
+    if missing:
+        profiles = DoctorProfile.objects.filter(user_id__in=missing).values_list(
+            'id', 'user_id', 'slot_minutes', 'available_days', 'available_time'
+        )
+        compiled = compile_schedules(profiles)
+        schedules.update(compiled)
+        cache.set_many(
+            {_cache_key(doctor_id, versions[doctor_id]): schedule for doctor_id, schedule in compiled.items()},
+            CACHE_TIMEOUT
+        )
+    for doctor_id in doctor_ids:
+        if doctor_id not in schedules:
+            schedules[doctor_id] = default_schedule()
+    return schedules
+
+
+def get_schedule(doctor_id):
+    return get_schedules([doctor_id])[doctor_id]
@@ -2,7 +2,29 @@
 Serializers for Doctor Profile and Patient Assignment
 """
 from rest_framework import serializers
-from .models import DoctorProfile, DoctorPatientAssignment
+from appointments.booking import CLAIM_MINUTES
+from .models import DoctorProfile, DoctorPatientAssignment, DoctorSchedule, ScheduleException
+
+
+def validate_slot_length(value):
+    """
+    Slots must be whole booking blocks, or two adjacent slots would share
+    a block and the second booking would be refused
+    """
+    if not 5 <= value <= 8 * 60 or value % CLAIM_MINUTES:
+        raise serializers.ValidationError(
+            f"Slot length must be a multiple of {CLAIM_MINUTES} minutes between 5 and 480"
+        )
+    return value
+
+
+def validate_block_start(start_time):
+    """Working time starts on a booking block boundary, like the slots in it"""
+    if start_time is not None and (start_time.minute % CLAIM_MINUTES or start_time.second):
+        raise serializers.ValidationError(
+            f"start_time must be on a {CLAIM_MINUTES}-minute boundary"
+        )
+
 
 class DoctorProfileSerializer(serializers.ModelSerializer):
     """
@@ -16,9 +38,13 @@ class DoctorProfileSerializer(serializers.ModelSerializer):
             'id', 'user', 'user_details', 'specialization', 'license_number',
             'qualification', 'experience_years', 'office_address',
             'consultation_fee', 'available_days', 'available_time',
-            'bio', 'created_at', 'updated_at'
+            'slot_minutes', 'bio', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+        select_related = ['user']
+    
+    def validate_slot_minutes(self, value):
+        return validate_slot_length(value)
     
     def get_user_details(self, obj):
         """Get basic user information"""
@@ -45,6 +71,7 @@ class DoctorPatientAssignmentSerializer(serializers.ModelSerializer):
             'assigned_date', 'is_active', 'notes'
         ]
         read_only_fields = ['id', 'assigned_date']
+        select_related = ['doctor', 'patient']
 
 
 class AssignedPatientSerializer(serializers.Serializer):
@@ -58,4 +85,51 @@ class AssignedPatientSerializer(serializers.Serializer):
     last_name = serializers.CharField()
     phone = serializers.CharField()
     assigned_date = serializers.DateTimeField()
-    is_active = serializers.BooleanField()
\ No newline at end of file
+    is_active = serializers.BooleanField()
+
+
+class DoctorScheduleSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a weekly schedule block
+    """
+    weekday_name = serializers.CharField(source='get_weekday_display', read_only=True)
+    
+    class Meta:
+        model = DoctorSchedule
+        fields = ['id', 'weekday', 'weekday_name', 'start_time', 'end_time']
+        read_only_fields = ['id']
+    
+    def validate(self, data):
+        if data['start_time'] >= data['end_time']:
+            raise serializers.ValidationError("start_time must be before end_time")
+        validate_block_start(data['start_time'])
+        return data
+
+
+class WeeklyScheduleSerializer(serializers.Serializer):
+    """
+    Serializer replacing a doctor's whole weekly schedule
+    """
+    blocks = DoctorScheduleSerializer(many=True)
+    slot_minutes = serializers.IntegerField(required=False, validators=[validate_slot_length])
+
+
+class ScheduleExceptionSerializer(serializers.ModelSerializer):
+    """
+    Serializer for time off and extra hours on a date
+    """
+    class Meta:
+        model = ScheduleException
+        fields = ['id', 'date', 'start_time', 'end_time', 'is_available', 'reason']
+        read_only_fields = ['id']
+    
+    def validate(self, data):
+        start_time, end_time = data.get('start_time'), data.get('end_time')
+        if (start_time is None) != (end_time is None):
+            raise serializers.ValidationError("Give both start_time and end_time, or neither for the whole day")
+        if start_time is not None and start_time >= end_time:
+            raise serializers.ValidationError("start_time must be before end_time")
+        if start_time is None and data.get('is_available'):
+            raise serializers.ValidationError("Extra hours need a start_time and end_time")
+        validate_block_start(start_time)
+        return data
@@ -0,0 +1,21 @@
+"""
+Signal handlers for Doctors
+Bumps DoctorProfile.updated_at when a schedule block or exception changes,
+which retires the doctor's cached compiled schedule
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import DoctorProfile, DoctorSchedule, ScheduleException
+
+
+@receiver(post_save, sender=DoctorSchedule)
+@receiver(post_delete, sender=DoctorSchedule)
+@receiver(post_save, sender=ScheduleException)
+@receiver(post_delete, sender=ScheduleException)
+def touch_doctor_profile(sender, instance, **kwargs):
+    """Bump the profile's updated_at when its schedule changes"""
+    DoctorProfile.objects.filter(pk=instance.profile_id).update(
+        updated_at=timezone.now()
+    )
@@ -1,3 +1,49 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .models import DoctorPatientAssignment, DoctorProfile
+
+User = get_user_model()
+
+
+class ListQueryTests(TestCase):
+    """Each list costs the same number of queries for one row and for many"""
+
+    def setUp(self):
+        self.doctor = User.objects.create_user('doc', password='pw', role='DOCTOR')
+        self.patient = User.objects.create_user('pat', password='pw', role='PATIENT')
+        self.client = APIClient()
+        self.rows = 0
+
+    def seed(self, count):
+        for i in range(self.rows, count):
+            doctor = User.objects.create_user(f'doc{i}', password='pw', role='DOCTOR')
+            DoctorProfile.objects.create(
+                user=doctor,
+                specialization='GENERAL',
+                license_number=f'LIC-{i}',
+                qualification='MBBS'
+            )
+            patient = User.objects.create_user(f'pat{i}', password='pw', role='PATIENT')
+            DoctorPatientAssignment.objects.create(doctor=self.doctor, patient=patient)
+        self.rows = count
+
+    def assertListQueries(self, name, user, expected):
+        self.client.force_authenticate(user)
+        for count in (1, 5):
+            self.seed(count)
+            with self.assertNumQueries(expected):
+                response = self.client.get(reverse(name), {'page_size': count})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), count)
+
+    def test_doctor_list(self):
+        self.assertListQueries('doctor-list', self.patient, 1)
+
+    def test_search(self):
+        self.assertListQueries('search-doctors', self.patient, 1)
+
+    def test_assigned_patients(self):
+        self.assertListQueries('assigned-patients', self.doctor, 1)
@@ -12,6 +12,11 @@ urlpatterns = [
     path('search/', views.search_doctors, name='search-doctors'),
     path('<int:doctor_id>/', views.doctor_detail, name='doctor-detail'),
     
+    # Schedule endpoints
+    path('schedule/', views.doctor_schedule, name='doctor-schedule'),
+    path('schedule/exceptions/', views.schedule_exceptions, name='schedule-exceptions'),
+    path('schedule/exceptions/<int:exception_id>/', views.delete_schedule_exception, name='delete-schedule-exception'),
+    
     # Patient Assignment endpoints
     path('patients/', views.assigned_patients, name='assigned-patients'),
     path('patients/assign/', views.assign_patient, name='assign-patient'),
@@ -7,14 +7,21 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from datetime import date
 
-from .models import DoctorProfile, DoctorPatientAssignment
+from .models import DoctorProfile, DoctorPatientAssignment, DoctorSchedule, ScheduleException
 from .serializers import (
     DoctorProfileSerializer,
     DoctorPatientAssignmentSerializer,
-    AssignedPatientSerializer
+    AssignedPatientSerializer,
+    DoctorScheduleSerializer,
+    WeeklyScheduleSerializer,
+    ScheduleExceptionSerializer
 )
 from .permissions import IsDoctor
+from healthcare_backend.pagination import KeysetPagination
+from healthcare_backend.prefetch import with_relations
 
 User = get_user_model()
 
@@ -74,9 +81,11 @@ def doctor_list(request):
     """
     Get list of all doctors (for patient booking)
     """
-    doctors = DoctorProfile.objects.select_related('user').all()
-    serializer = DoctorProfileSerializer(doctors, many=True)
-    return Response(serializer.data)
+    doctors = DoctorProfile.objects.all()
+    paginator = KeysetPagination(['id'])
+    page = paginator.paginate_queryset(with_relations(doctors, DoctorProfileSerializer), request)
+    serializer = DoctorProfileSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['GET'])
@@ -101,8 +110,9 @@ def assigned_patients(request):
         is_active=True
     ).select_related('patient')
     
+    paginator = KeysetPagination()
     patients_data = []
-    for assignment in assignments:
+    for assignment in paginator.paginate_queryset(assignments, request):
         patient = assignment.patient
         patients_data.append({
             'id': patient.id,
@@ -116,7 +126,7 @@ def assigned_patients(request):
         })
     
     serializer = AssignedPatientSerializer(patients_data, many=True)
-    return Response(serializer.data)
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['POST'])
@@ -203,7 +213,7 @@ def search_doctors(request):
     specialization = request.query_params.get('specialization', '')
     name = request.query_params.get('name', '')
     
-    doctors = DoctorProfile.objects.select_related('user').all()
+    doctors = DoctorProfile.objects.all()
     
     if specialization:
         doctors = doctors.filter(specialization__icontains=specialization)
@@ -215,5 +225,85 @@ def search_doctors(request):
             user__last_name__icontains=name
         )
     
-    serializer = DoctorProfileSerializer(doctors, many=True)
-    return Response(serializer.data)
\ No newline at end of file
+    paginator = KeysetPagination(['id'])
+    page = paginator.paginate_queryset(with_relations(doctors, DoctorProfileSerializer), request)
+    serializer = DoctorProfileSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+def _profile_required():
+    return Response({
+        'error': 'Profile does not exist. Create one first.'
+    }, status=status.HTTP_404_NOT_FOUND)
+
+
+@api_view(['GET', 'PUT'])
+@permission_classes([IsAuthenticated, IsDoctor])
+def doctor_schedule(request):
+    """
+    Get or replace the current doctor's weekly schedule
+    PUT body: blocks (weekday 0 = Monday, start_time, end_time), slot_minutes
+    """
+    profile = DoctorProfile.objects.filter(user=request.user).first()
+    if profile is None:
+        return _profile_required()
+    
+    if request.method == 'PUT':
+        serializer = WeeklyScheduleSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        with transaction.atomic():
+            profile.schedule_blocks.all().delete()
+            DoctorSchedule.objects.bulk_create([
+                DoctorSchedule(profile=profile, **block)
+                for block in serializer.validated_data['blocks']
+            ])
+            profile.slot_minutes = serializer.validated_data.get('slot_minutes', profile.slot_minutes)
+            # Saving bumps updated_at, which retires the cached schedule
+            profile.save(update_fields=['slot_minutes', 'updated_at'])
+    
+    return Response({
+        'slot_minutes': profile.slot_minutes,
+        'blocks': DoctorScheduleSerializer(profile.schedule_blocks.all(), many=True).data,
+        'exceptions': ScheduleExceptionSerializer(
+            profile.schedule_exceptions.filter(date__gte=date.today()), many=True
+        ).data,
+    })
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated, IsDoctor])
+def schedule_exceptions(request):
+    """
+    List the current doctor's upcoming time off and extra hours, or add one
+    """
+    profile = DoctorProfile.objects.filter(user=request.user).first()
+    if profile is None:
+        return _profile_required()
+    
+    if request.method == 'GET':
+        exceptions = profile.schedule_exceptions.filter(date__gte=date.today())
+        serializer = ScheduleExceptionSerializer(exceptions, many=True)
+        return Response(serializer.data)
+    
+    serializer = ScheduleExceptionSerializer(data=request.data)
+    if serializer.is_valid():
+        serializer.save(profile=profile)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['DELETE'])
+@permission_classes([IsAuthenticated, IsDoctor])
+def delete_schedule_exception(request, exception_id):
+    """
+    Remove one of the current doctor's schedule exceptions
+    """
+    exception = get_object_or_404(
+        ScheduleException,
+        id=exception_id,
+        profile__user=request.user
+    )
+    exception.delete()
+    return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,158 @@
+"""
+Access-checked file downloads
+Serves stored files in chunks with HTTP Range support, or hands them to the
+web server with X-Accel-Redirect / X-Sendfile so they never pass through
+Python. Views check access before calling serve_file().
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header
+from rest_framework import serializers
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _file_etag(name, size):
+    # Content-addressed names already identify the content
+    return f'"{os.path.splitext(os.path.basename(name))[0]}-{size}"'
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single byte range, None to send the whole
+    file, or False if the range cannot be satisfied. Multiple ranges are
+    answered with the whole file, which RFC 9110 allows
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        # A last byte before the first makes the range invalid, not
+        # unsatisfiable, so it is ignored
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            return False
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        suffix = int(last)
+        if suffix == 0:
+            return False
+        start, end = max(size - suffix, 0), size - 1
+    return start, end
+
+
+def _read_range(handle, start, length):
+    try:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+def serve_file(request, storage, name, filename, as_attachment=True):
+    """
+    Response streaming a stored file, None if it does not exist
+    The backend is chosen by settings.PROTECTED_FILES['OFFLOAD']: None
+    streams from Django, 'X-Accel-Redirect' (nginx) and 'X-Sendfile'
+    (Apache, lighttpd) let the web server send the file
+    """
+    options = getattr(settings, 'PROTECTED_FILES', {})
+    offload = options.get('OFFLOAD')
+    path = storage.path(name)
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return None
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    etag = _file_etag(name, size)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None and offload:
+        # The web server handles Range and conditional requests itself
+        response = HttpResponse(content_type=content_type)
+        if offload == 'X-Accel-Redirect':
+            response['X-Accel-Redirect'] = options.get('INTERNAL_URL', '/protected/') + quote(name)
+        else:
+            response['X-Sendfile'] = path
+    elif response is None:
+        byte_range = None
+        if 'HTTP_RANGE' in request.META and request.META.get('HTTP_IF_RANGE', etag) == etag:
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        elif byte_range is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(open(path, 'rb'), start, end - start + 1),
+                status=206,
+                content_type=content_type
+            )
+            response['Content-Length'] = str(end - start + 1)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    if response.status_code != 304:
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    # Patient files may be kept by the browser but not by shared caches
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def download_name(field_file, stem):
+    """Attachment name built from a readable stem and the stored extension"""
+    extension = os.path.splitext(field_file.name)[1]
+    return f'{stem}{extension}'
+
+
+class FileDownloadRenderer(BaseRenderer):
+    """
+    Accepts any client Accept header on the download views
+    The views return file responses directly; error payloads are still JSON
+    """
+    media_type = '*/*'
+    format = 'file'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
+
+
+class ProtectedFileField(serializers.FileField):
+    """
+    FileField whose representation is the access-checked download URL
+    instead of the MEDIA_URL, which is not served
+    """
+    def __init__(self, view_name, **kwargs):
+        self.view_name = view_name
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = reverse(self.view_name, args=[value.instance.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
@@ -0,0 +1,115 @@
+"""
+Keyset (cursor) pagination for list endpoints
+Pages are read with a WHERE on the ordering columns instead of an OFFSET,
+so with an index on those columns every page costs the same however deep
+the client scrolls, and rows inserted meanwhile never shift a page.
+
+The cursor is an opaque token holding the ordering values of the last row
+sent. Ties are broken by the primary key, so the ordering is total.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only cursor pagination over any ordering of local fields
+    ordering defaults to the model's Meta.ordering. Responses are
+    {'next': url or None, 'results': [...]}
+    """
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering=None):
+        self.ordering = ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def _keys(self, model):
+        ordering = list(self.ordering or model._meta.ordering or ['pk'])
+        keys = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+        keys = [('pk' if name == 'id' else name, descending) for name, descending in keys]
+        if not any(name == 'pk' for name, _ in keys):
+            keys.append(('pk', keys[0][1]))
+        return keys
+
+    def encode_cursor(self, values):
+        data = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in values])
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, model, keys):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            if not isinstance(values, list) or len(values) != len(keys):
+                raise ValueError
+            fields = [model._meta.pk if name == 'pk' else model._meta.get_field(name) for name, _ in keys]
+            return [field.to_python(value) for field, value in zip(fields, values)]
+        except (ValueError, TypeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _after(self, keys, values):
+        """Rows strictly after values in keys order"""
+        condition = None
+        for (name, descending), value in reversed(list(zip(keys, values))):
+            after = Q(**{f'{name}__{"lt" if descending else "gt"}': value})
+            condition = after if condition is None else after | (Q(**{name: value}) & condition)
+        # Redundant bound on the leading column, so the index is read as a range
+        name, descending = keys[0]
+        return Q(**{f'{name}__{"lte" if descending else "gte"}': values[0]}) & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        keys = self._keys(queryset.model)
+        queryset = queryset.order_by(*[f'-{name}' if descending else name for name, descending in keys])
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self._after(keys, self.decode_cursor(cursor, queryset.model, keys)))
+
+        page_size = self.get_page_size(request)
+        rows = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            self.next_cursor = self.encode_cursor([
+                last.pk if name == 'pk' else getattr(last, name) for name, _ in keys
+            ])
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
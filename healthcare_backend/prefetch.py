@@ -0,0 +1,56 @@
+"""
+Query Planning for Serializers
+A serializer declares the relations its fields read in its Meta:
+select_related for forward foreign keys, which are joined into the main
+query, and prefetch_related for reverse and many-to-many relations, read
+in one extra query each. Nested serializers add their own declarations
+under the field's source. List views pass their queryset through
+with_relations(), so a page costs the same number of queries however many
+rows it holds:
+
+    prescriptions = with_relations(prescriptions, PrescriptionSerializer)
+"""
+from functools import lru_cache
+
+from rest_framework import serializers
+
+
+def _path(source):
+    return source.replace('.', '__')
+
+
+def _nested(serializer_class):
+    """(source, child serializer class, many) of the nested serializers a serializer outputs"""
+    for field in serializer_class().fields.values():
+        many = isinstance(field, serializers.ListSerializer)
+        child = field.child if many else field
+        if isinstance(child, serializers.BaseSerializer) and not field.write_only and field.source != '*':
+            yield _path(field.source), type(child), many
+
+
+@lru_cache(maxsize=None)
+def relations(serializer_class):
+    """(select_related, prefetch_related) lookups a serializer's output reads"""
+    meta = getattr(serializer_class, 'Meta', None)
+    select = tuple(getattr(meta, 'select_related', ()))
+    prefetch = tuple(getattr(meta, 'prefetch_related', ()))
+    for source, child, many in _nested(serializer_class):
+        child_select, child_prefetch = relations(child)
+        if many:
+            # prefetch_related follows foreign keys too, so the child's joins
+            # become part of the same prefetch
+            prefetch += (source,) + tuple(f'{source}__{path}' for path in child_select + child_prefetch)
+        else:
+            select += (source,) + tuple(f'{source}__{path}' for path in child_select)
+            prefetch += tuple(f'{source}__{path}' for path in child_prefetch)
+    return select, prefetch
+
+
+def with_relations(queryset, serializer_class):
+    """queryset with the select_related and prefetch_related serializer_class needs"""
+    select, prefetch = relations(serializer_class)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
@@ -77,6 +77,48 @@ DATABASES = {
     }
 }
 
+# Caches
+# lab_charts holds rendered lab charts; LocMemCache evicts least recently used
+# entries once MAX_ENTRIES is reached
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'lab_charts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'lab-charts',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 256,
+            'CULL_FREQUENCY': 8,
+        },
+    },
+}
+
+# Lab chart rendering pool (lab_reports.rendering)
+# WORKERS = 0 renders in the request thread instead of a process pool
+LAB_CHART_RENDERER = {
+    'WORKERS': 2,
+    'MAX_PENDING': 16,
+    'TIMEOUT': 10,
+}
+
+# Background pre-rendering of new reports' charts (lab_reports.prerender)
+# IN_PROCESS runs jobs on a thread of the web process, which a per-process
+# LocMemCache needs; with a shared cache set it to False and run the
+# run_chart_jobs command instead
+LAB_CHART_PRERENDER = {
+    'IN_PROCESS': True,
+    'POLL_INTERVAL': 30,
+}
+
+# Slot holds (appointments.booking): seconds a reserved slot stays held
+# while the patient completes booking. Expired holds stop blocking at once;
+# run the sweep_slot_holds command to delete their rows
+APPOINTMENT_HOLDS = {
+    'TTL': 5 * 60,
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -107,6 +149,31 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploads are hashed while they stream in and stored once per content
+# (healthcare_backend.storage); they are only served by access-checked views
+STORAGES = {
+    'default': {
+        'BACKEND': 'healthcare_backend.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+FILE_UPLOAD_HANDLERS = [
+    'healthcare_backend.storage.HashingMemoryFileUploadHandler',
+    'healthcare_backend.storage.HashingTemporaryFileUploadHandler',
+]
+
+# How file downloads are sent (healthcare_backend.downloads)
+# OFFLOAD: None streams from Django; 'X-Accel-Redirect' for nginx with an
+# internal location at INTERNAL_URL aliased to MEDIA_ROOT; 'X-Sendfile' for
+# Apache mod_xsendfile or lighttpd
+PROTECTED_FILES = {
+    'OFFLOAD': None,
+    'INTERNAL_URL': '/protected/',
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
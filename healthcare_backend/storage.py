@@ -0,0 +1,93 @@
+"""
+Content-addressed file storage for uploads
+Files are stored under the SHA-256 of their content, so an identical file
+uploaded twice is kept on disk once
+"""
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.core.files.utils import validate_file_name
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class HashingMemoryFileUploadHandler(MemoryFileUploadHandler):
+    """MemoryFileUploadHandler that hashes small uploads as they arrive"""
+
+    def new_file(self, *args, **kwargs):
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.activated:
+            self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.sha256 = self.sha256.hexdigest()
+        return uploaded
+
+
+class HashingTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """TemporaryFileUploadHandler that hashes large uploads while streaming them to disk"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.sha256.hexdigest()
+        return uploaded
+
+
+def content_hash(content):
+    """SHA-256 of a file, read in chunks; reuses the hash taken during upload"""
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    sha256 = hashlib.sha256()
+    for chunk in content.chunks(CHUNK_SIZE):
+        sha256.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+    content.seek(0)
+    return sha256.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage naming files <upload_to>/<sha[:2]>/<sha><ext>
+    Saving content that is already stored writes nothing and returns the
+    existing name. Stored files may be shared, so they are never
+    overwritten or renamed.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        directory, filename = posixpath.split(str(name).replace('\\', '/'))
+        extension = os.path.splitext(filename)[1].lower()[:16]
+        digest = content_hash(content)
+        name = posixpath.join(directory, digest[:2], digest + extension)
+        validate_file_name(name, allow_relative_path=True)
+
+        if self.exists(name):
+            return name
+        saved = self._save(name, content)
+        if saved != name:
+            # A concurrent upload of the same content won the race and ours
+            # was saved under an alternative name
+            self.delete(saved)
+        return name
@@ -0,0 +1,505 @@
+"""
+Synthetic Data
+Fills the database with fake doctors, patients and their records shaped
+like production, for benchmarks, load tests and index tuning. The same
+seed, sizes and anchor date always give the same rows.
+
+- Patients are spread over doctors unevenly (log-normal panel sizes)
+- Each patient has an activity level, log-normal with mean 1, that
+  scales all of their records: a few chronic patients have many
+  appointments and reports, most have few
+- Lab reports are panels of related parameters whose values wander
+  around a per-patient baseline, so trends look like trends
+- A doctor's appointments never overlap, and the active ones claim their
+  slots like real bookings do
+
+Rows are written as tuples with executemany in chunks, with primary keys
+allocated up front so children can point at their parents without
+reading them back. At this volume compiling SQL per value costs far more
+than the insert itself, so it is skipped, and with it the signals. What
+the signals derive comes from the same helpers on unsaved instances: slot
+claims from claimed_minutes, lab flags and canonical values from
+flag_parameters and normalize_parameters, a chunk of results at a time.
+The parameter catalog is rebuilt with rebuild_parameter_catalog once the
+results are in. Nothing else should write to these tables while it runs.
+"""
+import random
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from appointments.booking import claimed_minutes
+from appointments.models import Appointment, AppointmentSlotClaim
+from doctors.models import DoctorPatientAssignment, DoctorProfile
+from lab_reports.catalog import rebuild_parameter_catalog
+from lab_reports.models import LabReport, LabTestParameter, PatientParameterSummary
+from lab_reports.references import ReferenceCatalog, flag_parameters
+from lab_reports.units import normalize_parameters
+from patients.models import MedicalHistory, PatientProfile
+from prescriptions.models import Medicine, Prescription
+
+User = get_user_model()
+
+# name: (unit, normal_min, normal_max)
+LAB_PARAMETERS = {
+    'Hemoglobin': ('g/dL', 13.5, 17.5),
+    'WBC': ('10^3/uL', 4.0, 11.0),
+    'Platelets': ('10^3/uL', 150, 450),
+    'Hematocrit': ('%', 38.3, 48.6),
+    'Glucose': ('mg/dL', 70, 99),
+    'HbA1c': ('%', 4.0, 5.6),
+    'Total Cholesterol': ('mg/dL', 125, 200),
+    'HDL Cholesterol': ('mg/dL', 40, 60),
+    'LDL Cholesterol': ('mg/dL', 50, 130),
+    'Triglycerides': ('mg/dL', 50, 150),
+    'Creatinine': ('mg/dL', 0.7, 1.3),
+    'Urea': ('mg/dL', 7, 20),
+    'Sodium': ('mmol/L', 135, 145),
+    'Potassium': ('mmol/L', 3.5, 5.1),
+    'ALT': ('U/L', 7, 56),
+    'AST': ('U/L', 10, 40),
+    'TSH': ('mIU/L', 0.4, 4.0),
+    'Vitamin D': ('ng/mL', 30, 100),
+}
+
+# (test name, test type, parameters, weight)
+LAB_PANELS = [
+    ('Complete Blood Count', 'BLOOD', ['Hemoglobin', 'WBC', 'Platelets', 'Hematocrit'], 30),
+    ('Lipid Panel', 'BLOOD', ['Total Cholesterol', 'HDL Cholesterol', 'LDL Cholesterol', 'Triglycerides'], 20),
+    ('Metabolic Panel', 'BLOOD', ['Glucose', 'Creatinine', 'Urea', 'Sodium', 'Potassium'], 20),
+    ('Diabetes Panel', 'BLOOD', ['Glucose', 'HbA1c'], 12),
+    ('Liver Function Test', 'BLOOD', ['ALT', 'AST'], 8),
+    ('Thyroid Panel', 'BLOOD', ['TSH'], 6),
+    ('Vitamin D', 'BLOOD', ['Vitamin D'], 4),
+]
+
+MEDICINES = [
+    'Amoxicillin', 'Metformin', 'Atorvastatin', 'Lisinopril', 'Omeprazole',
+    'Amlodipine', 'Levothyroxine', 'Paracetamol', 'Ibuprofen', 'Cetirizine',
+    'Azithromycin', 'Pantoprazole', 'Losartan', 'Salbutamol', 'Vitamin D3',
+]
+
+DIAGNOSES = [
+    'Hypertension', 'Type 2 diabetes', 'Upper respiratory infection', 'Hypothyroidism',
+    'Gastritis', 'Hyperlipidemia', 'Allergic rhinitis', 'Back pain', 'Asthma', 'Migraine',
+]
+
+REASONS = ['Consultation', 'Follow-up', 'Routine check-up', 'Test results', 'Prescription renewal']
+
+# Relative number of doctors per specialization
+SPECIALIZATION_WEIGHTS = {
+    'GENERAL': 30, 'CARDIOLOGY': 10, 'NEUROLOGY': 6, 'ORTHOPEDICS': 10, 'PEDIATRICS': 12,
+    'DERMATOLOGY': 8, 'PSYCHIATRY': 6, 'GYNECOLOGY': 9, 'ENT': 5, 'OPHTHALMOLOGY': 4,
+}
+
+FIRST_NAMES = [
+    'Asha', 'Ravi', 'Meera', 'Arjun', 'Priya', 'Vikram', 'Neha', 'Karan', 'Anita', 'Sanjay',
+    'Pooja', 'Rahul', 'Divya', 'Amit', 'Sneha', 'Rohan', 'Kavita', 'Nikhil', 'Isha', 'Manoj',
+]
+
+LAST_NAMES = [
+    'Patil', 'Sharma', 'Iyer', 'Khan', 'Reddy', 'Das', 'Mehta', 'Nair', 'Joshi', 'Gupta',
+    'Kulkarni', 'Singh', 'Menon', 'Bose', 'Desai', 'Rao', 'Pillai', 'Chopra', 'Verma', 'Shah',
+]
+
+SLOT_MINUTES = 30
+
+# 09:00 to 17:00
+SLOTS_PER_DAY = 16
+
+# Appointments run from a year back to two months ahead
+PAST_DAYS = 365
+FUTURE_DAYS = 60
+
+# Lab reports and history entries reach this far back
+HISTORY_DAYS = 3 * 365
+
+# Spread of the log-normal panel sizes and patient activity
+PANEL_SIGMA = 0.6
+ACTIVITY_SIGMA = 0.8
+
+# Patients whose parameter catalog is rebuilt per query
+CATALOG_BATCH = 500
+
+
+class _Table:
+    """
+    Rows waiting to be inserted into one model's table
+    Rows are tuples in the order of columns. Date and time values are
+    converted by their fields; other values must already suit the database.
+    The tables of parents rows point to are flushed first
+    """
+
+    def __init__(self, model, columns, chunk_size, parents=()):
+        self.chunk_size = chunk_size
+        self.parents = parents
+        self.rows = []
+        self.count = 0
+        fields = [model._meta.get_field(column) for column in columns]
+        quote = connection.ops.quote_name
+        self.sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote(model._meta.db_table),
+            ', '.join(quote(field.column) for field in fields),
+            ', '.join(['%s'] * len(fields))
+        )
+        self.adapters = [
+            (index, lru_cache(maxsize=4096)(lambda value, field=field: field.get_db_prep_save(value, connection)))
+            for index, field in enumerate(fields)
+            if isinstance(field, (models.DateField, models.TimeField))
+        ]
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        for parent in self.parents:
+            parent.flush()
+        if not self.rows:
+            return
+        rows = self.rows
+        if self.adapters:
+            rows = [list(row) for row in rows]
+            for row in rows:
+                for index, adapt in self.adapters:
+                    if row[index] is not None:
+                        row[index] = adapt(row[index])
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(self.sql, rows)
+        self.count += len(rows)
+        self.rows = []
+
+
+class SyntheticData:
+    """
+    Writer of one synthetic data set
+    Usernames start with synthetic-<seed>-, so data sets with different
+    seeds can live in one database. All dates are relative to today
+    (default: the current date)
+    """
+
+    def __init__(self, seed=0, chunk_size=10000, log=None, today=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.chunk_size = chunk_size
+        self.log = log or (lambda message: None)
+        self.prefix = f'synthetic-{seed}-'
+        self.today = today or timezone.localdate()
+        self.now = timezone.make_aware(datetime.combine(self.today, time(8)))
+        self._next_ids = {}
+        self._tables = {}
+        self._written = {}
+
+    def _ids(self, model, count):
+        """count unused primary keys of model"""
+        if model not in self._next_ids:
+            last = model.objects.order_by('-pk').values_list('pk', flat=True).first()
+            self._next_ids[model] = (last or 0) + 1
+        first = self._next_ids[model]
+        self._next_ids[model] += count
+        return range(first, first + count)
+
+    def _table(self, model, columns, parents=()):
+        if model not in self._tables:
+            self._tables[model] = _Table(model, columns, self.chunk_size, parents)
+        return self._tables[model]
+
+    def _counts(self):
+        counts = {model._meta.label: table.count for model, table in self._tables.items()}
+        counts.update(self._written)
+        return counts
+
+    def _stage(self, name, write, *args):
+        """Run one generation step, flush what it wrote and log the rate"""
+        started = perf_counter()
+        before = sum(self._counts().values())
+        write(*args)
+        for table in self._tables.values():
+            table.flush()
+        rows = sum(self._counts().values()) - before
+        elapsed = perf_counter() - started
+        self.log(f"{name}: {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-6):.0f} rows/s)")
+
+    def _count(self, mean, activity=1.0):
+        """A row count whose expectation is mean * activity"""
+        expected = mean * activity
+        return int(expected) + (self.rng.random() < expected - int(expected))
+
+    def _days_ago(self, days):
+        return self.today - timedelta(days=self.rng.randint(0, days))
+
+    def _age(self, role):
+        if role == 'DOCTOR':
+            return self.rng.randint(28, 70)
+        # Children, adults and an elderly tail that sees doctors more
+        group = self.rng.choices(('child', 'adult', 'elderly'), (20, 55, 25))[0]
+        if group == 'child':
+            return self.rng.randint(0, 17)
+        if group == 'adult':
+            return self.rng.randint(18, 64)
+        return min(65 + int(self.rng.expovariate(1 / 9)), 100)
+
+    def generate(self, doctors=20, patients=500, appointments=6, prescriptions=2,
+                 reports=3, parameters=None, history=2):
+        """
+        Write doctors and patients, and per patient on average the given
+        number of appointments, prescriptions, lab reports and medical
+        history entries. parameters is the average number of results per
+        lab report (default: as many as the report's panel has).
+        Returns {model label: rows written}
+        """
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise ValueError(f"Synthetic data with seed {self.seed} already exists")
+
+        doctor_ids = list(self._ids(User, doctors))
+        patient_ids = list(self._ids(User, patients))
+        self._stage('users', self._users, doctor_ids, patient_ids)
+        self._stage('doctor profiles', self._doctor_profiles, doctor_ids)
+        self._stage('patient profiles', self._patient_profiles, patient_ids)
+
+        panel_sizes = [self.rng.lognormvariate(0, PANEL_SIGMA) for _ in doctor_ids]
+        doctor_of = dict(zip(patient_ids, self.rng.choices(doctor_ids, panel_sizes, k=len(patient_ids))))
+        activity = {
+            patient_id: self.rng.lognormvariate(-ACTIVITY_SIGMA ** 2 / 2, ACTIVITY_SIGMA)
+            for patient_id in patient_ids
+        }
+
+        self._stage('assignments', self._assignments, doctor_of)
+        self._stage('appointments', self._appointments, doctor_of, activity, appointments)
+        self._stage('prescriptions', self._prescriptions, doctor_of, activity, prescriptions)
+        self._stage('lab reports', self._lab_reports, doctor_of, activity, reports, parameters)
+        self._stage('parameter catalog', self._catalog, patient_ids)
+        self._stage('medical history', self._history, doctor_of, activity, history)
+
+        # Explicit keys leave sequences behind on backends that have them
+        sequences = connection.ops.sequence_reset_sql(no_style(), list(self._next_ids))
+        if sequences:
+            with connection.cursor() as cursor:
+                for sql in sequences:
+                    cursor.execute(sql)
+        return self._counts()
+
+    def _users(self, doctor_ids, patient_ids):
+        users = self._table(User, [
+            'id', 'password', 'last_login', 'is_superuser', 'username', 'first_name', 'last_name',
+            'email', 'is_staff', 'is_active', 'date_joined', 'role', 'phone', 'date_of_birth'
+        ])
+        for role, ids in (('DOCTOR', doctor_ids), ('PATIENT', patient_ids)):
+            for i, user_id in enumerate(ids):
+                username = f'{self.prefix}{role[0].lower()}{i}'
+                born = self.today - timedelta(days=self._age(role) * 365 + self.rng.randint(0, 364))
+                users.add((
+                    user_id, '!', None, False, username,
+                    self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES),
+                    f'{username}@example.com', False, True,
+                    self.now - timedelta(days=self.rng.randint(PAST_DAYS, HISTORY_DAYS)), role,
+                    f'+91{self.rng.randint(7000000000, 9999999999)}', born
+                ))
+
+    def _doctor_profiles(self, doctor_ids):
+        profiles = self._table(DoctorProfile, [
+            'user_id', 'specialization', 'license_number', 'qualification', 'experience_years',
+            'office_address', 'consultation_fee', 'available_days', 'available_time',
+            'slot_minutes', 'bio', 'created_at', 'updated_at'
+        ])
+        specializations = self.rng.choices(
+            list(SPECIALIZATION_WEIGHTS), list(SPECIALIZATION_WEIGHTS.values()), k=len(doctor_ids)
+        )
+        for i, (doctor_id, specialization) in enumerate(zip(doctor_ids, specializations)):
+            profiles.add((
+                doctor_id, specialization, f'{self.prefix}{i}',
+                'MBBS' if specialization == 'GENERAL' else 'MBBS, MD',
+                self.rng.randint(1, 35), '', self.rng.choice((300, 500, 800, 1000, 1500)),
+                'Monday - Friday', '9:00 AM - 5:00 PM', SLOT_MINUTES, '', self.now, self.now
+            ))
+
+    def _patient_profiles(self, patient_ids):
+        blood_groups = [value for value, _ in PatientProfile.BLOOD_GROUP_CHOICES]
+        profiles = self._table(PatientProfile, [
+            'user_id', 'gender', 'blood_group', 'height', 'weight', 'address', 'emergency_contact',
+            'emergency_contact_name', 'allergies', 'chronic_conditions', 'current_medications',
+            'created_at', 'updated_at'
+        ])
+        for patient_id in patient_ids:
+            gender = self.rng.choice('MF')
+            height = self.rng.gauss(172 if gender == 'M' else 159, 8)
+            weight = (height / 100) ** 2 * self.rng.gauss(24, 4)
+            profiles.add((
+                patient_id, gender, self.rng.choice(blood_groups), round(height, 2), round(weight, 2),
+                '', '', '', '', '', '', self.now, self.now
+            ))
+
+    def _assignments(self, doctor_of):
+        assignments = self._table(DoctorPatientAssignment, [
+            'doctor_id', 'patient_id', 'assigned_date', 'is_active', 'notes'
+        ])
+        for patient_id, doctor_id in doctor_of.items():
+            assigned = self.now - timedelta(days=self.rng.randint(PAST_DAYS, HISTORY_DAYS))
+            assignments.add((doctor_id, patient_id, assigned, True, ''))
+
+    def _appointments(self, doctor_of, activity, per_patient):
+        appointments = self._table(Appointment, [
+            'id', 'patient_id', 'doctor_id', 'appointment_date', 'appointment_time',
+            'duration_minutes', 'status', 'reason', 'symptoms', 'doctor_notes',
+            'created_at', 'updated_at'
+        ])
+        claims = self._table(
+            AppointmentSlotClaim, ['doctor_id', 'appointment_id', 'date', 'minute'], [appointments]
+        )
+
+        patients_of = {}
+        for patient_id, doctor_id in doctor_of.items():
+            patients_of.setdefault(doctor_id, []).extend(
+                [patient_id] * self._count(per_patient, activity[patient_id])
+            )
+
+        # A doctor's appointments take distinct working-day slots spread
+        # over the whole period, so they never overlap
+        first_day = self.today - timedelta(days=PAST_DAYS)
+        first_monday = first_day - timedelta(days=first_day.weekday())
+        span = (PAST_DAYS + FUTURE_DAYS) * 5 // 7 * SLOTS_PER_DAY
+        for doctor_id, patients in patients_of.items():
+            self.rng.shuffle(patients)
+            slots = sorted(self.rng.sample(range(max(span, len(patients))), len(patients)))
+            ids = self._ids(Appointment, len(patients))
+            for appointment_id, patient_id, slot in zip(ids, patients, slots):
+                week, weekday = divmod(slot // SLOTS_PER_DAY, 5)
+                day = first_monday + timedelta(weeks=week, days=weekday)
+                minute = 9 * 60 + (slot % SLOTS_PER_DAY) * SLOT_MINUTES
+                start = time(minute // 60, minute % 60)
+                if day < self.today:
+                    status = self.rng.choices(('COMPLETED', 'CANCELLED'), (85, 15))[0]
+                else:
+                    status = self.rng.choices(('CONFIRMED', 'PENDING', 'CANCELLED'), (60, 32, 8))[0]
+                appointments.add((
+                    appointment_id, patient_id, doctor_id, day, start, SLOT_MINUTES, status,
+                    self.rng.choice(REASONS), '', '', self.now, self.now
+                ))
+                booking = Appointment(status=status, appointment_time=start, duration_minutes=SLOT_MINUTES)
+                for claimed in claimed_minutes(booking):
+                    claims.add((doctor_id, appointment_id, day, claimed))
+
+    def _prescriptions(self, doctor_of, activity, per_patient):
+        prescriptions = self._table(Prescription, [
+            'id', 'patient_id', 'doctor_id', 'diagnosis', 'notes', 'prescription_date',
+            'created_at', 'updated_at'
+        ])
+        medicines = self._table(Medicine, [
+            'prescription_id', 'medicine_name', 'dosage', 'dosage_form', 'frequency',
+            'duration_days', 'instructions', 'reminder_enabled', 'reminder_times', 'created_at'
+        ], [prescriptions])
+        for patient_id, doctor_id in doctor_of.items():
+            count = self._count(per_patient, activity[patient_id])
+            for prescription_id in self._ids(Prescription, count):
+                prescriptions.add((
+                    prescription_id, patient_id, doctor_id, self.rng.choice(DIAGNOSES), '',
+                    self._days_ago(2 * 365), self.now, self.now
+                ))
+                for name in self.rng.sample(MEDICINES, self.rng.choices((1, 2, 3, 4), (35, 35, 20, 10))[0]):
+                    frequency = self.rng.choices(
+                        ('ONCE_DAILY', 'TWICE_DAILY', 'THREE_TIMES', 'AS_NEEDED'), (45, 30, 15, 10)
+                    )[0]
+                    reminders = frequency != 'AS_NEEDED' and self.rng.random() < 0.6
+                    medicines.add((
+                        prescription_id, name, f'{self.rng.choice((5, 10, 250, 500, 1000))}mg',
+                        self.rng.choices(('TABLET', 'CAPSULE', 'SYRUP'), (70, 20, 10))[0], frequency,
+                        self.rng.choice((5, 7, 10, 14, 30, 90)), '', reminders,
+                        '08:00,20:00' if reminders else '', self.now
+                    ))
+
+    def _lab_reports(self, doctor_of, activity, per_patient, per_report):
+        reports = self._table(LabReport, [
+            'id', 'patient_id', 'doctor_id', 'test_type', 'test_name', 'test_date', 'report_file',
+            'has_file_previews', 'summary', 'is_normal', 'remarks', 'created_at', 'updated_at'
+        ])
+        results = self._table(LabTestParameter, [
+            'lab_report_id', 'parameter_name', 'value', 'unit', 'canonical_value', 'canonical_unit',
+            'normal_min', 'normal_max', 'reference_range_id', 'flag', 'is_abnormal'
+        ], [reports])
+        panel_weights = [weight for *_, weight in LAB_PANELS]
+        references = ReferenceCatalog()
+        pending = []
+
+        for patient_id, doctor_id in doctor_of.items():
+            count = self._count(per_patient, activity[patient_id])
+            # Where each parameter sits for this patient, in half-widths of
+            # its normal range from the middle; beyond 1 is out of range
+            baseline = {}
+            dates = sorted(self._days_ago(HISTORY_DAYS) for _ in range(count))
+            for report_id, test_date in zip(self._ids(LabReport, count), dates):
+                test_name, test_type, names, _ = self.rng.choices(LAB_PANELS, panel_weights)[0]
+                if per_report is not None:
+                    size = min(max(self._count(per_report), 1), len(LAB_PARAMETERS))
+                    extra = [name for name in LAB_PARAMETERS if name not in names]
+                    names = (names + self.rng.sample(extra, max(size - len(names), 0)))[:size]
+
+                report = LabReport(
+                    id=report_id, patient_id=patient_id, doctor_id=doctor_id,
+                    test_type=test_type, test_name=test_name, test_date=test_date
+                )
+                parameters = []
+                for name in names:
+                    unit, low, high = LAB_PARAMETERS[name]
+                    if name not in baseline:
+                        baseline[name] = self.rng.gauss(0, 0.6)
+                    position = baseline[name] + self.rng.gauss(0, 0.3)
+                    value = round(max((low + high) / 2 + (high - low) / 2 * position, low / 10), 2)
+                    parameters.append(LabTestParameter(
+                        lab_report=report, parameter_name=name, value=value, unit=unit,
+                        normal_min=low, normal_max=high
+                    ))
+                pending.append((report, parameters))
+                if len(pending) >= self.chunk_size // 4:
+                    self._add_lab_reports(reports, results, pending, references)
+                    pending = []
+        self._add_lab_reports(reports, results, pending, references)
+
+    def _add_lab_reports(self, reports, results, pending, references):
+        """Flag and convert the results of a chunk of reports, then queue their rows"""
+        parameters = [parameter for _, items in pending for parameter in items]
+        flag_parameters(parameters, references)
+        normalize_parameters(parameters)
+        for report, items in pending:
+            reports.add((
+                report.id, report.patient_id, report.doctor_id, report.test_type,
+                report.test_name, report.test_date, None, False, '',
+                not any(parameter.is_abnormal for parameter in items), '', self.now, self.now
+            ))
+            for p in items:
+                results.add((
+                    report.id, p.parameter_name, p.value, p.unit, p.canonical_value,
+                    p.canonical_unit, p.normal_min, p.normal_max, p.reference_range_id,
+                    p.flag, p.is_abnormal
+                ))
+
+    def _catalog(self, patient_ids):
+        # The results are flushed, so the catalog is built from what was written
+        written = 0
+        for start in range(0, len(patient_ids), CATALOG_BATCH):
+            written += rebuild_parameter_catalog(patient_ids[start:start + CATALOG_BATCH])
+        label = PatientParameterSummary._meta.label
+        self._written[label] = self._written.get(label, 0) + written
+
+    def _history(self, doctor_of, activity, per_patient):
+        entries = self._table(MedicalHistory, [
+            'patient_id', 'doctor_id', 'entry_type', 'title', 'description', 'date',
+            'attachments', 'created_at'
+        ])
+        entry_types = dict(MedicalHistory.ENTRY_TYPE_CHOICES)
+        for patient_id, doctor_id in doctor_of.items():
+            for _ in range(self._count(per_patient, activity[patient_id])):
+                entry_type = self.rng.choice(list(entry_types))
+                diagnosis = self.rng.choice(DIAGNOSES)
+                day = self._days_ago(HISTORY_DAYS)
+                entries.add((
+                    patient_id, doctor_id, entry_type, f'{entry_types[entry_type]}: {diagnosis}',
+                    f'{diagnosis}, seen on {day.isoformat()}',
+                    timezone.make_aware(datetime.combine(day, time(self.rng.randint(9, 17)))),
+                    None, self.now
+                ))
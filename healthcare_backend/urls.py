@@ -18,7 +18,7 @@ urlpatterns = [
     path('api/lab-reports/', include('lab_reports.urls')),
 ]
 
-# Serve media files in development
+# Serve static files in development; uploaded files are only served by
+# access-checked download views
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
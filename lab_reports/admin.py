@@ -2,13 +2,16 @@
 Admin configuration for Lab Report models
 """
 from django.contrib import admin
-from .models import LabReport, LabTestParameter
+from .models import (
+    LabReport, LabTestParameter, PatientParameterSummary, LabFeedImport, ReferenceRange, ChartRenderJob
+)
 
 class LabTestParameterInline(admin.TabularInline):
     """Inline admin for lab test parameters"""
     model = LabTestParameter
     extra = 1
-    fields = ['parameter_name', 'value', 'unit', 'normal_min', 'normal_max', 'is_abnormal']
+    fields = ['parameter_name', 'value', 'unit', 'normal_min', 'normal_max', 'flag', 'is_abnormal']
+    readonly_fields = ['flag']
 
 @admin.register(LabReport)
 class LabReportAdmin(admin.ModelAdmin):
@@ -19,6 +22,18 @@ class LabReportAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
     inlines = [LabTestParameterInline]
     
+    def save_formset(self, request, form, formset, change):
+        """Classify inline parameters against their reference ranges"""
+        from .references import flag_parameters
+        
+        instances = formset.save(commit=False)
+        flag_parameters([obj for obj in instances if isinstance(obj, LabTestParameter)])
+        for obj in instances:
+            obj.save()
+        for obj in formset.deleted_objects:
+            obj.delete()
+        formset.save_m2m()
+    
     fieldsets = (
         ('Participants', {
             'fields': ('patient', 'doctor')
@@ -37,8 +52,9 @@ class LabReportAdmin(admin.ModelAdmin):
 
 @admin.register(LabTestParameter)
 class LabTestParameterAdmin(admin.ModelAdmin):
-    list_display = ['lab_report', 'parameter_name', 'value', 'unit', 'is_abnormal']
-    list_filter = ['is_abnormal', 'parameter_name']
+    list_display = ['lab_report', 'parameter_name', 'value', 'unit', 'flag', 'is_abnormal']
+    list_filter = ['flag', 'is_abnormal', 'parameter_name']
+    readonly_fields = ['flag', 'reference_range']
     search_fields = ['lab_report__test_name', 'parameter_name']
     
     fieldsets = (
@@ -49,11 +65,49 @@ class LabTestParameterAdmin(admin.ModelAdmin):
             'fields': ('parameter_name', 'value', 'unit')
         }),
         ('Normal Range', {
-            'fields': ('normal_min', 'normal_max', 'is_abnormal')
+            'fields': ('normal_min', 'normal_max', 'reference_range', 'flag', 'is_abnormal')
         }),
     )
     
     def save_model(self, request, obj, form, change):
-        """Auto-check if parameter is abnormal before saving"""
+        """Classify the parameter against its reference range before saving"""
         obj.check_abnormal()
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(ReferenceRange)
+class ReferenceRangeAdmin(admin.ModelAdmin):
+    list_display = ['parameter_name', 'unit', 'sex', 'age_min', 'age_max', 'low', 'high', 'critical_low', 'critical_high']
+    list_filter = ['sex', 'parameter_name']
+    search_fields = ['parameter_name']
+
+
+@admin.register(PatientParameterSummary)
+class PatientParameterSummaryAdmin(admin.ModelAdmin):
+    list_display = ['patient', 'parameter_name', 'unit', 'result_count', 'last_test_date', 'last_value', 'last_is_abnormal']
+    list_filter = ['last_is_abnormal', 'parameter_name']
+    search_fields = ['patient__username', 'parameter_name']
+    readonly_fields = [
+        'patient', 'parameter_name', 'unit', 'result_count', 'first_test_date',
+        'last_test_date', 'last_value', 'last_is_abnormal', 'updated_at'
+    ]
+
+
+@admin.register(LabFeedImport)
+class LabFeedImportAdmin(admin.ModelAdmin):
+    list_display = ['source', 'feed_format', 'byte_offset', 'created_reports', 'rejected_rows', 'updated_at', 'completed_at']
+    list_filter = ['feed_format', 'completed_at']
+    search_fields = ['source']
+    readonly_fields = [
+        'source', 'fingerprint', 'feed_format', 'byte_offset', 'line_number',
+        'created_reports', 'created_parameters', 'rejected_rows',
+        'created_at', 'updated_at', 'completed_at'
+    ]
+
+
+@admin.register(ChartRenderJob)
+class ChartRenderJobAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'patient', 'lab_report', 'parameter_name', 'status', 'attempts', 'updated_at']
+    list_filter = ['kind', 'status']
+    search_fields = ['patient__username', 'parameter_name']
+    readonly_fields = ['created_at', 'updated_at']
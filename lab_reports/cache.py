@@ -0,0 +1,136 @@
+"""
+Chart Cache for Lab Report Visualizations
+Stores rendered charts keyed by the data they were drawn from
+"""
+import hashlib
+
+from django.core.cache import caches
+from django.db.models import Count, Max
+
+from .models import LabReport
+from .visualization import (
+    render_parameter_trend_chart,
+    render_multiple_parameters_chart,
+    render_latest_report_chart
+)
+
+CHART_CACHE_ALIAS = 'lab_charts'
+
+IMAGE_CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'webp': 'image/webp',
+}
+
+
+def _chart_cache():
+    return caches[CHART_CACHE_ALIAS]
+
+
+def _stamp(updated_at, count):
+    """Build a version stamp from the newest update time and row count"""
+    return f"{updated_at.timestamp():.6f}-{count}" if updated_at else None
+
+
+def multiple_parameters_version(patient_id, parameter_names, date_from=None, date_to=None):
+    """
+    Version stamp for several parameters of a patient within a date window
+    Returns None if none of the parameters has values
+    """
+    reports = LabReport.objects.filter(
+        patient_id=patient_id,
+        parameters__parameter_name__in=parameter_names
+    )
+    if date_from:
+        reports = reports.filter(test_date__gte=date_from)
+    if date_to:
+        reports = reports.filter(test_date__lte=date_to)
+    stamp = reports.aggregate(
+        updated=Max('updated_at'),
+        count=Count('parameters')
+    )
+    return _stamp(stamp['updated'], stamp['count'])
+
+
+def parameter_trend_version(patient_id, parameter_name):
+    """
+    Version stamp for a patient's parameter history
+    Returns None if the patient has no values for the parameter
+    """
+    return multiple_parameters_version(patient_id, [parameter_name])
+
+
+def report_version(report):
+    """Version stamp for a single lab report"""
+    return _stamp(report.updated_at, 0)
+
+
+def _digest(*parts):
+    return hashlib.sha1('\x1f'.join(str(p) for p in parts).encode()).hexdigest()
+
+
+def chart_etag(kind, *parts):
+    """Strong ETag for a chart built from the same parts as its cache key"""
+    return f'"{_digest(kind, *parts)}"'
+
+
+def _cached_render(key, render):
+    cache = _chart_cache()
+    chart = cache.get(key)
+    if chart is None:
+        chart = render()
+        if chart:
+            cache.set(key, chart)
+    return chart
+
+
+def cached_parameter_trend_chart(patient_id, parameter_name, image_format='png', version=None):
+    """
+    Trend chart for a parameter, rendered only when its data changed
+    Returns image bytes or None
+    """
+    if version is None:
+        version = parameter_trend_version(patient_id, parameter_name)
+        if version is None:
+            return None
+
+    key = 'lab_chart:trend:' + _digest(patient_id, parameter_name, version, image_format)
+    return _cached_render(
+        key,
+        lambda: render_parameter_trend_chart(patient_id, parameter_name, image_format)
+    )
+
+
+def cached_multiple_parameters_chart(patient_id, parameter_names, date_from=None,
+                                     date_to=None, image_format='png'):
+    """
+    Multi-panel chart for several parameters, rendered only when their data changed
+    Returns image bytes or None
+    """
+    version = multiple_parameters_version(patient_id, parameter_names, date_from, date_to)
+    if version is None:
+        return None
+
+    key = 'lab_chart:multi:' + _digest(
+        patient_id, *parameter_names, date_from, date_to, version, image_format
+    )
+    return _cached_render(
+        key,
+        lambda: render_multiple_parameters_chart(
+            patient_id, parameter_names, date_from, date_to, image_format
+        )
+    )
+
+
+def cached_report_chart(report, image_format='png'):
+    """
+    Bar chart for a lab report, rendered only when the report changed
+    Returns image bytes or None
+    """
+    key = 'lab_chart:report:' + _digest(
+        report.patient_id, report.id, report_version(report), image_format
+    )
+    return _cached_render(
+        key,
+        lambda: render_latest_report_chart(report.id, image_format)
+    )
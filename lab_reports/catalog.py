@@ -0,0 +1,152 @@
+"""
+Per-patient Parameter Catalog
+Keeps PatientParameterSummary in step with LabTestParameter
+"""
+from django.db import transaction
+from django.db.models import Count, Max, Min, OuterRef, Subquery
+
+from .models import LabTestParameter, PatientParameterSummary
+
+SUMMARY_FIELDS = [
+    'unit', 'result_count', 'first_test_date', 'last_test_date',
+    'last_value', 'last_is_abnormal', 'updated_at'
+]
+
+
+def _summaries(parameters):
+    """
+    Build unsaved summaries from a LabTestParameter queryset
+    One grouped query with latest-result subqueries per (patient, parameter)
+    """
+    latest = LabTestParameter.objects.filter(
+        lab_report__patient_id=OuterRef('lab_report__patient_id'),
+        parameter_name=OuterRef('parameter_name')
+    ).order_by('-lab_report__test_date', '-id')
+    
+    rows = parameters.values('lab_report__patient_id', 'parameter_name').annotate(
+        result_count=Count('id'),
+        first_test_date=Min('lab_report__test_date'),
+        last_test_date=Max('lab_report__test_date'),
+        last_value=Subquery(latest.values('value')[:1]),
+        last_unit=Subquery(latest.values('unit')[:1]),
+        last_is_abnormal=Subquery(latest.values('is_abnormal')[:1]),
+    ).order_by()
+    
+    return [
+        PatientParameterSummary(
+            patient_id=row['lab_report__patient_id'],
+            parameter_name=row['parameter_name'],
+            unit=row['last_unit'],
+            result_count=row['result_count'],
+            first_test_date=row['first_test_date'],
+            last_test_date=row['last_test_date'],
+            last_value=row['last_value'],
+            last_is_abnormal=row['last_is_abnormal'],
+        )
+        for row in rows
+    ]
+
+
+def _upsert(summaries):
+    PatientParameterSummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=['patient', 'parameter_name'],
+        update_fields=SUMMARY_FIELDS,
+    )
+
+
+def refresh_parameter_summaries(patient_id, parameter_names):
+    """
+    Recompute the catalog rows of one patient for the given parameters
+    Rows whose parameter no longer has results are removed
+    """
+    parameter_names = set(parameter_names)
+    if not parameter_names:
+        return
+    
+    summaries = _summaries(LabTestParameter.objects.filter(
+        lab_report__patient_id=patient_id,
+        parameter_name__in=parameter_names
+    ))
+    
+    with transaction.atomic():
+        if summaries:
+            _upsert(summaries)
+        
+        gone = parameter_names - {s.parameter_name for s in summaries}
+        if gone:
+            PatientParameterSummary.objects.filter(
+                patient_id=patient_id,
+                parameter_name__in=gone
+            ).delete()
+
+
+def merge_new_parameters(parameters):
+    """
+    Fold newly inserted parameters into the catalog without rereading history
+    parameters are saved LabTestParameter objects with lab_report set, in
+    insertion order; this keeps bulk inserts from rescanning each patient
+    """
+    merged = {}
+    for parameter in parameters:
+        report = parameter.lab_report
+        key = (report.patient_id, parameter.parameter_name)
+        summary = merged.get(key)
+        if summary is None:
+            merged[key] = summary = PatientParameterSummary(
+                patient_id=report.patient_id,
+                parameter_name=parameter.parameter_name,
+                result_count=0,
+                first_test_date=report.test_date,
+                last_test_date=report.test_date,
+            )
+        summary.result_count += 1
+        summary.first_test_date = min(summary.first_test_date, report.test_date)
+        # Later rows have higher ids, so they win ties like in _summaries
+        if report.test_date >= summary.last_test_date:
+            summary.last_test_date = report.test_date
+            summary.last_value = parameter.value
+            summary.unit = parameter.unit
+            summary.last_is_abnormal = parameter.is_abnormal
+    if not merged:
+        return
+    
+    with transaction.atomic():
+        existing = PatientParameterSummary.objects.select_for_update().filter(
+            patient_id__in={patient_id for patient_id, _ in merged},
+            parameter_name__in={name for _, name in merged}
+        )
+        for current in existing:
+            summary = merged.get((current.patient_id, current.parameter_name))
+            if summary is None:
+                continue
+            summary.result_count += current.result_count
+            summary.first_test_date = min(summary.first_test_date, current.first_test_date)
+            if current.last_test_date > summary.last_test_date:
+                summary.last_test_date = current.last_test_date
+                summary.last_value = current.last_value
+                summary.unit = current.unit
+                summary.last_is_abnormal = current.last_is_abnormal
+        
+        _upsert(list(merged.values()))
+
+
+def rebuild_parameter_catalog(patient_ids=None, batch_size=1000):
+    """
+    Rebuild the catalog from scratch, for all patients or the given ones
+    Returns the number of summary rows written
+    """
+    parameters = LabTestParameter.objects.all()
+    existing = PatientParameterSummary.objects.all()
+    if patient_ids is not None:
+        parameters = parameters.filter(lab_report__patient_id__in=patient_ids)
+        existing = existing.filter(patient_id__in=patient_ids)
+    
+    summaries = _summaries(parameters)
+    
+    with transaction.atomic():
+        existing.delete()
+        PatientParameterSummary.objects.bulk_create(summaries, batch_size=batch_size)
+    
+    return len(summaries)
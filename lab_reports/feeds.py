@@ -0,0 +1,303 @@
+"""
+Streaming Lab Feed Readers
+Parse HL7 v2 ORU and CSV lab feeds into report dicts for lab_reports.ingest
+
+Readers work on binary file handles and yield FeedRecord tuples one report at
+a time, so memory stays flat however large the file is. Records that end at a
+point where the file can be safely resumed carry the byte offset and line
+number to resume from; the rest carry None. The last record of a file only
+counts as complete if its last line is terminated, since a feed that is still
+being written may end part way through a line.
+"""
+import csv
+import hashlib
+import re
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from .ingest import group_csv_rows
+
+FeedRecord = namedtuple('FeedRecord', ['row', 'record', 'offset', 'line'])
+
+CHUNK_SIZE = 1 << 16
+
+_LINE = re.compile(rb'([^\r\n]*)(?:\r\n|\r|\n)')
+
+# Diagnostic service section (OBR-24) to LabReport.test_type
+SERVICE_SECTIONS = {
+    'HM': 'BLOOD', 'CH': 'BLOOD', 'SR': 'BLOOD', 'BLB': 'BLOOD', 'HEM': 'BLOOD',
+    'UR': 'URINE', 'URN': 'URINE',
+    'RAD': 'XRAY', 'XRC': 'XRAY', 'RX': 'XRAY',
+    'CT': 'CT', 'MR': 'MRI', 'MRI': 'MRI',
+    'EC': 'ECG', 'ECG': 'ECG', 'EKG': 'ECG',
+    'US': 'ULTRASOUND', 'USD': 'ULTRASOUND',
+}
+
+ABNORMAL_FLAGS = {'L', 'H', 'LL', 'HH', 'A', 'AA', '<', '>'}
+
+_RANGE = re.compile(r'^\s*(-?\d+(?:\.\d+)?)\s*-\s*(-?\d+(?:\.\d+)?)\s*$')
+_BOUND = re.compile(r'^\s*([<>])=?\s*(-?\d+(?:\.\d+)?)\s*$')
+
+TWO_PLACES = Decimal('0.01')
+
+
+def fingerprint(handle, size=CHUNK_SIZE):
+    """
+    SHA-1 of the first size bytes of a file and the number of bytes read
+    Stays the same while the file is only appended to
+    """
+    handle.seek(0)
+    head = handle.read(size)
+    handle.seek(0)
+    return hashlib.sha1(head).hexdigest(), len(head)
+
+
+def read_lines(handle, offset=0):
+    """
+    Yield (end offset, line bytes, terminated) from a binary handle starting
+    at offset. Accepts CR, LF and CRLF line endings and reads in fixed size
+    chunks; only a last line without an ending is not terminated
+    """
+    handle.seek(offset)
+    position = offset
+    buffer = b''
+    while True:
+        chunk = handle.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+        consumed = 0
+        for match in _LINE.finditer(buffer):
+            consumed = match.end()
+            yield position + consumed, match.group(1), True
+        position += consumed
+        buffer = buffer[consumed:]
+    if buffer:
+        yield position + len(buffer), buffer, False
+
+
+def _decimal(value):
+    try:
+        number = Decimal(value.strip())
+    except (InvalidOperation, AttributeError):
+        return None
+    if not number.is_finite():
+        return None
+    return str(number.quantize(TWO_PLACES, rounding=ROUND_HALF_UP))
+
+
+def _hl7_date(value):
+    digits = value[:8]
+    if len(digits) == 8 and digits.isdigit():
+        return f'{digits[:4]}-{digits[4:6]}-{digits[6:]}'
+    return value or None
+
+
+def _reference_range(value):
+    """Split an OBX-7 reference range such as '3.5-5.0', '<200' or '>=40'"""
+    match = _RANGE.match(value)
+    if match:
+        return _decimal(match.group(1)), _decimal(match.group(2))
+    match = _BOUND.match(value)
+    if match:
+        bound = _decimal(match.group(2))
+        return (None, bound) if match.group(1) == '<' else (bound, None)
+    return None, None
+
+
+class _Encoding:
+    """Separators declared by an MSH segment"""
+    def __init__(self, msh):
+        self.field = msh[3:4] or '|'
+        chars = msh[4:8]
+        self.component = chars[0:1] or '^'
+        self.escape = chars[2:3] or '\\'
+        self.escapes = {
+            'F': self.field, 'S': self.component, 'T': chars[3:4] or '&',
+            'R': chars[1:2] or '~', 'E': self.escape,
+        }
+
+    def fields(self, segment):
+        fields = segment.split(self.field)
+        if fields[0] == 'MSH':
+            # MSH-1 is the field separator itself
+            fields.insert(1, self.field)
+        return fields
+
+    def components(self, value):
+        return value.split(self.component)
+
+    def text(self, value):
+        """Decode escape sequences such as \\F\\ and \\.br\\ in a text value"""
+        if self.escape not in value:
+            return value
+        parts = value.split(self.escape)
+        decoded = [parts[0]]
+        for index, part in enumerate(parts[1:], start=1):
+            if index % 2:
+                decoded.append('\n' if part == '.br' else self.escapes.get(part, ''))
+            else:
+                decoded.append(part)
+        return ''.join(decoded)
+
+
+def _field(fields, index):
+    return fields[index] if index < len(fields) else ''
+
+
+class _Report:
+    """A report being assembled from an OBR group"""
+    def __init__(self, row, patient, fields, encoding):
+        service = encoding.components(_field(fields, 4))
+        self.row = row
+        self.data = {
+            'patient': patient,
+            'test_type': SERVICE_SECTIONS.get(_field(fields, 24).upper(), 'OTHER'),
+            'test_name': encoding.text(_pick(service)),
+            'test_date': _hl7_date(_field(fields, 7)),
+            'is_normal': True,
+            'parameters': [],
+        }
+        self.summary = []
+        self.remarks = []
+
+    def add_observation(self, fields, encoding):
+        identifier = encoding.text(_pick(encoding.components(_field(fields, 3))))
+        raw_value = _field(fields, 5)
+        value = _structured_numeric(raw_value, encoding) if _field(fields, 2) == 'SN' else _decimal(raw_value)
+        if _field(fields, 8).upper() in ABNORMAL_FLAGS:
+            self.data['is_normal'] = False
+
+        if value is None:
+            # Text results are kept in the summary
+            if raw_value:
+                self.summary.append(f'{identifier}: {encoding.text(raw_value)}')
+            return
+
+        parameter = {'parameter_name': identifier, 'value': value}
+        unit = encoding.components(_field(fields, 6))[0]
+        if unit:
+            parameter['unit'] = encoding.text(unit)
+        normal_min, normal_max = _reference_range(encoding.text(_field(fields, 7)))
+        if normal_min is not None:
+            parameter['normal_min'] = normal_min
+        if normal_max is not None:
+            parameter['normal_max'] = normal_max
+        self.data['parameters'].append(parameter)
+
+    def add_note(self, fields, encoding):
+        note = encoding.text(_field(fields, 3))
+        if note:
+            self.remarks.append(note)
+
+    def build(self):
+        if self.summary:
+            self.data['summary'] = '\n'.join(self.summary)
+        if self.remarks:
+            self.data['remarks'] = '\n'.join(self.remarks)
+        return self.data
+
+
+def _pick(components):
+    """Text of a coded value (code^text^system), falling back to the code"""
+    if len(components) > 1 and components[1]:
+        return components[1]
+    return components[0]
+
+
+def _structured_numeric(value, encoding):
+    """Plain numbers from an SN value such as '^5.2'; comparisons and ratios are text"""
+    parts = encoding.components(value)
+    if len(parts) > 2 and any(parts[2:]):
+        return None
+    if parts[0] not in ('', '='):
+        return None
+    return _decimal(parts[1]) if len(parts) > 1 else None
+
+
+def read_hl7(handle, offset=0, line=0):
+    """
+    Yield a FeedRecord per OBR group of HL7 v2 ORU messages
+    The patient is PID-3 (the user id), reports start at each OBR, OBX
+    segments become parameters or summary lines and NTE segments remarks.
+    Files may be plain, one segment per line, or MLLP framed.
+    """
+    encoding = None
+    patient = None
+    report = None
+    position = (offset, line)
+    complete = True
+
+    for end, raw, terminated in read_lines(handle, offset):
+        start = position
+        line += 1
+        position = (end, line)
+        # An MLLP end block closes the message even without a line ending
+        complete = terminated or raw.endswith(b'\x1c')
+        segment = raw.strip(b'\x0b\x1c').decode('utf-8', errors='replace')
+        if not segment.strip():
+            continue
+
+        if segment.startswith('MSH'):
+            # A new message, so everything before it can be resumed from here
+            if report is not None:
+                yield FeedRecord(report.row, report.build(), *start)
+                report = None
+            encoding = _Encoding(segment)
+            patient = None
+            continue
+
+        if encoding is None:
+            yield FeedRecord(line, ValueError('Segment outside of an MSH message'), None, None)
+            continue
+
+        fields = encoding.fields(segment)
+        kind = fields[0]
+        if kind == 'PID':
+            patient = encoding.components(_field(fields, 3))[0] or None
+        elif kind == 'OBR':
+            if report is not None:
+                yield FeedRecord(report.row, report.build(), None, None)
+            report = _Report(line, patient, fields, encoding)
+        elif kind == 'OBX':
+            if report is None:
+                yield FeedRecord(line, ValueError('OBX segment without an OBR'), None, None)
+            else:
+                report.add_observation(fields, encoding)
+        elif kind == 'NTE' and report is not None:
+            report.add_note(fields, encoding)
+
+    if report is not None:
+        yield FeedRecord(report.row, report.build(), *(position if complete else (None, None)))
+
+
+def read_csv_feed(handle, offset=0, line=0):
+    """
+    Yield a FeedRecord per report of a CSV feed with one parameter per line
+    Uses the same columns as lab_reports.ingest.read_csv
+    """
+    lines = read_lines(handle)
+    header_end, header, _ = next(lines, (0, b'', True))
+    fieldnames = next(csv.reader([header.decode('utf-8-sig')]), [])
+    if not offset:
+        offset, line = header_end, 1
+    lines.close()
+
+    position = {'offset': offset, 'line': line, 'terminated': True}
+
+    def text_lines():
+        for end, raw, terminated in read_lines(handle, offset):
+            position.update(offset=end, terminated=terminated)
+            position['line'] += 1
+            yield raw.decode('utf-8', errors='replace') + '\n'
+
+    def resume():
+        # An unterminated last row may be cut short
+        if not position['terminated']:
+            return None, None
+        return position['offset'], position['line']
+
+    reader = csv.DictReader(text_lines(), fieldnames=fieldnames)
+    rows = ((position['line'], row, resume()) for row in reader)
+    for number, report, resume in group_csv_rows(rows):
+        yield FeedRecord(number, report, *resume)
@@ -0,0 +1,172 @@
+"""
+Bulk Lab Result Ingestion
+Validates many reports at once and writes them with bulk_create
+"""
+import csv
+import json
+from dataclasses import dataclass, field
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import as_serializer_error
+
+from .catalog import merge_new_parameters
+from .models import LabReport, LabTestParameter
+from .references import flag_parameters
+from .serializers import LabReportIngestSerializer, PARAMETER_INPUT_FIELDS
+from .units import normalize_parameters
+
+User = get_user_model()
+
+REPORT_COLUMNS = ['patient', 'test_type', 'test_name', 'test_date', 'summary', 'remarks']
+
+
+@dataclass
+class IngestResult:
+    created_reports: int = 0
+    created_parameters: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, row, errors):
+        self.errors.append({'row': row, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created_reports': self.created_reports,
+            'created_parameters': self.created_parameters,
+            'errors': self.errors,
+        }
+
+
+def create_parameters(reports_with_parameters):
+    """
+    Insert the parameters of already saved reports with one bulk_create
+    reports_with_parameters is a list of (LabReport, [parameter dicts])
+    Returns the created LabTestParameter objects
+    """
+    parameters = [
+        LabTestParameter(lab_report=report, **data)
+        for report, items in reports_with_parameters
+        for data in items
+    ]
+    if not parameters:
+        return []
+
+    flag_parameters(parameters)
+    # bulk_create skips signals, so do their work for the whole batch here
+    normalize_parameters(parameters)
+    LabTestParameter.objects.bulk_create(parameters, batch_size=1000)
+    merge_new_parameters(parameters)
+
+    return parameters
+
+
+def ingest_lab_reports(records, doctor=None, allowed_patient_ids=None):
+    """
+    Validate and insert a batch of lab reports in one transaction
+    records is an iterable of (row_number, report dict); unparseable rows may
+    be given as a ValueError. Invalid rows are reported in the result and do
+    not stop the rest of the batch
+    """
+    result = IngestResult()
+    valid = []
+    # One serializer validates every row, like a ListSerializer child, so
+    # its fields are only built once per batch
+    validator = LabReportIngestSerializer()
+    for row, record in records:
+        if not isinstance(record, dict):
+            message = str(record) if isinstance(record, ValueError) else 'Expected a JSON object'
+            result.add_error(row, {'non_field_errors': [message]})
+            continue
+        try:
+            valid.append((row, validator.run_validation(record)))
+        except ValidationError as exc:
+            result.add_error(row, as_serializer_error(exc))
+
+    # One query for every patient referenced by the batch
+    patient_ids = {data['patient'] for _, data in valid}
+    known_patients = set(User.objects.filter(
+        id__in=patient_ids,
+        role='PATIENT'
+    ).values_list('id', flat=True))
+
+    accepted = []
+    for row, data in valid:
+        if data['patient'] not in known_patients:
+            result.add_error(row, {'patient': ['Patient not found']})
+        elif allowed_patient_ids is not None and data['patient'] not in allowed_patient_ids:
+            result.add_error(row, {'patient': ['You are not assigned to this patient']})
+        else:
+            accepted.append(data)
+
+    if not accepted:
+        return result
+
+    with transaction.atomic():
+        reports = []
+        for data in accepted:
+            data = dict(data)
+            parameters = data.pop('parameters', [])
+            report = LabReport(doctor=doctor, patient_id=data.pop('patient'), **data)
+            reports.append((report, parameters))
+
+        LabReport.objects.bulk_create([report for report, _ in reports], batch_size=1000)
+        created = create_parameters(reports)
+
+    result.created_reports = len(reports)
+    result.created_parameters = len(created)
+    result.errors.sort(key=lambda error: error['row'])
+    return result
+
+
+def read_jsonl(lines):
+    """Yield (line number, report dict) from JSON lines, one report per line"""
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, ValueError(f'Invalid JSON: {e}')
+
+
+def group_csv_rows(rows):
+    """
+    Group CSV rows with one parameter per line into reports
+    rows is an iterable of (line number, row dict, position); consecutive rows
+    with the same report columns form one report. Yields (line number of the
+    first row, report dict, position of the last row)
+    """
+    current_key = None
+    current = None
+    for number, row, position in rows:
+        row = {key: value for key, value in row.items() if value not in (None, '')}
+        key = tuple(row.get(column) for column in REPORT_COLUMNS)
+        if key != current_key:
+            if current is not None:
+                yield current
+            current_key = key
+            report = {column: row[column] for column in REPORT_COLUMNS if column in row}
+            report['parameters'] = []
+            current = [number, report, position]
+        parameter = {column: row[column] for column in PARAMETER_INPUT_FIELDS if column in row}
+        if parameter:
+            current[1]['parameters'].append(parameter)
+        current[2] = position
+    if current is not None:
+        yield tuple(current)
+
+
+def read_csv(lines):
+    """
+    Yield (line number, report dict) from CSV with one parameter per line
+    Consecutive lines with the same report columns form one report
+    """
+    rows = csv.DictReader(lines)
+    grouped = group_csv_rows(
+        (number, row, None) for number, row in enumerate(rows, start=2)
+    )
+    for number, report, _ in grouped:
+        yield number, report
@@ -0,0 +1,68 @@
+"""
+Time the lab parameter time-series queries against the current database
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lab_reports.models import LabTestParameter, PatientParameterSummary
+from lab_reports.visualization import get_parameter_series, get_parameter_statistics
+
+
+class Command(BaseCommand):
+    help = "Benchmark trend, statistics and catalog queries on existing lab data"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=50,
+                            help="Number of (patient, parameter) pairs to time")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--explain', action='store_true',
+                            help="Print the query plan of the trend query")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        last_id = LabTestParameter.objects.order_by('-id').values_list('id', flat=True).first()
+        if last_id is None:
+            raise CommandError("No lab test parameters found")
+
+        # Sample by primary key so picking pairs does not scan the table
+        pairs = []
+        for _ in range(options['samples']):
+            row = LabTestParameter.objects.filter(
+                id__gte=rng.randint(1, last_id)
+            ).order_by('id').values_list('lab_report__patient_id', 'parameter_name').first()
+            if row:
+                pairs.append(row)
+
+        self.stdout.write(
+            f"{LabTestParameter.objects.count()} parameter rows, {len(pairs)} samples"
+        )
+
+        if options['explain']:
+            patient_id, parameter_name = pairs[0]
+            self.stdout.write(self._trend_queryset(patient_id, parameter_name).explain())
+
+        timings = {
+            'trend': lambda p, n: list(self._trend_queryset(p, n)),
+            'series': lambda p, n: get_parameter_series(p, [n]),
+            'statistics': get_parameter_statistics,
+            'catalog': lambda p, n: list(PatientParameterSummary.objects.filter(patient_id=p)),
+        }
+        for label, run in timings.items():
+            elapsed = []
+            for patient_id, parameter_name in pairs:
+                start = time.perf_counter()
+                run(patient_id, parameter_name)
+                elapsed.append((time.perf_counter() - start) * 1000)
+            elapsed.sort()
+            self.stdout.write(
+                f"{label:<12} p50 {elapsed[len(elapsed) // 2]:8.2f} ms"
+                f"   p95 {elapsed[int(len(elapsed) * 0.95) - 1]:8.2f} ms"
+            )
+
+    def _trend_queryset(self, patient_id, parameter_name):
+        return LabTestParameter.objects.filter(
+            lab_report__patient_id=patient_id,
+            parameter_name=parameter_name
+        ).order_by('lab_report__test_date').values_list('lab_report__test_date', 'value')
@@ -0,0 +1,46 @@
+"""
+Generate missing thumbnails and previews of lab report files
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from lab_reports.models import LabReport
+from lab_reports.previews import PreviewError, generate_report_previews
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the thumbnails and previews of lab report files uploaded "
+        "before previews existed, or whose background job failed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patient', type=int, action='append', dest='patients',
+                            help="Only this patient's reports (repeatable)")
+
+    def handle(self, *args, **options):
+        reports = LabReport.objects.exclude(report_file='').exclude(report_file=None).filter(
+            has_file_previews=False
+        )
+        if options['patients']:
+            reports = reports.filter(patient_id__in=options['patients'])
+
+        started = time.monotonic()
+        generated = failed = 0
+        seen = set()
+        for report in reports.only('id', 'report_file').order_by('id').iterator():
+            # Identical uploads share one stored file and its previews
+            if report.report_file.name in seen:
+                continue
+            seen.add(report.report_file.name)
+            try:
+                if generate_report_previews(report):
+                    generated += 1
+            except PreviewError as e:
+                failed += 1
+                self.stderr.write(f"Report {report.id}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated previews for {generated} files in {time.monotonic() - started:.1f}s, {failed} failed"
+        ))
@@ -0,0 +1,153 @@
+"""
+Stream a large HL7 v2 ORU or CSV lab feed into lab reports
+"""
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import reset_queries, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from lab_reports.feeds import fingerprint, read_csv_feed, read_hl7
+from lab_reports.ingest import ingest_lab_reports
+from lab_reports.models import LabFeedImport
+
+User = get_user_model()
+
+READERS = {
+    'HL7': read_hl7,
+    'CSV': read_csv_feed,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Import an HL7 v2 ORU or CSV lab feed in constant memory. Progress is "
+        "committed with every batch, so running the command again on the same "
+        "file resumes after the last imported report, and picks up lines "
+        "appended since the previous run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['hl7', 'csv'],
+                            help="Defaults to csv for .csv files and hl7 otherwise")
+        parser.add_argument('--doctor', type=int, help="Ordering doctor's user id")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Reports per transaction")
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignore saved progress and import from the start")
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        doctor = None
+        if options['doctor']:
+            try:
+                doctor = User.objects.get(id=options['doctor'], role='DOCTOR')
+            except User.DoesNotExist:
+                raise CommandError(f"Doctor {options['doctor']} not found")
+
+        path = os.path.abspath(options['path'])
+        feed_format = (options['format'] or ('csv' if path.lower().endswith('.csv') else 'hl7')).upper()
+        batch_size = max(options['batch_size'], 1)
+
+        try:
+            handle = open(path, 'rb')
+        except OSError as e:
+            raise CommandError(str(e))
+
+        with handle:
+            progress, created = LabFeedImport.objects.get_or_create(
+                source=path,
+                defaults={'feed_format': feed_format}
+            )
+            if not created and fingerprint(handle, progress.fingerprint_size)[0] != progress.fingerprint:
+                self.stdout.write(self.style.WARNING("The file was replaced, importing it from the start"))
+                options['restart'] = True
+
+            if created or options['restart']:
+                progress.fingerprint, progress.fingerprint_size = fingerprint(handle)
+                progress.feed_format = feed_format
+                progress.byte_offset = progress.line_number = 0
+                progress.created_reports = progress.created_parameters = progress.rejected_rows = 0
+                progress.completed_at = None
+                progress.save()
+            elif progress.byte_offset:
+                self.stdout.write(f"Resuming at line {progress.line_number} (byte {progress.byte_offset})")
+
+            size = os.fstat(handle.fileno()).st_size
+            started = time.monotonic()
+            totals = {'reports': 0, 'parameters': 0, 'rejected': 0}
+
+            records = READERS[progress.feed_format](handle, progress.byte_offset, progress.line_number)
+            batch = []
+            for record in records:
+                batch.append(record)
+                # Only cut batches where the file can be resumed
+                if len(batch) >= batch_size and record.offset is not None:
+                    self._import_batch(progress, batch, doctor, totals)
+                    self._report(progress, size, totals, started)
+                    batch = []
+            # Records after the last resumable point are left for the next
+            # run: the file ends part way through them
+            held = 0
+            while batch and batch[-1].offset is None:
+                batch.pop()
+                held += 1
+            if batch:
+                self._import_batch(progress, batch, doctor, totals)
+            if held:
+                self.stdout.write(self.style.WARNING(
+                    f"Left {held} reports at the end of the file for the next run, "
+                    f"as its last line is incomplete"
+                ))
+
+        progress.completed_at = timezone.now()
+        progress.save(update_fields=['completed_at', 'updated_at'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {totals['reports']} reports with {totals['parameters']} parameters, "
+            f"{totals['rejected']} rows rejected in {elapsed:.1f}s "
+            f"({totals['reports'] / max(elapsed, 1e-6):.0f} reports/s)"
+        ))
+
+    def _import_batch(self, progress, batch, doctor, totals):
+        """Insert a batch and move the resume position in the same transaction"""
+        offset, line = progress.byte_offset, progress.line_number
+        if batch[-1].offset is not None:
+            offset, line = batch[-1].offset, batch[-1].line
+        with transaction.atomic():
+            result = ingest_lab_reports(
+                [(record.row, record.record) for record in batch],
+                doctor=doctor
+            )
+            LabFeedImport.objects.filter(id=progress.id).update(
+                byte_offset=offset,
+                line_number=line,
+                created_reports=F('created_reports') + result.created_reports,
+                created_parameters=F('created_parameters') + result.created_parameters,
+                rejected_rows=F('rejected_rows') + len(result.errors),
+                updated_at=timezone.now(),
+            )
+        progress.byte_offset = offset
+        progress.line_number = line
+
+        totals['reports'] += result.created_reports
+        totals['parameters'] += result.created_parameters
+        totals['rejected'] += len(result.errors)
+        for error in result.errors:
+            self.stderr.write(f"Line {error['row']}: {error['errors']}")
+        # Keep the DEBUG query log from growing with the file
+        reset_queries()
+
+    def _report(self, progress, size, totals, started):
+        if self.verbosity < 2:
+            return
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"{progress.byte_offset / max(size, 1):6.1%}  line {progress.line_number}  "
+            f"{totals['reports']} reports  {totals['reports'] / max(elapsed, 1e-6):.0f}/s"
+        )
@@ -0,0 +1,57 @@
+"""
+Bulk-load lab reports from a JSON lines or CSV file
+"""
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from lab_reports.ingest import ingest_lab_reports, read_csv, read_jsonl
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Load lab reports from JSON lines (one report per line) or CSV "
+        "(one parameter per line). Each batch is inserted in one transaction; "
+        "invalid rows are reported and skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['jsonl', 'csv'],
+                            help="Defaults to the file extension")
+        parser.add_argument('--doctor', type=int, help="Ordering doctor's user id")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Reports per transaction")
+
+    def handle(self, *args, **options):
+        doctor = None
+        if options['doctor']:
+            try:
+                doctor = User.objects.get(id=options['doctor'], role='DOCTOR')
+            except User.DoesNotExist:
+                raise CommandError(f"Doctor {options['doctor']} not found")
+
+        file_format = options['format'] or ('csv' if options['path'].lower().endswith('.csv') else 'jsonl')
+        reader = read_csv if file_format == 'csv' else read_jsonl
+
+        created_reports = created_parameters = failed = 0
+        with open(options['path'], newline='', encoding='utf-8-sig') as handle:
+            records = reader(handle)
+            while True:
+                batch = list(islice(records, options['batch_size']))
+                if not batch:
+                    break
+                result = ingest_lab_reports(batch, doctor=doctor)
+                created_reports += result.created_reports
+                created_parameters += result.created_parameters
+                failed += len(result.errors)
+                for error in result.errors:
+                    self.stderr.write(f"Row {error['row']}: {error['errors']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created_reports} reports with {created_parameters} parameters, "
+            f"{failed} rows rejected"
+        ))
@@ -0,0 +1,20 @@
+"""
+Rebuild the per-patient lab parameter catalog from LabTestParameter
+"""
+from django.core.management.base import BaseCommand
+
+from lab_reports.catalog import rebuild_parameter_catalog
+
+
+class Command(BaseCommand):
+    help = "Rebuild PatientParameterSummary rows from lab test parameters"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--patient', type=int, action='append', dest='patients',
+            help="Only rebuild this patient's catalog (repeatable)"
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_parameter_catalog(options['patients'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} catalog entries"))
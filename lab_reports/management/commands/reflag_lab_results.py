@@ -0,0 +1,118 @@
+"""
+Reclassify stored lab results against the reference range catalog
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.utils import timezone
+
+from lab_reports.catalog import rebuild_parameter_catalog
+from lab_reports.models import LabReport, LabTestParameter
+from lab_reports.references import ABNORMAL_FLAGS, ReferenceCatalog, evaluate, load_demographics
+
+ROW_FIELDS = [
+    'parameter_name', 'unit', 'value', 'normal_min', 'normal_max',
+    'reference_range_id', 'lab_report__patient_id', 'lab_report__test_date',
+]
+
+
+def _update_in_chunks(model, ids, **values):
+    """UPDATE rows by id without exceeding the database's parameter limit"""
+    ids = list(ids)
+    size = (connection.features.max_query_params or 1000) - len(values)
+    for start in range(0, len(ids), size):
+        model.objects.filter(id__in=ids[start:start + size]).update(**values)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute flag and is_abnormal for stored lab results, filling missing "
+        "normal ranges from the reference range catalog. Rows are read in id "
+        "order and only changed rows are written, grouped by their new values."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--parameter', action='append', dest='parameters',
+                            help="Only this parameter name (repeatable)")
+        parser.add_argument('--batch-size', type=int, default=50000,
+                            help="Rows read per transaction")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Count the changes without writing them")
+
+    def handle(self, *args, **options):
+        catalog = ReferenceCatalog()
+        demographics = {}
+        queryset = LabTestParameter.objects.order_by('id')
+        if options['parameters']:
+            queryset = queryset.filter(parameter_name__in=options['parameters'])
+
+        started = time.monotonic()
+        scanned = changed = 0
+        touched_patients = set()
+        last_id = 0
+        while True:
+            rows = list(queryset.filter(id__gt=last_id).values_list(
+                'id', 'lab_report_id', 'flag', 'is_abnormal', *ROW_FIELDS
+            )[:options['batch_size']])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            scanned += len(rows)
+
+            missing = {row[10] for row in rows} - demographics.keys()
+            if missing:
+                demographics.update(load_demographics(missing))
+
+            fills, flags = evaluate([row[4:] for row in rows], catalog, demographics)
+
+            # Group changed rows by the values they need so each group is one UPDATE
+            by_flag, by_range, unlinked = {}, {}, []
+            reports = set()
+            for row, fill, flag in zip(rows, fills, flags):
+                parameter_id, report_id, old_flag, old_abnormal = row[:4]
+                normal_min, normal_max, reference_id, patient_id = row[7:11]
+                flag = str(flag)
+                row_changed = False
+                if flag != old_flag or (flag in ABNORMAL_FLAGS) != old_abnormal:
+                    by_flag.setdefault(flag, []).append(parameter_id)
+                    row_changed = True
+                    if (flag in ABNORMAL_FLAGS) != old_abnormal:
+                        touched_patients.add(patient_id)
+                if fill is not None:
+                    if (fill.reference.id, fill.low, fill.high) != (reference_id, normal_min, normal_max):
+                        by_range.setdefault(fill, []).append(parameter_id)
+                        row_changed = True
+                elif reference_id is not None:
+                    unlinked.append(parameter_id)
+                    row_changed = True
+                if row_changed:
+                    reports.add(report_id)
+                    changed += 1
+
+            if not options['dry_run'] and reports:
+                with transaction.atomic():
+                    for flag, ids in by_flag.items():
+                        _update_in_chunks(LabTestParameter, ids, flag=flag, is_abnormal=flag in ABNORMAL_FLAGS)
+                    for bounds, ids in by_range.items():
+                        _update_in_chunks(LabTestParameter, ids, reference_range_id=bounds.reference.id,
+                                          normal_min=bounds.low, normal_max=bounds.high)
+                    if unlinked:
+                        _update_in_chunks(LabTestParameter, unlinked, reference_range_id=None)
+                    # Changed reports must not be served from the chart cache
+                    _update_in_chunks(LabReport, reports, updated_at=timezone.now())
+
+            reset_queries()
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"{scanned} rows scanned, {changed} changed")
+
+        if touched_patients and not options['dry_run']:
+            touched_patients = sorted(touched_patients)
+            for start in range(0, len(touched_patients), 500):
+                rebuild_parameter_catalog(touched_patients[start:start + 500])
+
+        elapsed = time.monotonic() - started
+        verb = "would change" if options['dry_run'] else "changed"
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {scanned} rows in {elapsed:.1f}s, {verb} {changed}"
+        ))
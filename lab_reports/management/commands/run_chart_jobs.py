@@ -0,0 +1,33 @@
+"""
+Render queued lab charts into the chart cache
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from lab_reports.prerender import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Render pending chart pre-rendering jobs. Only useful with a chart cache "
+        "shared between processes; with LocMemCache the web process renders its "
+        "own jobs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help="Render at most this many charts")
+        parser.add_argument('--poll', type=float,
+                            help="Keep running, checking for new jobs every POLL seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            rendered = run_pending_jobs(options['limit'])
+            if rendered or not options['poll']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Rendered {rendered} charts in {time.monotonic() - started:.1f}s"
+                ))
+            if not options['poll']:
+                break
+            time.sleep(options['poll'])
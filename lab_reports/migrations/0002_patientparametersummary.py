@@ -0,0 +1,71 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_catalog(apps, schema_editor):
+    LabTestParameter = apps.get_model('lab_reports', 'LabTestParameter')
+    PatientParameterSummary = apps.get_model('lab_reports', 'PatientParameterSummary')
+
+    latest = LabTestParameter.objects.filter(
+        lab_report__patient_id=models.OuterRef('lab_report__patient_id'),
+        parameter_name=models.OuterRef('parameter_name')
+    ).order_by('-lab_report__test_date', '-id')
+
+    rows = LabTestParameter.objects.values('lab_report__patient_id', 'parameter_name').annotate(
+        result_count=models.Count('id'),
+        first_test_date=models.Min('lab_report__test_date'),
+        last_test_date=models.Max('lab_report__test_date'),
+        last_value=models.Subquery(latest.values('value')[:1]),
+        last_unit=models.Subquery(latest.values('unit')[:1]),
+        last_is_abnormal=models.Subquery(latest.values('is_abnormal')[:1]),
+    ).order_by()
+
+    PatientParameterSummary.objects.bulk_create([
+        PatientParameterSummary(
+            patient_id=row['lab_report__patient_id'],
+            parameter_name=row['parameter_name'],
+            unit=row['last_unit'],
+            result_count=row['result_count'],
+            first_test_date=row['first_test_date'],
+            last_test_date=row['last_test_date'],
+            last_value=row['last_value'],
+            last_is_abnormal=row['last_is_abnormal'],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('lab_reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientParameterSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('parameter_name', models.CharField(max_length=100)),
+                ('unit', models.CharField(help_text='Unit of the latest result', max_length=50)),
+                ('result_count', models.PositiveIntegerField(default=0)),
+                ('first_test_date', models.DateField()),
+                ('last_test_date', models.DateField()),
+                ('last_value', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('last_is_abnormal', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lab_parameter_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Patient Parameter Summary',
+                'verbose_name_plural': 'Patient Parameter Summaries',
+                'ordering': ['parameter_name'],
+                'unique_together': {('patient', 'parameter_name')},
+            },
+        ),
+        migrations.RunPython(build_catalog, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lab_reports', '0002_patientparametersummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='labreport',
+            index=models.Index(fields=['patient', 'test_date'], name='labreport_patient_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labtestparameter',
+            index=models.Index(fields=['lab_report', 'parameter_name'], name='labparam_report_name_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lab_reports', '0003_lab_timeseries_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LabFeedImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Absolute path of the feed file', max_length=500, unique=True)),
+                ('fingerprint', models.CharField(help_text='SHA-1 of the start of the file', max_length=40)),
+                ('fingerprint_size', models.PositiveIntegerField(default=0, help_text='Bytes covered by the fingerprint')),
+                ('feed_format', models.CharField(choices=[('HL7', 'HL7 v2 ORU'), ('CSV', 'CSV')], max_length=3)),
+                ('byte_offset', models.BigIntegerField(default=0)),
+                ('line_number', models.PositiveIntegerField(default=0)),
+                ('created_reports', models.PositiveIntegerField(default=0)),
+                ('created_parameters', models.PositiveIntegerField(default=0)),
+                ('rejected_rows', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Lab Feed Import',
+                'verbose_name_plural': 'Lab Feed Imports',
+                'ordering': ['-updated_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def flag_existing(apps, schema_editor):
+    """Classify stored results against the range typed on each row"""
+    LabTestParameter = apps.get_model('lab_reports', 'LabTestParameter')
+    parameters = LabTestParameter.objects.all()
+
+    parameters.filter(
+        models.Q(normal_min__isnull=False) | models.Q(normal_max__isnull=False)
+    ).update(flag='N', is_abnormal=False)
+    parameters.filter(
+        normal_min__isnull=False, value__lt=models.F('normal_min')
+    ).update(flag='L', is_abnormal=True)
+    parameters.filter(
+        normal_max__isnull=False, value__gt=models.F('normal_max')
+    ).update(flag='H', is_abnormal=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lab_reports', '0004_labfeedimport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceRange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('parameter_name', models.CharField(db_index=True, max_length=100)),
+                ('unit', models.CharField(max_length=50)),
+                ('sex', models.CharField(blank=True, choices=[('', 'Any'), ('M', 'Male'), ('F', 'Female')], max_length=1)),
+                ('age_min', models.PositiveSmallIntegerField(blank=True, help_text='Youngest age in years (inclusive)', null=True)),
+                ('age_max', models.PositiveSmallIntegerField(blank=True, help_text='Oldest age in years (exclusive)', null=True)),
+                ('low', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('high', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('critical_low', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('critical_high', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+            ],
+            options={
+                'verbose_name': 'Reference Range',
+                'verbose_name_plural': 'Reference Ranges',
+                'ordering': ['parameter_name', 'sex', 'age_min'],
+            },
+        ),
+        migrations.AddField(
+            model_name='labtestparameter',
+            name='flag',
+            field=models.CharField(blank=True, choices=[('', 'No reference range'), ('LL', 'Critically low'), ('L', 'Low'), ('N', 'Normal'), ('H', 'High'), ('HH', 'Critically high')], max_length=2),
+        ),
+        migrations.AddField(
+            model_name='labtestparameter',
+            name='reference_range',
+            field=models.ForeignKey(blank=True, help_text='Catalog range the normal range was filled from', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='parameters', to='lab_reports.referencerange'),
+        ),
+        migrations.RunPython(flag_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('lab_reports', '0006_canonical_units'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChartRenderJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('REPORT', 'Report bar chart'), ('TREND', 'Parameter trend chart')], max_length=10)),
+                ('parameter_name', models.CharField(blank=True, max_length=100)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('FAILED', 'Failed')], default='PENDING', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('lab_report', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='chart_render_jobs', to='lab_reports.labreport')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chart_render_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Chart Render Job',
+                'verbose_name_plural': 'Chart Render Jobs',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='chartjob_status_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='chartrenderjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'REPORT'), ('status', 'PENDING')), fields=('lab_report',), name='chartjob_pending_report_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='chartrenderjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'TREND'), ('status', 'PENDING')), fields=('patient', 'parameter_name'), name='chartjob_pending_trend_uniq'),
+        ),
+    ]
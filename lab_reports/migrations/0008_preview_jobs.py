@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lab_reports', '0007_chart_render_jobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chartrenderjob',
+            name='kind',
+            field=models.CharField(choices=[('REPORT', 'Report bar chart'), ('TREND', 'Parameter trend chart'), ('PREVIEW', 'Report file previews')], max_length=10),
+        ),
+        migrations.AddConstraint(
+            model_name='chartrenderjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'PREVIEW'), ('status', 'PENDING')), fields=('lab_report',), name='chartjob_pending_preview_uniq'),
+        ),
+    ]
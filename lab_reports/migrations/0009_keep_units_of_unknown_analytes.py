@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:10
+
+from django.db import migrations
+from django.db.models import F
+from django.db.models.functions import Lower, Trim
+
+# Analyte names and aliases the unit registry knew when 0006 filled the
+# canonical columns. Every other parameter was converted to a per-dimension
+# unit such as mg/dL, which rounds trace analytes to zero
+KNOWN_ANALYTES = [
+    'glucose', 'cholesterol', 'triglycerides', 'creatinine', 'urea', 'urea nitrogen',
+    'uric acid', 'bilirubin', 'calcium', 'magnesium', 'phosphate', 'iron', 'sodium',
+    'potassium', 'chloride', 'bicarbonate', 'hemoglobin', 'albumin', 'total protein',
+    'globulin', 'vitamin d', 'tsh', 'wbc', 'platelets', 'rbc',
+    'blood sugar', 'fasting glucose', 'total cholesterol', 'ldl', 'ldl cholesterol',
+    'hdl', 'hdl cholesterol', 'bun', 'blood urea nitrogen', 'total bilirubin',
+    'phosphorus', 'haemoglobin', 'hb', 'hgb', '25-oh vitamin d', 'white blood cells',
+    'plt', 'red blood cells',
+]
+
+
+def keep_reported_units(apps, schema_editor):
+    LabTestParameter = apps.get_model('lab_reports', 'LabTestParameter')
+    LabTestParameter.objects.alias(
+        key=Lower(Trim('parameter_name'))
+    ).exclude(key__in=KNOWN_ANALYTES).update(
+        canonical_value=F('value'),
+        canonical_unit=Trim('unit')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lab_reports', '0008_preview_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_reported_units, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:17
+
+import os
+
+from django.db import migrations, models
+
+# Frozen copy of lab_reports.previews naming
+PREVIEW_SIZES = ('preview', 'thumbnail')
+
+
+def preview_name(name, size):
+    return f'{os.path.splitext(name)[0]}.{size}.webp'
+
+
+def flag_existing_previews(apps, schema_editor):
+    """Mark the reports whose file previews were generated before the flag existed"""
+    LabReport = apps.get_model('lab_reports', 'LabReport')
+    storage = LabReport._meta.get_field('report_file').storage
+    names = LabReport.objects.exclude(report_file='').exclude(report_file=None).values_list(
+        'report_file', flat=True
+    ).distinct()
+    previewed = [
+        name for name in names.iterator()
+        if all(storage.exists(preview_name(name, size)) for size in PREVIEW_SIZES)
+    ]
+    for start in range(0, len(previewed), 500):
+        LabReport.objects.filter(report_file__in=previewed[start:start + 500]).update(
+            has_file_previews=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lab_reports', '0009_keep_units_of_unknown_analytes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='labreport',
+            name='has_file_previews',
+            field=models.BooleanField(default=False, help_text='Whether the thumbnails and previews of report_file have been generated'),
+        ),
+        migrations.RunPython(flag_existing_previews, migrations.RunPython.noop),
+    ]
@@ -42,6 +42,10 @@ class LabReport(models.Model):
     
     # Results
     report_file = models.FileField(upload_to='lab_reports/', blank=True, null=True)
+    has_file_previews = models.BooleanField(
+        default=False,
+        help_text="Whether the thumbnails and previews of report_file have been generated"
+    )
     summary = models.TextField(blank=True, help_text="Brief summary of findings")
     
     # Status
@@ -59,12 +63,58 @@ class LabReport(models.Model):
         verbose_name = "Lab Report"
         verbose_name_plural = "Lab Reports"
         ordering = ['-test_date']
+        indexes = [
+            models.Index(fields=['patient', 'test_date'], name='labreport_patient_date_idx'),
+        ]
+
+
+class ReferenceRange(models.Model):
+    """
+    Reference range catalog for lab parameters
+    Rows can be narrowed by sex and age band; the most specific match wins
+    """
+    SEX_CHOICES = (
+        ('', 'Any'),
+        ('M', 'Male'),
+        ('F', 'Female'),
+    )
+    
+    parameter_name = models.CharField(max_length=100, db_index=True)
+    unit = models.CharField(max_length=50)
+    
+    # Who the range applies to
+    sex = models.CharField(max_length=1, choices=SEX_CHOICES, blank=True)
+    age_min = models.PositiveSmallIntegerField(blank=True, null=True, help_text="Youngest age in years (inclusive)")
+    age_max = models.PositiveSmallIntegerField(blank=True, null=True, help_text="Oldest age in years (exclusive)")
+    
+    # Bounds
+    low = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    high = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    critical_low = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    critical_high = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.parameter_name} ({self.unit}) {self.low}-{self.high}"
+    
+    class Meta:
+        verbose_name = "Reference Range"
+        verbose_name_plural = "Reference Ranges"
+        ordering = ['parameter_name', 'sex', 'age_min']
 
 
 class LabTestParameter(models.Model):
     """
     Individual test parameters for visualization
     """
+    FLAG_CHOICES = (
+        ('', 'No reference range'),
+        ('LL', 'Critically low'),
+        ('L', 'Low'),
+        ('N', 'Normal'),
+        ('H', 'High'),
+        ('HH', 'Critically high'),
+    )
+    
     lab_report = models.ForeignKey(
         LabReport,
         on_delete=models.CASCADE,
@@ -76,23 +126,191 @@ class LabTestParameter(models.Model):
     value = models.DecimalField(max_digits=10, decimal_places=2)
     unit = models.CharField(max_length=50, help_text="e.g., mg/dL, g/dL")
     
+    # Value converted to the parameter's canonical unit (lab_reports.units)
+    canonical_value = models.DecimalField(max_digits=14, decimal_places=4, blank=True, null=True)
+    canonical_unit = models.CharField(max_length=50, blank=True)
+    
     # Reference Range
     normal_min = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     normal_max = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     
+    reference_range = models.ForeignKey(
+        ReferenceRange,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='parameters',
+        help_text="Catalog range the normal range was filled from"
+    )
+    
     # Status
+    flag = models.CharField(max_length=2, choices=FLAG_CHOICES, blank=True)
     is_abnormal = models.BooleanField(default=False)
     
     def __str__(self):
         return f"{self.parameter_name}: {self.value} {self.unit}"
     
-    def check_abnormal(self):
-        """Check if value is outside normal range"""
-        if self.normal_min and self.normal_max:
-            self.is_abnormal = not (self.normal_min <= self.value <= self.normal_max)
+    def check_abnormal(self, catalog=None, demographics=None):
+        """
+        Classify the value against its reference range
+        Without a shared catalog only this parameter's ranges are loaded;
+        to classify many parameters, use references.flag_parameters
+        """
+        from .references import ReferenceCatalog, flag_parameters
+        if catalog is None:
+            catalog = ReferenceCatalog(ReferenceRange.objects.filter(parameter_name__iexact=self.parameter_name))
+        flag_parameters([self], catalog, demographics)
         return self.is_abnormal
     
     class Meta:
         verbose_name = "Lab Test Parameter"
         verbose_name_plural = "Lab Test Parameters"
-        ordering = ['parameter_name']
\ No newline at end of file
+        ordering = ['parameter_name']
+        indexes = [
+            models.Index(fields=['lab_report', 'parameter_name'], name='labparam_report_name_idx'),
+        ]
+
+class PatientParameterSummary(models.Model):
+    """
+    Per-patient catalog of lab parameters
+    Maintained from LabTestParameter by lab_reports.catalog
+    """
+    patient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='lab_parameter_summaries'
+    )
+    
+    parameter_name = models.CharField(max_length=100)
+    unit = models.CharField(max_length=50, help_text="Unit of the latest result")
+    result_count = models.PositiveIntegerField(default=0)
+    
+    # History span
+    first_test_date = models.DateField()
+    last_test_date = models.DateField()
+    
+    # Latest result
+    last_value = models.DecimalField(max_digits=10, decimal_places=2)
+    last_is_abnormal = models.BooleanField(default=False)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.patient.username} - {self.parameter_name} ({self.result_count})"
+    
+    class Meta:
+        verbose_name = "Patient Parameter Summary"
+        verbose_name_plural = "Patient Parameter Summaries"
+        unique_together = ['patient', 'parameter_name']
+        ordering = ['parameter_name']
+
+
+class LabFeedImport(models.Model):
+    """
+    Progress of a lab feed file import
+    Saved in the same transaction as each imported batch so an interrupted
+    import resumes right after the last committed report
+    """
+    FORMAT_CHOICES = (
+        ('HL7', 'HL7 v2 ORU'),
+        ('CSV', 'CSV'),
+    )
+    
+    source = models.CharField(max_length=500, unique=True, help_text="Absolute path of the feed file")
+    fingerprint = models.CharField(max_length=40, help_text="SHA-1 of the start of the file")
+    fingerprint_size = models.PositiveIntegerField(default=0, help_text="Bytes covered by the fingerprint")
+    feed_format = models.CharField(max_length=3, choices=FORMAT_CHOICES)
+    
+    # Resume position
+    byte_offset = models.BigIntegerField(default=0)
+    line_number = models.PositiveIntegerField(default=0)
+    
+    # Totals
+    created_reports = models.PositiveIntegerField(default=0)
+    created_parameters = models.PositiveIntegerField(default=0)
+    rejected_rows = models.PositiveIntegerField(default=0)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.source} @ {self.byte_offset}"
+    
+    class Meta:
+        verbose_name = "Lab Feed Import"
+        verbose_name_plural = "Lab Feed Imports"
+        ordering = ['-updated_at']
+
+
+class ChartRenderJob(models.Model):
+    """
+    Queued background rendering of a lab chart into the chart cache, or of
+    a report file's previews. At most one pending job exists per report
+    chart, patient parameter trend and report file; lab_reports.prerender
+    enqueues and runs them
+    """
+    KIND_CHOICES = (
+        ('REPORT', 'Report bar chart'),
+        ('TREND', 'Parameter trend chart'),
+        ('PREVIEW', 'Report file previews'),
+    )
+    
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('FAILED', 'Failed'),
+    )
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    patient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='chart_render_jobs'
+    )
+    lab_report = models.ForeignKey(
+        LabReport,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='chart_render_jobs'
+    )
+    parameter_name = models.CharField(max_length=100, blank=True)
+    
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        target = self.parameter_name or f"report {self.lab_report_id}"
+        return f"{self.get_kind_display()} - {target} ({self.status})"
+    
+    class Meta:
+        verbose_name = "Chart Render Job"
+        verbose_name_plural = "Chart Render Jobs"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='chartjob_status_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['lab_report'],
+                condition=models.Q(kind='REPORT', status='PENDING'),
+                name='chartjob_pending_report_uniq'
+            ),
+            models.UniqueConstraint(
+                fields=['patient', 'parameter_name'],
+                condition=models.Q(kind='TREND', status='PENDING'),
+                name='chartjob_pending_trend_uniq'
+            ),
+            models.UniqueConstraint(
+                fields=['lab_report'],
+                condition=models.Q(kind='PREVIEW', status='PENDING'),
+                name='chartjob_pending_preview_uniq'
+            ),
+        ]
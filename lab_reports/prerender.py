@@ -0,0 +1,222 @@
+"""
+Background Pre-rendering of Lab Charts and File Previews
+Renders a new report's bar chart and the trend charts of its parameters into
+the chart cache, so the first view after an upload is a cache hit, and
+generates thumbnails of uploaded report files
+
+Jobs are rows of ChartRenderJob. Enqueueing the same chart again while a job
+for it is still pending is a no-op. With the default LocMemCache the chart
+cache lives inside each process, so jobs are run by a worker thread in the
+process that enqueued them; with a shared cache they can also be run by the
+run_chart_jobs management command.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import cached_parameter_trend_chart, cached_report_chart
+from .models import ChartRenderJob, LabReport, LabTestParameter
+from .previews import PreviewError, generate_report_previews
+from .rendering import ChartRenderError, RenderQueueFull
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+
+# A running job not finished after this long belongs to a dead worker
+STALE_AFTER = timedelta(minutes=10)
+
+
+def enqueue_report_charts(report_ids):
+    """
+    Queue the bar chart of each report and the trend chart of every
+    parameter the reports touch, then wake the worker
+    """
+    rows = LabTestParameter.objects.filter(lab_report_id__in=report_ids).values_list(
+        'lab_report_id', 'lab_report__patient_id', 'parameter_name'
+    ).distinct()
+
+    reports, trends = {}, set()
+    for report_id, patient_id, parameter_name in rows:
+        reports[report_id] = patient_id
+        trends.add((patient_id, parameter_name))
+    if not reports:
+        return
+
+    jobs = [
+        ChartRenderJob(kind='REPORT', patient_id=patient_id, lab_report_id=report_id)
+        for report_id, patient_id in reports.items()
+    ] + [
+        ChartRenderJob(kind='TREND', patient_id=patient_id, parameter_name=parameter_name)
+        for patient_id, parameter_name in sorted(trends)
+    ]
+    _enqueue(jobs)
+
+
+def enqueue_file_previews(reports):
+    """Queue preview generation for the files of LabReport objects"""
+    _enqueue([
+        ChartRenderJob(kind='PREVIEW', patient_id=report.patient_id, lab_report_id=report.id)
+        for report in reports
+    ])
+
+
+def _enqueue(jobs):
+    # Jobs that already have a pending twin are skipped by the constraints
+    ChartRenderJob.objects.bulk_create(jobs, ignore_conflicts=True)
+
+    worker = get_worker()
+    if worker is not None:
+        worker.notify()
+
+
+def _claimable():
+    return Q(status='PENDING') | Q(status='RUNNING', updated_at__lt=timezone.now() - STALE_AFTER)
+
+
+def _claim(job_id):
+    """Mark a job running; False if another worker got it first"""
+    return ChartRenderJob.objects.filter(_claimable(), id=job_id).update(
+        status='RUNNING',
+        attempts=F('attempts') + 1,
+        updated_at=timezone.now()
+    ) == 1
+
+
+def _render(job):
+    if job.kind == 'TREND':
+        cached_parameter_trend_chart(job.patient_id, job.parameter_name)
+        return
+    report = LabReport.objects.filter(id=job.lab_report_id).first()
+    if report is None:
+        return
+    if job.kind == 'PREVIEW':
+        generate_report_previews(report)
+    else:
+        cached_report_chart(report)
+
+
+def _requeue(job_id, **values):
+    """Put a job back in the queue unless a newer one for its chart is pending"""
+    try:
+        with transaction.atomic():
+            ChartRenderJob.objects.filter(id=job_id).update(
+                status='PENDING',
+                updated_at=timezone.now(),
+                **values
+            )
+    except IntegrityError:
+        ChartRenderJob.objects.filter(id=job_id).delete()
+
+
+def _fail(job, error):
+    """Give up on a job after MAX_ATTEMPTS, else queue it for a later run"""
+    if job.attempts >= MAX_ATTEMPTS:
+        ChartRenderJob.objects.filter(id=job.id).update(
+            status='FAILED',
+            last_error=error,
+            updated_at=timezone.now()
+        )
+    else:
+        _requeue(job.id, last_error=error)
+
+
+def run_pending_jobs(limit=None):
+    """
+    Render queued charts oldest first
+    Stops early when the render pool is busy serving requests.
+    Returns the number of charts rendered
+    """
+    rendered = 0
+    # Failed jobs are retried in a later run, not straight away
+    failed = []
+    while limit is None or rendered < limit:
+        candidates = list(ChartRenderJob.objects.filter(_claimable()).exclude(
+            id__in=failed
+        ).order_by('id').values_list('id', flat=True)[:50])
+        if not candidates:
+            break
+
+        for job_id in candidates:
+            if limit is not None and rendered >= limit:
+                break
+            if not _claim(job_id):
+                continue
+            job = ChartRenderJob.objects.get(id=job_id)
+            try:
+                _render(job)
+            except RenderQueueFull:
+                # Requests come first: leave the rest for the next round
+                _requeue(job.id, attempts=F('attempts') - 1)
+                return rendered
+            except (ChartRenderError, PreviewError) as e:
+                _fail(job, str(e))
+                failed.append(job.id)
+                continue
+            except Exception as e:
+                # Unexpected errors (a full disk, a bug) must not leave the
+                # job running or stop the rest of the batch
+                logger.exception("Chart job %s failed", job.id)
+                _fail(job, f'{type(e).__name__}: {e}')
+                failed.append(job.id)
+                continue
+            ChartRenderJob.objects.filter(id=job.id).delete()
+            rendered += 1
+    return rendered
+
+
+class PrerenderWorker:
+    """
+    Daemon thread draining the job queue
+    Woken when jobs are enqueued, and every poll_interval seconds to pick up
+    jobs left by other processes or postponed while the pool was busy
+    """
+    def __init__(self, poll_interval=30):
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def notify(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='lab-chart-prerender', daemon=True
+                )
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                run_pending_jobs()
+            except Exception:
+                logger.exception("Chart pre-rendering failed")
+            finally:
+                connection.close()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker():
+    """
+    Process-wide worker configured from settings.LAB_CHART_PRERENDER
+    None when jobs are left to the run_chart_jobs command
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            from django.conf import settings
+            options = getattr(settings, 'LAB_CHART_PRERENDER', {})
+            if not options.get('IN_PROCESS', True):
+                return None
+            _worker = PrerenderWorker(poll_interval=options.get('POLL_INTERVAL', 30))
+        return _worker
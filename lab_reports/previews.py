@@ -0,0 +1,161 @@
+"""
+Thumbnails and Previews of Lab Report Files
+Downscaled WebP renderings of images and of the first page of PDFs, so list
+pages and quick looks do not download the original
+
+Previews are stored next to the original as <original>.<size>.webp. The
+original's name is its content hash, so identical uploads share previews
+and a preview never has to be regenerated. PDF pages are rasterized with
+poppler's pdftoppm when it is installed; without it PDFs get no preview.
+
+LabReport.has_file_previews records that a report's previews exist, so
+listing reports never asks the storage about them.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+from functools import lru_cache
+
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from .models import LabReport
+
+# Longest side in pixels
+PREVIEW_SIZES = {
+    'preview': 1280,
+    'thumbnail': 256,
+}
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tif', '.tiff', '.webp'}
+
+PDF_TIMEOUT = 60
+
+
+class PreviewError(Exception):
+    """Raised when a file could not be previewed"""
+
+
+def preview_name(name, size):
+    return f'{os.path.splitext(name)[0]}.{size}.webp'
+
+
+@lru_cache(maxsize=None)
+def has_pdftoppm():
+    """Whether pdftoppm is on the PATH, looked up once per process"""
+    return shutil.which('pdftoppm') is not None
+
+
+def can_preview(name):
+    extension = os.path.splitext(name or '')[1].lower()
+    if extension == '.pdf':
+        return has_pdftoppm()
+    return extension in IMAGE_EXTENSIONS
+
+
+def missing_previews(field_file):
+    """Sizes not yet generated for a stored file"""
+    if not field_file or not can_preview(field_file.name):
+        return []
+    return [
+        size for size in PREVIEW_SIZES
+        if not field_file.storage.exists(preview_name(field_file.name, size))
+    ]
+
+
+def _open_pdf_page(path, pixels, directory):
+    prefix = os.path.join(directory, 'page')
+    try:
+        subprocess.run(
+            ['pdftoppm', '-png', '-f', '1', '-l', '1', '-singlefile',
+             '-scale-to', str(pixels), path, prefix],
+            check=True, capture_output=True, timeout=PDF_TIMEOUT
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        raise PreviewError(f'Could not rasterize PDF: {e}')
+    try:
+        return Image.open(prefix + '.png')
+    except (OSError, Image.DecompressionBombError) as e:
+        raise PreviewError(f'Could not read PDF page: {e}')
+
+
+def _open_first_page(path, pixels, directory):
+    if path.lower().endswith('.pdf'):
+        return _open_pdf_page(path, pixels, directory)
+    try:
+        image = Image.open(path)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise PreviewError(f'Could not read image: {e}')
+    # JPEG can decode straight at a reduced scale
+    image.draft('RGB', (pixels, pixels))
+    return image
+
+
+def _to_rgb(image):
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('I;16', 'I;16B', 'I', 'F'):
+        # High bit depth scans: stretch to 8 bits
+        image = ImageOps.autocontrast(image.convert('F').convert('L'))
+    if image.mode not in ('RGB', 'L'):
+        # Flatten transparency onto white
+        rgba = image.convert('RGBA')
+        image = Image.new('RGB', rgba.size, 'white')
+        image.paste(rgba, mask=rgba.getchannel('A'))
+    return image
+
+
+def generate_previews(field_file):
+    """
+    Write the missing previews of a stored file
+    Returns the sizes generated
+    """
+    sizes = missing_previews(field_file)
+    if not sizes:
+        return []
+
+    storage = field_file.storage
+    largest = max(PREVIEW_SIZES[size] for size in sizes)
+    with tempfile.TemporaryDirectory() as directory:
+        with _open_first_page(field_file.path, largest, directory) as source:
+            try:
+                image = _to_rgb(source)
+                image.load()
+            except (OSError, ValueError, Image.DecompressionBombError) as e:
+                raise PreviewError(f'Could not read image: {e}')
+
+    # Each size is reduced from the previous, larger one
+    for size in sorted(sizes, key=PREVIEW_SIZES.get, reverse=True):
+        pixels = PREVIEW_SIZES[size]
+        image.thumbnail((pixels, pixels), Image.LANCZOS)
+        path = storage.path(preview_name(field_file.name, size))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f'{path}.{os.getpid()}.part'
+        image.save(partial, 'WEBP', quality=80, method=4)
+        os.replace(partial, path)
+    return sizes
+
+
+def generate_report_previews(report):
+    """
+    Write the missing previews of a report's file and mark every report
+    sharing the file as having them. Returns the sizes generated
+    """
+    name = report.report_file.name if report.report_file else ''
+    sizes = generate_previews(report.report_file)
+    if name and can_preview(name):
+        LabReport.objects.filter(report_file=name, has_file_previews=False).update(
+            has_file_previews=True
+        )
+    return sizes
+
+
+def preview_urls(report, request=None):
+    """{size: download URL} for the previews of a report's file, once generated"""
+    if not report.report_file or not report.has_file_previews:
+        return {}
+    urls = {}
+    for size in PREVIEW_SIZES:
+        url = reverse('lab-report-file-preview', args=[report.id, size])
+        urls[size] = request.build_absolute_uri(url) if request is not None else url
+    return urls
@@ -0,0 +1,204 @@
+"""
+Reference Range Engine
+Classifies lab results as low / normal / high / critical in NumPy arrays
+"""
+import math
+from collections import namedtuple
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth import get_user_model
+
+from .models import ReferenceRange
+from .units import conversion_factor
+
+User = get_user_model()
+
+ABNORMAL_FLAGS = ('LL', 'L', 'H', 'HH')
+
+TWO_PLACES = Decimal('0.01')
+
+
+def _float(value):
+    return math.nan if value is None else float(value)
+
+
+def age_on(date_of_birth, on_date):
+    """Age in whole years on a date, None if the birth date is unknown"""
+    if date_of_birth is None or on_date is None:
+        return None
+    before_birthday = (on_date.month, on_date.day) < (date_of_birth.month, date_of_birth.day)
+    return on_date.year - date_of_birth.year - before_birthday
+
+
+def load_demographics(patient_ids):
+    """{patient_id: (sex, date_of_birth)} for the given patients in one query"""
+    rows = User.objects.filter(id__in=patient_ids).values_list(
+        'id', 'patient_profile__gender', 'date_of_birth'
+    )
+    return {
+        patient_id: (gender if gender in ('M', 'F') else '', date_of_birth)
+        for patient_id, gender, date_of_birth in rows
+    }
+
+
+Bounds = namedtuple('Bounds', ['reference', 'low', 'high', 'critical_low', 'critical_high'])
+
+
+def _scaled(bound, factor):
+    if bound is None or factor == 1.0:
+        return bound
+    return (bound * Decimal(repr(factor))).quantize(TWO_PLACES)
+
+
+class ReferenceCatalog:
+    """
+    In-memory view of ReferenceRange, loaded with one query
+    Ranges apply to results in any unit they convert to. Lookups are cached
+    per (parameter, unit, sex, age) so classifying millions of rows only
+    resolves each combination once
+    """
+    def __init__(self, ranges=None):
+        if ranges is None:
+            ranges = ReferenceRange.objects.all()
+        self._ranges = {}
+        for reference in ranges:
+            self._ranges.setdefault(reference.parameter_name.casefold(), []).append(reference)
+        for candidates in self._ranges.values():
+            candidates.sort(key=self._specificity, reverse=True)
+        self._cache = {}
+
+    @staticmethod
+    def _specificity(reference):
+        banded = (reference.age_min is not None) + (reference.age_max is not None)
+        width = (reference.age_max or 200) - (reference.age_min or 0)
+        return (bool(reference.sex), banded, -width)
+
+    def match(self, parameter_name, unit, sex='', age=None):
+        """
+        Bounds of the most specific ReferenceRange for a result, converted
+        to the result's unit, or None
+        """
+        key = (parameter_name, unit, sex, age)
+        if key in self._cache:
+            return self._cache[key]
+
+        found = None
+        best = None
+        for reference in self._ranges.get(parameter_name.casefold(), []):
+            if best is not None and self._specificity(reference) < best:
+                break
+            if reference.sex and reference.sex != sex:
+                continue
+            if reference.age_min is not None and (age is None or age < reference.age_min):
+                continue
+            if reference.age_max is not None and (age is None or age >= reference.age_max):
+                continue
+            factor = conversion_factor(parameter_name, reference.unit, unit)
+            if factor is None:
+                continue
+            # Among equally specific ranges, prefer one in the result's own unit
+            if found is None or factor == 1.0:
+                found = Bounds(
+                    reference,
+                    _scaled(reference.low, factor),
+                    _scaled(reference.high, factor),
+                    _scaled(reference.critical_low, factor),
+                    _scaled(reference.critical_high, factor),
+                )
+                best = self._specificity(reference)
+            if factor == 1.0:
+                break
+        self._cache[key] = found
+        return found
+
+
+def classify(values, low, high, critical_low=None, critical_high=None):
+    """
+    Flag arrays of results against their bounds
+    Missing bounds are NaN. Returns an array of 'LL', 'L', 'N', 'H', 'HH',
+    or '' where the result has no normal range and no critical bound was hit
+    """
+    values = np.asarray(values, dtype=float)
+    low = np.asarray(low, dtype=float)
+    high = np.asarray(high, dtype=float)
+
+    flags = np.full(values.shape, '', dtype='<U2')
+    flags[~np.isnan(low) | ~np.isnan(high)] = 'N'
+    # Comparisons with NaN are False, so missing bounds never flag
+    with np.errstate(invalid='ignore'):
+        flags[values < low] = 'L'
+        flags[values > high] = 'H'
+        if critical_low is not None:
+            flags[values < np.asarray(critical_low, dtype=float)] = 'LL'
+        if critical_high is not None:
+            flags[values > np.asarray(critical_high, dtype=float)] = 'HH'
+    return flags
+
+
+def evaluate(rows, catalog, demographics):
+    """
+    Classify result rows against their own or catalog reference ranges
+    rows are (parameter_name, unit, value, normal_min, normal_max,
+    reference_range_id, patient_id, test_date) tuples. A range typed on the
+    row wins over the catalog; rows without one, or whose range came from
+    the catalog, take the catalog's while it still matches.
+    Returns (fills, flags): the catalog Bounds each row's normal range should
+    come from (or None to keep the row's own) and the flag array
+    """
+    count = len(rows)
+    values = np.empty(count)
+    low = np.full(count, math.nan)
+    high = np.full(count, math.nan)
+    critical_low = np.full(count, math.nan)
+    critical_high = np.full(count, math.nan)
+    fills = []
+
+    for i, (name, unit, value, normal_min, normal_max, reference_id, patient_id, test_date) in enumerate(rows):
+        sex, date_of_birth = demographics.get(patient_id, ('', None))
+        match = catalog.match(name, unit, sex, age_on(date_of_birth, test_date))
+        has_range = normal_min is not None or normal_max is not None
+        typed = has_range and (reference_id is None or match is None)
+
+        values[i] = value
+        if typed:
+            low[i], high[i] = _float(normal_min), _float(normal_max)
+        elif match is not None:
+            low[i], high[i] = _float(match.low), _float(match.high)
+        if match is not None:
+            critical_low[i], critical_high[i] = _float(match.critical_low), _float(match.critical_high)
+        fills.append(None if typed else match)
+
+    return fills, classify(values, low, high, critical_low, critical_high)
+
+
+def flag_parameters(parameters, catalog=None, demographics=None):
+    """
+    Set flag and is_abnormal on LabTestParameter objects, filling missing
+    normal ranges from the catalog. The objects need lab_report set;
+    nothing is saved
+    """
+    if not parameters:
+        return
+    if catalog is None:
+        catalog = ReferenceCatalog()
+    if demographics is None:
+        demographics = load_demographics({p.lab_report.patient_id for p in parameters})
+
+    rows = [
+        (p.parameter_name, p.unit, p.value, p.normal_min, p.normal_max, p.reference_range_id,
+         p.lab_report.patient_id, p.lab_report.test_date)
+        for p in parameters
+    ]
+    fills, flags = evaluate(rows, catalog, demographics)
+
+    for parameter, fill, flag in zip(parameters, fills, flags):
+        if fill is not None:
+            parameter.normal_min = fill.low
+            parameter.normal_max = fill.high
+            parameter.reference_range = fill.reference
+        elif parameter.reference_range_id is not None:
+            # The catalog range no longer applies; keep the bounds it gave
+            parameter.reference_range = None
+        parameter.flag = str(flag)
+        parameter.is_abnormal = parameter.flag in ABNORMAL_FLAGS
@@ -0,0 +1,20 @@
+"""
+Renderers for Lab Report chart endpoints
+"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ChartImageRenderer(BaseRenderer):
+    """
+    Accepts image clients (Accept: image/png etc.) on the chart image views
+    The views return image bytes directly; error payloads are still JSON
+    """
+    media_type = 'image/*'
+    format = 'image'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return JSONRenderer().render(data)
@@ -0,0 +1,221 @@
+"""
+Chart Rendering Service for Lab Reports
+Renders charts with the Matplotlib Figure API in a bounded process pool
+
+Jobs take plain numbers and strings only, never querysets, so they can be
+pickled to worker processes. Django is only imported lazily by
+get_renderer() so spawned workers stay light.
+"""
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+
+
+class ChartRenderError(Exception):
+    """Raised when a chart could not be rendered"""
+
+
+class RenderQueueFull(ChartRenderError):
+    """Raised when too many chart jobs are already pending"""
+
+
+class RenderTimeout(ChartRenderError):
+    """Raised when a chart job did not finish in time"""
+
+
+def _new_figure(width, height):
+    from matplotlib.figure import Figure
+    return Figure(figsize=(width, height))
+
+
+def _to_bytes(fig, image_format):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=image_format, dpi=100, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def render_trend(dates, values, parameter_name, unit,
+                 normal_min=None, normal_max=None, image_format='png'):
+    """
+    Line chart of one parameter over time
+    dates are proleptic Gregorian ordinals (date.toordinal())
+    """
+    fig = _new_figure(10, 6)
+    ax = fig.subplots()
+    x = [date.fromordinal(d) for d in dates]
+    ax.plot(x, values, marker='o', linewidth=2, markersize=8, label=parameter_name)
+
+    # Add normal range
+    if normal_min is not None and normal_max is not None:
+        ax.axhline(y=normal_min, color='green', linestyle='--', alpha=0.5, label='Normal Min')
+        ax.axhline(y=normal_max, color='green', linestyle='--', alpha=0.5, label='Normal Max')
+        ax.axhspan(normal_min, normal_max, alpha=0.1, color='green')
+
+    ax.set_xlabel('Date', fontsize=12)
+    ax.set_ylabel(f'{parameter_name} ({unit})', fontsize=12)
+    ax.set_title(f'{parameter_name} Trend Over Time', fontsize=14, fontweight='bold')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    ax.tick_params(axis='x', rotation=45)
+    fig.tight_layout()
+    return _to_bytes(fig, image_format)
+
+
+def render_multi_trend(series, image_format='png'):
+    """
+    Stacked line charts, one panel per parameter
+    series is a list of dicts with parameter_name, unit, dates and values,
+    and optionally normal_min / normal_max
+    """
+    fig = _new_figure(12, 4 * len(series))
+    axes = fig.subplots(len(series), 1, squeeze=False)[:, 0]
+
+    for ax, item in zip(axes, series):
+        x = [date.fromordinal(d) for d in item['dates']]
+        ax.plot(x, item['values'], marker='o', linewidth=2, markersize=8)
+        if item.get('normal_min') is not None and item.get('normal_max') is not None:
+            ax.axhspan(item['normal_min'], item['normal_max'], alpha=0.1, color='green')
+        ax.set_ylabel(f"{item['parameter_name']} ({item['unit']})", fontsize=10)
+        ax.set_title(item['parameter_name'], fontsize=12, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+        ax.tick_params(axis='x', rotation=45)
+
+    fig.tight_layout()
+    return _to_bytes(fig, image_format)
+
+
+def render_report_bars(names, values, abnormal, image_format='png'):
+    """
+    Bar chart of a single report's parameters, abnormal values in red
+    """
+    fig = _new_figure(12, 6)
+    ax = fig.subplots()
+    colors = ['red' if flag else 'green' for flag in abnormal]
+    bars = ax.bar(names, values, color=colors, alpha=0.7)
+
+    # Add value labels on bars
+    for bar, value in zip(bars, values):
+        ax.text(bar.get_x() + bar.get_width() / 2., bar.get_height(),
+                f'{value:.2f}',
+                ha='center', va='bottom', fontsize=10)
+
+    ax.set_xlabel('Parameters', fontsize=12)
+    ax.set_ylabel('Values', fontsize=12)
+    ax.set_title('Lab Test Results', fontsize=14, fontweight='bold')
+    ax.tick_params(axis='x', rotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment('right')
+    ax.grid(True, alpha=0.3, axis='y')
+    fig.tight_layout()
+    return _to_bytes(fig, image_format)
+
+
+RENDERERS = {
+    'trend': render_trend,
+    'multi_trend': render_multi_trend,
+    'report': render_report_bars,
+}
+
+
+def _run_job(kind, kwargs):
+    return RENDERERS[kind](**kwargs)
+
+
+def _warm_worker():
+    """Import Matplotlib once per worker so jobs do not pay for it"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.figure  # noqa: F401
+    import matplotlib.backends.backend_agg  # noqa: F401
+
+
+class ChartRenderer:
+    """
+    Bounded chart rendering pool
+
+    workers=0 renders in the calling thread, which is still safe because
+    every job builds its own Figure instead of using pyplot global state.
+    """
+    def __init__(self, workers=2, max_pending=16, timeout=10):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_warm_worker,
+                )
+            return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def render(self, kind, timeout=None, **kwargs):
+        """Render a chart and return the image bytes"""
+        if kind not in RENDERERS:
+            raise ChartRenderError(f'Unknown chart type: {kind}')
+
+        if not self._slots.acquire(blocking=False):
+            raise RenderQueueFull('Too many charts are being rendered, try again shortly')
+
+        if not self.workers:
+            try:
+                return _run_job(kind, kwargs)
+            except Exception as e:
+                raise ChartRenderError(f'Could not render chart: {e}') from e
+            finally:
+                self._slots.release()
+
+        try:
+            future = self._get_executor().submit(_run_job, kind, kwargs)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset_executor()
+            raise ChartRenderError('Chart rendering pool was restarted, try again')
+        future.add_done_callback(lambda f: self._slots.release())
+
+        try:
+            return future.result(timeout=timeout or self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise RenderTimeout('Chart rendering timed out')
+        except BrokenProcessPool:
+            self._reset_executor()
+            raise ChartRenderError('Chart rendering pool was restarted, try again')
+        except Exception as e:
+            # A Matplotlib or encoder failure inside the job
+            raise ChartRenderError(f'Could not render chart: {e}') from e
+
+    def shutdown(self):
+        self._reset_executor()
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer():
+    """Process-wide renderer configured from settings.LAB_CHART_RENDERER"""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            from django.conf import settings
+            options = getattr(settings, 'LAB_CHART_RENDERER', {})
+            _renderer = ChartRenderer(
+                workers=options.get('WORKERS', 2),
+                max_pending=options.get('MAX_PENDING', 16),
+                timeout=options.get('TIMEOUT', 10),
+            )
+        return _renderer
@@ -1,8 +1,11 @@
 """
 Serializers for Lab Reports and Visualization
 """
+from django.db import transaction
 from rest_framework import serializers
-from .models import LabReport, LabTestParameter
+from healthcare_backend.downloads import ProtectedFileField
+from .models import LabReport, LabTestParameter, PatientParameterSummary
+from .previews import preview_urls
 
 class LabTestParameterSerializer(serializers.ModelSerializer):
     """
@@ -12,9 +15,10 @@ class LabTestParameterSerializer(serializers.ModelSerializer):
         model = LabTestParameter
         fields = [
             'id', 'lab_report', 'parameter_name', 'value', 'unit',
-            'normal_min', 'normal_max', 'is_abnormal'
+            'normal_min', 'normal_max', 'canonical_value', 'canonical_unit',
+            'flag', 'is_abnormal'
         ]
-        read_only_fields = ['id']
+        read_only_fields = ['id', 'canonical_value', 'canonical_unit', 'flag']
 
 
 class LabReportSerializer(serializers.ModelSerializer):
@@ -24,23 +28,43 @@ class LabReportSerializer(serializers.ModelSerializer):
     patient_name = serializers.CharField(source='patient.get_full_name', read_only=True)
     doctor_name = serializers.CharField(source='doctor.get_full_name', read_only=True)
     parameters = LabTestParameterSerializer(many=True, read_only=True)
+    report_file = ProtectedFileField('lab-report-file', required=False, allow_null=True)
+    report_file_previews = serializers.SerializerMethodField()
     
     class Meta:
         model = LabReport
         fields = [
             'id', 'patient', 'patient_name', 'doctor', 'doctor_name',
             'test_type', 'test_name', 'test_date', 'report_file',
-            'summary', 'is_normal', 'remarks', 'parameters',
-            'created_at', 'updated_at'
+            'report_file_previews', 'summary', 'is_normal', 'remarks',
+            'parameters', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        select_related = ['patient', 'doctor']
+    
+    def get_report_file_previews(self, obj):
+        """Thumbnail and preview URLs of the report file once generated"""
+        return preview_urls(obj, self.context.get('request'))
+
+
+PARAMETER_INPUT_FIELDS = ['parameter_name', 'value', 'unit', 'normal_min', 'normal_max']
+
+
+class LabTestParameterInputSerializer(serializers.ModelSerializer):
+    """
+    Serializer for parameters submitted together with their report
+    """
+    class Meta:
+        model = LabTestParameter
+        fields = PARAMETER_INPUT_FIELDS
 
 
 class LabReportCreateSerializer(serializers.ModelSerializer):
     """
     Serializer for creating lab reports
     """
-    parameters = LabTestParameterSerializer(many=True, write_only=True, required=False)
+    parameters = LabTestParameterInputSerializer(many=True, write_only=True, required=False)
+    report_file = ProtectedFileField('lab-report-file', required=False, allow_null=True)
     
     class Meta:
         model = LabReport
@@ -50,28 +74,56 @@ class LabReportCreateSerializer(serializers.ModelSerializer):
         ]
     
     def create(self, validated_data):
-        """Create lab report with parameters"""
-        parameters_data = validated_data.pop('parameters', [])
-        lab_report = LabReport.objects.create(**validated_data)
+        """Create lab report with parameters in one bulk insert"""
+        from .ingest import create_parameters
+        from .prerender import enqueue_report_charts
         
-        # Create parameters
-        for parameter_data in parameters_data:
-            param = LabTestParameter.objects.create(
-                lab_report=lab_report,
-                **parameter_data
-            )
-            param.check_abnormal()
-            param.save()
+        parameters_data = validated_data.pop('parameters', [])
+        with transaction.atomic():
+            lab_report = LabReport.objects.create(**validated_data)
+            create_parameters([(lab_report, parameters_data)])
+            # Render the charts the patient is about to open once the report is visible
+            transaction.on_commit(lambda: enqueue_report_charts([lab_report.id]))
         
         return lab_report
 
 
+class LabReportIngestSerializer(serializers.ModelSerializer):
+    """
+    Serializer for validating reports in bulk ingestion
+    Patients are plain ids here and are checked once per batch
+    """
+    patient = serializers.IntegerField()
+    parameters = LabTestParameterInputSerializer(many=True, required=False)
+    
+    class Meta:
+        model = LabReport
+        fields = [
+            'patient', 'test_type', 'test_name', 'test_date',
+            'summary', 'is_normal', 'remarks', 'parameters'
+        ]
+
+
 class LabReportVisualizationSerializer(serializers.Serializer):
     """
     Serializer for lab report visualization data
     """
     parameter_name = serializers.CharField()
+    unit = serializers.CharField()
     values = serializers.ListField(child=serializers.FloatField())
     dates = serializers.ListField(child=serializers.DateField())
     normal_min = serializers.FloatField(allow_null=True)
-    normal_max = serializers.FloatField(allow_null=True)
\ No newline at end of file
+    normal_max = serializers.FloatField(allow_null=True)
+    total_points = serializers.IntegerField(help_text="Points before downsampling")
+
+
+class PatientParameterSummarySerializer(serializers.ModelSerializer):
+    """
+    Serializer for the per-patient parameter catalog
+    """
+    class Meta:
+        model = PatientParameterSummary
+        fields = [
+            'parameter_name', 'unit', 'result_count', 'first_test_date',
+            'last_test_date', 'last_value', 'last_is_abnormal'
+        ]
\ No newline at end of file
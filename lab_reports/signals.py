@@ -0,0 +1,109 @@
+"""
+Signal handlers for Lab Reports
+Keeps LabReport.updated_at current so cached charts are invalidated, keeps
+the per-patient parameter catalog in step with parameter changes, stores
+each value in its canonical unit and queues previews of uploaded files
+"""
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .catalog import refresh_parameter_summaries
+from .models import LabReport, LabTestParameter
+from .previews import can_preview
+from .units import normalize_parameters
+
+# LabReport fields the parameter catalog is derived from
+CATALOG_FIELDS = {'patient_id', 'test_date'}
+
+
+@receiver(post_init, sender=LabTestParameter)
+def remember_parameter_name(sender, instance, **kwargs):
+    """Remember the loaded name so a rename refreshes both catalog rows"""
+    instance._loaded_parameter_name = instance.parameter_name
+
+
+@receiver(post_init, sender=LabReport)
+def remember_report_catalog_key(sender, instance, **kwargs):
+    """
+    Remember the loaded patient and test date, so only saves that change
+    them refresh the catalog, and a reassigned report refreshes both patients
+    """
+    if CATALOG_FIELDS & instance.get_deferred_fields():
+        instance._loaded_catalog_key = None
+    else:
+        instance._loaded_catalog_key = (instance.patient_id, instance.test_date)
+
+
+@receiver(post_init, sender=LabReport)
+def remember_report_file(sender, instance, **kwargs):
+    """Remember the loaded file so a replaced one is previewed again"""
+    if 'report_file' in instance.get_deferred_fields():
+        instance._loaded_report_file = None
+    else:
+        instance._loaded_report_file = instance.report_file.name
+
+
+@receiver(pre_save, sender=LabReport)
+def reset_file_previews(sender, instance, **kwargs):
+    """A new or replaced file has no previews yet"""
+    if 'report_file' in instance.get_deferred_fields():
+        return
+    if instance.report_file.name != instance._loaded_report_file:
+        instance.has_file_previews = False
+
+
+@receiver(pre_save, sender=LabTestParameter)
+def set_canonical_value(sender, instance, **kwargs):
+    """Convert the value to its canonical unit before it is saved"""
+    normalize_parameters([instance])
+
+
+@receiver(post_save, sender=LabTestParameter)
+@receiver(post_delete, sender=LabTestParameter)
+def touch_lab_report(sender, instance, **kwargs):
+    """Bump the parent report's updated_at when a parameter changes"""
+    LabReport.objects.filter(pk=instance.lab_report_id).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver(post_save, sender=LabTestParameter)
+@receiver(post_delete, sender=LabTestParameter)
+def refresh_parameter_catalog(sender, instance, **kwargs):
+    """Recompute the catalog rows touched by a parameter change"""
+    patient_id = instance.lab_report.patient_id
+    names = {instance.parameter_name, instance._loaded_parameter_name}
+    instance._loaded_parameter_name = instance.parameter_name
+    transaction.on_commit(lambda: refresh_parameter_summaries(patient_id, names))
+
+
+@receiver(post_save, sender=LabReport)
+def refresh_report_catalog(sender, instance, created, **kwargs):
+    """A changed test date or patient affects every parameter of the report"""
+    loaded = instance._loaded_catalog_key
+    key = (instance.patient_id, instance.test_date)
+    instance._loaded_catalog_key = key
+    if created or key == loaded:
+        return
+    
+    # A report loaded without its patient can only refresh the current one
+    patient_ids = {instance.patient_id} if loaded is None else {instance.patient_id, loaded[0]}
+    names = set(instance.parameters.values_list('parameter_name', flat=True))
+    for patient_id in patient_ids if names else ():
+        transaction.on_commit(
+            lambda patient_id=patient_id: refresh_parameter_summaries(patient_id, names)
+        )
+
+
+@receiver(post_save, sender=LabReport)
+def queue_file_previews(sender, instance, **kwargs):
+    """Generate thumbnails of a newly attached report file in the background"""
+    if 'report_file' in instance.get_deferred_fields():
+        return
+    instance._loaded_report_file = instance.report_file.name
+    if (instance.report_file and not instance.has_file_previews
+            and can_preview(instance.report_file.name)):
+        from .prerender import enqueue_file_previews
+        transaction.on_commit(lambda: enqueue_file_previews([instance]))
@@ -1,3 +1,435 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+
+from doctors.models import DoctorPatientAssignment
+from healthcare_backend.downloads import parse_range
+from .feeds import read_csv_feed, read_hl7
+from .models import ChartRenderJob, LabReport, LabTestParameter, PatientParameterSummary, ReferenceRange
+from .prerender import MAX_ATTEMPTS, run_pending_jobs
+from .references import ReferenceCatalog
+from .rendering import ChartRenderError, ChartRenderer
+from .previews import can_preview, generate_report_previews, has_pdftoppm, preview_urls
+
+User = get_user_model()
+
+HL7 = (
+    'MSH|^~\\&|LAB|HOSP|||20300107120000||ORU^R01|1|P|2.5\r'
+    'PID|1||42\r'
+    'OBR|1|||CBC^Complete blood count|||20300107' + '|' * 17 + 'HM\r'
+    'OBX|1|NM|HGB^Hemoglobin||13.5|g/dL|12-16|N\r'
+    'OBX|2|SN|PLT^Platelets||^250|10*3/uL|150-400\r'
+    'OBX|3|ST|MORPH^Morphology||Normocytic \\T\\ normochromic\r'
+    'NTE|1||Sample slightly haemolysed\r'
+    'OBR|2|||GLU^Glucose|||20300107\r'
+    'OBX|1|NM|GLU^Glucose||180|mg/dL|<140|H\r'
+    'MSH|^~\\&|LAB|HOSP|||20300108120000||ORU^R01|2|P|2.5\r'
+    'PID|1||43\r'
+    'OBR|1|||UA^Urinalysis|||20300108' + '|' * 17 + 'UR\r'
+    'OBX|1|NM|PH^pH||6.0|pH|>=5\r'
+)
+
+CSV = (
+    'patient,test_type,test_name,test_date,parameter_name,value,unit\n'
+    '42,BLOOD,Lipid panel,2030-01-07,Cholesterol,190,mg/dL\n'
+    '42,BLOOD,Lipid panel,2030-01-07,HDL,50,mg/dL\n'
+    '43,BLOOD,Lipid panel,2030-01-07,Cholesterol,210,mg/dL\n'
+)
+
+
+def read(reader, text, offset=0, line=0):
+    return list(reader(io.BytesIO(text.encode()), offset, line))
+
+
+class FeedReaderTests(SimpleTestCase):
+
+    def test_hl7_reports(self):
+        records = read(read_hl7, HL7)
+        self.assertEqual([record.row for record in records], [3, 8, 12])
+        cbc, glucose, urine = [record.record for record in records]
+        self.assertEqual(cbc, {
+            'patient': '42',
+            'test_type': 'BLOOD',
+            'test_name': 'Complete blood count',
+            'test_date': '2030-01-07',
+            'is_normal': True,
+            'parameters': [
+                {'parameter_name': 'Hemoglobin', 'value': '13.50', 'unit': 'g/dL',
+                 'normal_min': '12.00', 'normal_max': '16.00'},
+                {'parameter_name': 'Platelets', 'value': '250.00', 'unit': '10*3/uL',
+                 'normal_min': '150.00', 'normal_max': '400.00'},
+            ],
+            'summary': 'Morphology: Normocytic & normochromic',
+            'remarks': 'Sample slightly haemolysed',
+        })
+        self.assertFalse(glucose['is_normal'])
+        self.assertEqual(glucose['parameters'][0]['normal_max'], '140.00')
+        self.assertEqual(urine['test_type'], 'URINE')
+        self.assertEqual(urine['parameters'][0]['normal_min'], '5.00')
+
+    def test_hl7_checkpoints_at_message_boundaries(self):
+        records = read(read_hl7, HL7)
+        # The second OBR group of a message cannot be resumed from
+        self.assertEqual(records[0].offset, None)
+        self.assertEqual(records[1].offset, HL7.index('MSH', 1))
+        self.assertEqual(records[1].line, 9)
+        self.assertEqual((records[2].offset, records[2].line), (len(HL7), 13))
+
+    def test_hl7_resume(self):
+        checkpoint = read(read_hl7, HL7)[1]
+        records = read(read_hl7, HL7, checkpoint.offset, checkpoint.line)
+        self.assertEqual([record.row for record in records], [12])
+        self.assertEqual(records[0].record['patient'], '43')
+
+    def test_hl7_unterminated_last_line_is_not_resumable(self):
+        partial = HL7[:-6]
+        records = read(read_hl7, partial)
+        self.assertEqual((records[-1].offset, records[-1].line), (None, None))
+        self.assertEqual(records[1].offset, HL7.index('MSH', 1))
+
+    def test_hl7_segment_outside_message(self):
+        records = read(read_hl7, 'PID|1||42\r' + HL7)
+        self.assertIsInstance(records[0].record, ValueError)
+        self.assertEqual(len(records), 4)
+
+    def test_csv_groups_rows_into_reports(self):
+        records = read(read_csv_feed, CSV)
+        self.assertEqual([record.row for record in records], [2, 4])
+        self.assertEqual(
+            [parameter['parameter_name'] for parameter in records[0].record['parameters']],
+            ['Cholesterol', 'HDL']
+        )
+        self.assertEqual(records[0].record['patient'], '42')
+        self.assertEqual((records[0].offset, records[0].line), (CSV.index('43,'), 3))
+        self.assertEqual((records[1].offset, records[1].line), (len(CSV), 4))
+
+    def test_csv_resume(self):
+        checkpoint = read(read_csv_feed, CSV)[0]
+        records = read(read_csv_feed, CSV, checkpoint.offset, checkpoint.line)
+        self.assertEqual([record.row for record in records], [4])
+        self.assertEqual(records[0].record['patient'], '43')
+
+    def test_csv_unterminated_last_line_is_not_resumable(self):
+        records = read(read_csv_feed, CSV[:-3])
+        self.assertEqual((records[-1].offset, records[-1].line), (None, None))
+        self.assertEqual(records[0].offset, CSV.index('43,'))
+
+
+class ImportLabFeedTests(TestCase):
+
+    def setUp(self):
+        User.objects.create_user('pat42', password='pw', role='PATIENT', id=42)
+        User.objects.create_user('pat43', password='pw', role='PATIENT', id=43)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, text, mode='w'):
+        path = os.path.join(self.directory, name)
+        with open(path, mode, newline='') as handle:
+            handle.write(text)
+        return path
+
+    def run_import(self, path):
+        call_command('import_lab_feed', path, batch_size=1, stdout=io.StringIO())
+
+    def test_resumes_after_appended_lines(self):
+        # The feed is cut part way through its last message
+        cut = HL7.index('OBX|1|NM|PH')
+        path = self.write('feed.hl7', HL7[:cut + 10])
+        self.run_import(path)
+        self.assertEqual(LabReport.objects.count(), 2)
+
+        self.write('feed.hl7', HL7[cut + 10:], mode='a')
+        self.run_import(path)
+        self.assertEqual(
+            sorted(LabReport.objects.values_list('test_name', flat=True)),
+            ['Complete blood count', 'Glucose', 'Urinalysis']
+        )
+        urine = LabReport.objects.get(test_name='Urinalysis')
+        self.assertEqual(urine.parameters.get().value, 6)
+
+        # Nothing new, nothing imported twice
+        self.run_import(path)
+        self.assertEqual(LabReport.objects.count(), 3)
+
+    def test_csv_resume(self):
+        path = self.write('feed.csv', CSV[:-3])
+        self.run_import(path)
+        self.assertEqual(LabReport.objects.count(), 1)
+
+        self.write('feed.csv', CSV[-3:], mode='a')
+        self.run_import(path)
+        self.assertEqual(LabReport.objects.count(), 2)
+        self.assertEqual(LabTestParameter.objects.count(), 3)
+
+
+class ListQueryTests(TestCase):
+    """Each list costs the same number of queries for one row and for many"""
+
+    def setUp(self):
+        self.doctor = User.objects.create_user('doc', password='pw', role='DOCTOR')
+        self.patient = User.objects.create_user('pat', password='pw', role='PATIENT')
+        DoctorPatientAssignment.objects.create(doctor=self.doctor, patient=self.patient)
+        self.client = APIClient()
+        self.rows = 0
+
+    def seed(self, count):
+        for _ in range(self.rows, count):
+            report = LabReport.objects.create(
+                patient=self.patient,
+                doctor=self.doctor,
+                test_type='BLOOD',
+                test_name='Lipid panel',
+                test_date=date.today()
+            )
+            LabTestParameter.objects.bulk_create([
+                LabTestParameter(lab_report=report, parameter_name=f'Parameter {n}',
+                                 value=1, unit='mg/dL')
+                for n in range(3)
+            ])
+        self.rows = count
+
+    def assertListQueries(self, url, user, expected):
+        self.client.force_authenticate(user)
+        for count in (1, 5):
+            self.seed(count)
+            with self.assertNumQueries(expected):
+                response = self.client.get(url, {'page_size': count})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), count)
+
+    def test_patient_list(self):
+        self.assertListQueries(reverse('lab-report-list'), self.patient, 2)
+
+    def test_doctor_list(self):
+        self.assertListQueries(reverse('lab-report-list'), self.doctor, 2)
+
+    def test_by_patient(self):
+        url = reverse('reports-by-patient', args=[self.patient.id])
+        self.assertListQueries(url, self.doctor, 3)
+
+
+class ReportCatalogTests(TestCase):
+
+    def setUp(self):
+        self.patient = User.objects.create_user('pat', password='pw', role='PATIENT')
+        self.other = User.objects.create_user('other', password='pw', role='PATIENT')
+        with self.captureOnCommitCallbacks(execute=True):
+            report = LabReport.objects.create(
+                patient=self.patient,
+                test_type='BLOOD',
+                test_name='Glucose',
+                test_date=date(2030, 1, 7)
+            )
+            LabTestParameter.objects.create(lab_report=report, parameter_name='Glucose',
+                                            value=90, unit='mg/dL')
+        self.report = LabReport.objects.get()
+
+    def test_save_without_catalog_changes_skips_refresh(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.report.remarks = 'Fasting'
+            self.report.save()
+        self.assertEqual(callbacks, [])
+
+    def test_changed_test_date_refreshes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.report.test_date = date(2030, 2, 1)
+            self.report.save()
+        summary = PatientParameterSummary.objects.get()
+        self.assertEqual(summary.last_test_date, date(2030, 2, 1))
+
+    def test_reassigned_report_refreshes_both_patients(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.report.patient = self.other
+            self.report.save()
+        self.assertEqual(
+            list(PatientParameterSummary.objects.values_list('patient_id', flat=True)),
+            [self.other.id]
+        )
+
+
+class CheckAbnormalTests(TestCase):
+
+    def setUp(self):
+        patient = User.objects.create_user('pat', password='pw', role='PATIENT')
+        self.report = LabReport.objects.create(patient=patient, test_type='BLOOD',
+                                               test_name='Panel', test_date=date(2030, 1, 7))
+        ReferenceRange.objects.create(parameter_name='Glucose', unit='mg/dL', low=70, high=100)
+        ReferenceRange.objects.create(parameter_name='Sodium', unit='mmol/L', low=135, high=145)
+
+    def parameter(self, name, value, unit):
+        return LabTestParameter(lab_report=self.report, parameter_name=name, value=value, unit=unit)
+
+    def test_flags_against_catalog(self):
+        self.assertTrue(self.parameter('Glucose', 180, 'mg/dL').check_abnormal())
+        self.assertFalse(self.parameter('glucose', 5, 'mmol/L').check_abnormal())
+
+    def test_shared_catalog_skips_range_query(self):
+        catalog = ReferenceCatalog()
+        demographics = {self.report.patient_id: ('', None)}
+        with self.assertNumQueries(0):
+            self.assertTrue(self.parameter('Sodium', 150, 'mmol/L').check_abnormal(catalog, demographics))
+            self.assertFalse(self.parameter('Glucose', 90, 'mg/dL').check_abnormal(catalog, demographics))
+
+
+def png(color):
+    content = io.BytesIO()
+    Image.new('RGB', (600, 400), color).save(content, 'PNG')
+    return SimpleUploadedFile('scan.png', content.getvalue(), content_type='image/png')
+
+
+class FilePreviewTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.patient = User.objects.create_user('pat', password='pw', role='PATIENT')
+
+    def report(self, upload):
+        # Previews are generated by the test, not the background worker
+        with mock.patch('lab_reports.prerender.enqueue_file_previews'):
+            return LabReport.objects.create(
+                patient=self.patient,
+                test_type='XRAY',
+                test_name='Chest',
+                test_date=date(2030, 1, 7),
+                report_file=upload
+            )
+
+    def test_urls_follow_the_flag_without_reading_storage(self):
+        report = self.report(png('white'))
+        self.assertEqual(preview_urls(report), {})
+
+        generate_report_previews(report)
+        report = LabReport.objects.get()
+        self.assertTrue(report.has_file_previews)
+        with mock.patch.object(report.report_file.storage, 'exists') as exists:
+            self.assertEqual(
+                set(preview_urls(report)),
+                {'preview', 'thumbnail'}
+            )
+        exists.assert_not_called()
+
+    def test_identical_uploads_share_previews(self):
+        first = self.report(png('white'))
+        second = self.report(png('white'))
+        generate_report_previews(first)
+        self.assertEqual(LabReport.objects.filter(has_file_previews=True).count(), 2)
+        self.assertEqual(first.report_file.name, second.report_file.name)
+
+    def test_replaced_file_loses_its_previews(self):
+        report = self.report(png('white'))
+        generate_report_previews(report)
+        report = LabReport.objects.get()
+        with mock.patch('lab_reports.prerender.enqueue_file_previews'):
+            report.report_file = png('black')
+            report.save()
+        self.assertFalse(LabReport.objects.get().has_file_previews)
+
+    def test_pdftoppm_is_looked_up_once(self):
+        has_pdftoppm.cache_clear()
+        self.addCleanup(has_pdftoppm.cache_clear)
+        with mock.patch('lab_reports.previews.shutil.which', return_value=None) as which:
+            for _ in range(3):
+                self.assertFalse(can_preview('report.pdf'))
+        which.assert_called_once_with('pdftoppm')
+
+
+class PrerenderJobTests(TestCase):
+
+    def setUp(self):
+        patient = User.objects.create_user('pat', password='pw', role='PATIENT')
+        report = LabReport.objects.create(
+            patient=patient,
+            test_type='XRAY',
+            test_name='Chest',
+            test_date=date(2030, 1, 7)
+        )
+        self.preview = ChartRenderJob.objects.create(kind='PREVIEW', patient=patient, lab_report=report)
+        # A report chart of a report without parameters renders nothing
+        self.chart = ChartRenderJob.objects.create(kind='REPORT', patient=patient, lab_report=report)
+
+    @mock.patch('lab_reports.prerender.generate_report_previews', side_effect=OSError('No space left'))
+    def test_unexpected_error_is_retried_then_failed(self, generate):
+        with self.assertLogs('lab_reports.prerender', 'ERROR'):
+            self.assertEqual(run_pending_jobs(), 1)
+        # The rest of the batch still ran
+        self.assertFalse(ChartRenderJob.objects.filter(id=self.chart.id).exists())
+        job = ChartRenderJob.objects.get(id=self.preview.id)
+        self.assertEqual((job.status, job.attempts), ('PENDING', 1))
+        self.assertIn('No space left', job.last_error)
+
+        for _ in range(MAX_ATTEMPTS - 1):
+            with self.assertLogs('lab_reports.prerender', 'ERROR'):
+                run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('FAILED', MAX_ATTEMPTS))
+        self.assertEqual(run_pending_jobs(), 0)
+        self.assertEqual(generate.call_count, MAX_ATTEMPTS)
+
+
+class ParseRangeTests(SimpleTestCase):
+
+    def test_ranges(self):
+        self.assertEqual(parse_range('bytes=2-5', 10), (2, 5))
+        self.assertEqual(parse_range('bytes=2-', 10), (2, 9))
+        self.assertEqual(parse_range('bytes=-3', 10), (7, 9))
+        self.assertEqual(parse_range('bytes=8-20', 10), (8, 9))
+
+    def test_invalid_range_sends_whole_file(self):
+        self.assertIsNone(parse_range('bytes=9-2', 10))
+        self.assertIsNone(parse_range('bytes=12-2', 10))
+        self.assertIsNone(parse_range('items=0-1', 10))
+
+    def test_unsatisfiable_range(self):
+        self.assertIs(parse_range('bytes=10-20', 10), False)
+        self.assertIs(parse_range('bytes=-0', 10), False)
+
+
+class ChartRendererTests(SimpleTestCase):
+
+    def test_job_errors_become_render_errors(self):
+        # Mismatched dates and values make Matplotlib raise
+        renderer = ChartRenderer(workers=0)
+        with self.assertRaises(ChartRenderError):
+            renderer.render('trend', dates=[738000, 738001], values=[1.0],
+                            parameter_name='Glucose', unit='mg/dL')
+        # The slot was released
+        self.assertTrue(renderer.render('trend', dates=[738000], values=[1.0],
+                                        parameter_name='Glucose', unit='mg/dL'))
+
+
+class DateRangeParamTests(TestCase):
+
+    def setUp(self):
+        self.patient = User.objects.create_user('pat', password='pw', role='PATIENT')
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    def test_trend_data_rejects_malformed_dates(self):
+        url = reverse('parameter-trend-data', args=[self.patient.id])
+        for params in ({'date_from': 'bad'}, {'date_to': '2030-13-01'}):
+            with self.subTest(params=params):
+                response = self.client.get(url, {'parameter': 'Glucose', **params})
+                self.assertEqual(response.status_code, 400)
+        response = self.client.get(url, {'parameter': 'Glucose', 'date_from': '2030-01-01'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_multiple_parameters_chart_rejects_malformed_dates(self):
+        url = reverse('visualize-multiple-parameters', args=[self.patient.id])
+        response = self.client.get(url, {'parameter': 'Glucose', 'date_to': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,255 @@
+"""
+Lab Unit Registry
+Conversion factors between the units lab results arrive in
+
+Every result is stored with a canonical value and unit so trends and
+statistics can mix results reported in different units. Registered
+analytes are converted to their conventional unit; other parameters keep
+the unit they were reported in, since no single unit per dimension suits
+both mg/dL chemistry and ng/L trace analytes. Factors are
+resolved once per (parameter, unit) and cached, so converting a batch is a
+single NumPy multiply.
+"""
+from decimal import Decimal
+from functools import lru_cache
+
+import numpy as np
+
+# Units of one dimension as multiples of the dimension's base unit
+DIMENSIONS = {
+    'mass': {
+        'g/l': 1.0, 'g/dl': 10.0, 'mg/ml': 1.0, 'mg/dl': 1e-2, 'mg/l': 1e-3,
+        'ug/ml': 1e-3, 'ug/dl': 1e-5, 'ug/l': 1e-6, 'ng/ml': 1e-6,
+        'ng/dl': 1e-8, 'ng/l': 1e-9, 'pg/ml': 1e-9,
+    },
+    'molar': {
+        'mol/l': 1.0, 'mmol/l': 1e-3, 'umol/l': 1e-6, 'nmol/l': 1e-9, 'pmol/l': 1e-12,
+    },
+    'count': {
+        '/l': 1.0, '/ul': 1e6, '10^3/ul': 1e9, '10^9/l': 1e9,
+        '10^6/ul': 1e12, '10^12/l': 1e12,
+    },
+    'activity': {
+        'u/l': 1.0, 'iu/l': 1.0, 'miu/l': 1e-3, 'uiu/ml': 1e-3,
+        'miu/ml': 1.0, 'ukat/l': 60.0,
+    },
+}
+
+# canonical_value is a DecimalField(14, 4); larger results keep their unit
+CANONICAL_LIMIT = 10 ** 10
+
+UNIT_ALIASES = {
+    'mg%': 'mg/dl',
+    'k/ul': '10^3/ul',
+    'thou/ul': '10^3/ul',
+    'm/ul': '10^6/ul',
+    'mil/ul': '10^6/ul',
+    'cells/ul': '/ul',
+    'mu/l': 'miu/l',
+    'mcu/ml': 'uiu/ml',
+}
+
+# Canonical unit, molar mass (g/mol) and charge of known analytes
+ANALYTES = {
+    'glucose': ('mg/dL', 180.16, None),
+    'cholesterol': ('mg/dL', 386.65, None),
+    'triglycerides': ('mg/dL', 885.7, None),
+    'creatinine': ('mg/dL', 113.12, None),
+    'urea': ('mg/dL', 60.06, None),
+    'urea nitrogen': ('mg/dL', 28.014, None),
+    'uric acid': ('mg/dL', 168.11, None),
+    'bilirubin': ('mg/dL', 584.66, None),
+    'calcium': ('mg/dL', 40.08, 2),
+    'magnesium': ('mg/dL', 24.305, 2),
+    'phosphate': ('mg/dL', 30.97, None),
+    'iron': ('ug/dL', 55.845, None),
+    'sodium': ('mmol/L', 22.99, 1),
+    'potassium': ('mmol/L', 39.098, 1),
+    'chloride': ('mmol/L', 35.45, 1),
+    'bicarbonate': ('mmol/L', 61.02, 1),
+    'hemoglobin': ('g/dL', 16114.0, None),
+    'albumin': ('g/dL', 66500.0, None),
+    'total protein': ('g/dL', None, None),
+    'globulin': ('g/dL', None, None),
+    'vitamin d': ('ng/mL', 400.64, None),
+    'tsh': ('mIU/L', None, None),
+    'ferritin': ('ng/mL', None, None),
+    'folate': ('ng/mL', 441.4, None),
+    'vitamin b12': ('pg/mL', 1355.37, None),
+    'pth': ('pg/mL', 9425.0, None),
+    'troponin': ('ng/L', None, None),
+    'crp': ('mg/L', None, None),
+    'alt': ('U/L', None, None),
+    'ast': ('U/L', None, None),
+    'alp': ('U/L', None, None),
+    'ggt': ('U/L', None, None),
+    'wbc': ('10^9/L', None, None),
+    'platelets': ('10^9/L', None, None),
+    'rbc': ('10^12/L', None, None),
+}
+
+ANALYTE_ALIASES = {
+    'blood sugar': 'glucose',
+    'fasting glucose': 'glucose',
+    'total cholesterol': 'cholesterol',
+    'ldl': 'cholesterol',
+    'ldl cholesterol': 'cholesterol',
+    'hdl': 'cholesterol',
+    'hdl cholesterol': 'cholesterol',
+    'bun': 'urea nitrogen',
+    'blood urea nitrogen': 'urea nitrogen',
+    'total bilirubin': 'bilirubin',
+    'phosphorus': 'phosphate',
+    'haemoglobin': 'hemoglobin',
+    'hb': 'hemoglobin',
+    'hgb': 'hemoglobin',
+    '25-oh vitamin d': 'vitamin d',
+    'white blood cells': 'wbc',
+    'plt': 'platelets',
+    'red blood cells': 'rbc',
+    'b12': 'vitamin b12',
+    'cobalamin': 'vitamin b12',
+    'folic acid': 'folate',
+    'parathyroid hormone': 'pth',
+    'intact pth': 'pth',
+    'troponin i': 'troponin',
+    'troponin t': 'troponin',
+    'hs-troponin': 'troponin',
+    'c-reactive protein': 'crp',
+    'sgpt': 'alt',
+    'sgot': 'ast',
+    'alkaline phosphatase': 'alp',
+}
+
+
+def normalize_unit(unit):
+    """Comparable spelling of a unit: 'µmol/L' and 'umol/l' are the same"""
+    key = (unit or '').strip().casefold().replace(' ', '')
+    key = key.replace('µ', 'u').replace('μ', 'u').replace('mcg', 'ug')
+    key = key.replace('x10', '10').replace('10*', '10^').replace('10e', '10^')
+    key = key.replace('mm3', 'ul').replace('/cumm', '/ul')
+    return UNIT_ALIASES.get(key, key)
+
+
+def _analyte(parameter_name):
+    key = (parameter_name or '').strip().casefold()
+    key = ANALYTE_ALIASES.get(key, key)
+    return ANALYTES.get(key)
+
+
+def _dimension(unit_key):
+    for name, units in DIMENSIONS.items():
+        if unit_key in units:
+            return name, units[unit_key]
+    return None, None
+
+
+def _molar_scale(unit_key, charge):
+    """mol/L per unit for molar units, counting mEq/L for charged analytes"""
+    if unit_key == 'meq/l' and charge:
+        return 1e-3 / charge
+    return DIMENSIONS['molar'].get(unit_key)
+
+
+@lru_cache(maxsize=4096)
+def conversion_factor(parameter_name, from_unit, to_unit):
+    """
+    Factor converting a parameter's values from one unit to another
+    Returns None if the units cannot be converted
+    """
+    source, target = normalize_unit(from_unit), normalize_unit(to_unit)
+    if source == target:
+        return 1.0
+
+    source_dimension, source_scale = _dimension(source)
+    target_dimension, target_scale = _dimension(target)
+    if source_dimension and source_dimension == target_dimension:
+        return source_scale / target_scale
+
+    # Mass and molar concentrations convert through the molar mass
+    analyte = _analyte(parameter_name)
+    if analyte is None or analyte[1] is None:
+        return None
+    _, molar_mass, charge = analyte
+    mass = DIMENSIONS['mass']
+    if source in mass and _molar_scale(target, charge):
+        return mass[source] / molar_mass / _molar_scale(target, charge)
+    if _molar_scale(source, charge) and target in mass:
+        return _molar_scale(source, charge) * molar_mass / mass[target]
+    if _molar_scale(source, charge) and _molar_scale(target, charge):
+        return _molar_scale(source, charge) / _molar_scale(target, charge)
+    return None
+
+
+@lru_cache(maxsize=4096)
+def canonical_unit(parameter_name, unit):
+    """
+    (canonical unit, factor) for a parameter reported in a unit
+    Known analytes use their conventional unit; other parameters and
+    unconvertible units are kept as they are
+    """
+    analyte = _analyte(parameter_name)
+    if analyte is not None:
+        factor = conversion_factor(parameter_name, unit, analyte[0])
+        if factor is not None:
+            return analyte[0], factor
+
+    return (unit or '').strip(), 1.0
+
+
+def to_canonical(parameter_names, units, values):
+    """
+    Convert arrays of results to their canonical units in one multiply
+    Returns (canonical units list, canonical values array)
+    """
+    resolved = [canonical_unit(name, unit) for name, unit in zip(parameter_names, units)]
+    factors = np.array([factor for _, factor in resolved], dtype=float)
+    values = np.asarray([float(v) for v in values], dtype=float)
+    return [unit for unit, _ in resolved], values * factors
+
+
+def normalize_parameters(parameters):
+    """Set canonical_value and canonical_unit on LabTestParameter objects"""
+    if not parameters:
+        return
+    units, values = to_canonical(
+        [p.parameter_name for p in parameters],
+        [p.unit for p in parameters],
+        [p.value for p in parameters],
+    )
+    for parameter, unit, value in zip(parameters, units, values):
+        value = round(float(value), 4)
+        if not abs(value) < CANONICAL_LIMIT:
+            unit, value = (parameter.unit or '').strip(), float(parameter.value)
+        parameter.canonical_unit = unit
+        parameter.canonical_value = value
+
+
+def backfill_canonical_values(parameters):
+    """
+    Fill canonical columns with one UPDATE per distinct (parameter, unit)
+    parameters is a LabTestParameter queryset, also a historical one
+    """
+    from django.db.models import DecimalField, ExpressionWrapper, F, Q, Value
+
+    pairs = parameters.order_by().values_list('parameter_name', 'unit').distinct()
+    for name, unit in list(pairs):
+        target, factor = canonical_unit(name, unit)
+        rows = parameters.filter(parameter_name=name, unit=unit)
+        value = F('value')
+        if factor != 1.0:
+            value = ExpressionWrapper(
+                F('value') * Value(Decimal(repr(factor))),
+                output_field=DecimalField(max_digits=14, decimal_places=4)
+            )
+        if factor > 1.0:
+            limit = Decimal(repr(CANONICAL_LIMIT / factor))
+            rows.filter(Q(value__gte=limit) | Q(value__lte=-limit)).update(
+                canonical_value=F('value'),
+                canonical_unit=(unit or '').strip()
+            )
+            rows = rows.filter(value__lt=limit, value__gt=-limit)
+        rows.update(
+            canonical_value=value,
+            canonical_unit=target
+        )
@@ -8,12 +8,19 @@ urlpatterns = [
     # Lab Report CRUD
     path('', views.lab_report_list, name='lab-report-list'),
     path('create/', views.create_lab_report, name='create-lab-report'),
+    path('bulk/', views.bulk_create_lab_reports, name='bulk-create-lab-reports'),
     path('<int:report_id>/', views.lab_report_detail, name='lab-report-detail'),
+    path('<int:report_id>/file/', views.lab_report_file, name='lab-report-file'),
+    path('<int:report_id>/file/<str:size>/', views.lab_report_file_preview, name='lab-report-file-preview'),
     path('patient/<int:patient_id>/', views.reports_by_patient, name='reports-by-patient'),
     
     # Visualization endpoints
     path('visualize/report/<int:report_id>/', views.visualize_report, name='visualize-report'),
     path('visualize/trend/<int:patient_id>/', views.visualize_parameter_trend, name='visualize-parameter-trend'),
+    path('visualize/report/<int:report_id>/image/', views.report_image, name='report-image'),
+    path('visualize/trend/<int:patient_id>/image/', views.parameter_trend_image, name='parameter-trend-image'),
+    path('visualize/trend/<int:patient_id>/data/', views.parameter_trend_data, name='parameter-trend-data'),
+    path('visualize/multi/<int:patient_id>/', views.visualize_multiple_parameters, name='visualize-multiple-parameters'),
     
     # Statistics and analysis
     path('statistics/<int:patient_id>/', views.parameter_statistics, name='parameter-statistics'),
@@ -2,24 +2,45 @@
 Views for Lab Report Management and Visualization
 """
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+import base64
+import codecs
+from datetime import date
 
-from .models import LabReport, LabTestParameter
+from .models import LabReport, LabTestParameter, PatientParameterSummary
 from .serializers import (
     LabReportSerializer,
     LabReportCreateSerializer,
-    LabTestParameterSerializer
+    LabTestParameterSerializer,
+    LabReportVisualizationSerializer,
+    PatientParameterSummarySerializer
 )
-from .visualization import (
-    generate_parameter_trend_chart,
-    generate_multiple_parameters_chart,
-    generate_latest_report_chart,
-    get_parameter_statistics
+from .visualization import get_parameter_statistics, get_parameter_series
+from .downsampling import lttb_indices
+from .ingest import ingest_lab_reports, read_csv, read_jsonl
+from .cache import (
+    IMAGE_CONTENT_TYPES,
+    cached_parameter_trend_chart,
+    cached_multiple_parameters_chart,
+    cached_report_chart,
+    chart_etag,
+    parameter_trend_version,
+    report_version
 )
+from .rendering import ChartRenderError
+from .renderers import ChartImageRenderer
+from doctors.access import assigned_patient_ids, assigned_patients_query, is_assigned_patient
 from doctors.permissions import IsDoctor
+from .previews import PREVIEW_SIZES, preview_name
+from healthcare_backend.downloads import FileDownloadRenderer, download_name, serve_file
+from healthcare_backend.pagination import KeysetPagination
+from healthcare_backend.prefetch import with_relations
 
 
 
@@ -33,12 +54,7 @@ def lab_report_list(request):
         reports = LabReport.objects.filter(patient=request.user)
     elif request.user.role == 'DOCTOR':
         # Get reports for assigned patients
-        from doctors.models import DoctorPatientAssignment
-        assigned_patients = DoctorPatientAssignment.objects.filter(
-            doctor=request.user,
-            is_active=True
-        ).values_list('patient_id', flat=True)
-        reports = LabReport.objects.filter(patient_id__in=assigned_patients)
+        reports = LabReport.objects.filter(patient_id__in=assigned_patients_query(request.user))
     else:
         return Response({
             'error': 'Invalid user role'
@@ -57,8 +73,10 @@ def lab_report_list(request):
     if date_to:
         reports = reports.filter(test_date__lte=date_to)
     
-    serializer = LabReportSerializer(reports, many=True)
-    return Response(serializer.data)
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(with_relations(reports, LabReportSerializer), request)
+    serializer = LabReportSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['POST'])
@@ -68,19 +86,13 @@ def create_lab_report(request):
     Create a new lab report (doctors only)
     """
     # Verify doctor is assigned to patient
-    from doctors.models import DoctorPatientAssignment
-    
     patient_id = request.data.get('patient')
     if not patient_id:
         return Response({
             'error': 'patient is required'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    is_assigned = DoctorPatientAssignment.objects.filter(
-        doctor=request.user,
-        patient_id=patient_id,
-        is_active=True
-    ).exists()
+    is_assigned = is_assigned_patient(request, patient_id)
     
     if not is_assigned:
         return Response({
@@ -94,6 +106,38 @@ def create_lab_report(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsDoctor])
+def bulk_create_lab_reports(request):
+    """
+    Create many lab reports at once (doctors only)
+    Accepts a JSON list of reports, or a JSON lines / CSV upload in 'file'
+    Invalid rows are reported without rejecting the rest of the batch
+    """
+    upload = request.FILES.get('file')
+    if upload:
+        lines = codecs.iterdecode(upload, 'utf-8-sig')
+        records = read_csv(lines) if upload.name.lower().endswith('.csv') else read_jsonl(lines)
+    else:
+        reports = request.data
+        if isinstance(reports, dict):
+            reports = reports.get('reports')
+        if not isinstance(reports, list):
+            return Response({
+                'error': 'Send a list of reports or upload a file'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        records = enumerate(reports, start=1)
+    
+    result = ingest_lab_reports(
+        records,
+        doctor=request.user,
+        allowed_patient_ids=assigned_patient_ids(request)
+    )
+    
+    response_status = status.HTTP_201_CREATED if result.created_reports else status.HTTP_400_BAD_REQUEST
+    return Response(result.as_dict(), status=response_status)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def lab_report_detail(request, report_id):
@@ -109,12 +153,7 @@ def lab_report_detail(request, report_id):
         }, status=status.HTTP_403_FORBIDDEN)
     
     if request.user.role == 'DOCTOR':
-        from doctors.models import DoctorPatientAssignment
-        is_assigned = DoctorPatientAssignment.objects.filter(
-            doctor=request.user,
-            patient=report.patient,
-            is_active=True
-        ).exists()
+        is_assigned = is_assigned_patient(request, report.patient_id)
         
         if not is_assigned:
             return Response({
@@ -125,6 +164,88 @@ def lab_report_detail(request, report_id):
     return Response(serializer.data)
 
 
+@api_view(['GET'])
+@renderer_classes([JSONRenderer, FileDownloadRenderer])
+@permission_classes([IsAuthenticated])
+def lab_report_file(request, report_id):
+    """
+    Download the report file, streamed in chunks with Range support
+    """
+    report = get_object_or_404(LabReport, id=report_id)
+    
+    # Check permissions
+    if request.user.role == 'PATIENT' and report.patient_id != request.user.id:
+        return Response({
+            'error': 'Access denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    if request.user.role == 'DOCTOR':
+        is_assigned = is_assigned_patient(request, report.patient_id)
+        
+        if not is_assigned:
+            return Response({
+                'error': 'Access denied'
+            }, status=status.HTTP_403_FORBIDDEN)
+    
+    response = None
+    if report.report_file:
+        filename = download_name(report.report_file, f"{report.test_name} {report.test_date:%Y-%m-%d}")
+        response = serve_file(request, report.report_file.storage, report.report_file.name, filename)
+    
+    if response is None:
+        return Response({
+            'error': 'This report has no file'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return response
+
+
+@api_view(['GET'])
+@renderer_classes([JSONRenderer, FileDownloadRenderer])
+@permission_classes([IsAuthenticated])
+def lab_report_file_preview(request, report_id, size):
+    """
+    Thumbnail or preview of the report file as a WebP image
+    """
+    report = get_object_or_404(LabReport, id=report_id)
+    
+    # Check permissions
+    if request.user.role == 'PATIENT' and report.patient_id != request.user.id:
+        return Response({
+            'error': 'Access denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    if request.user.role == 'DOCTOR':
+        is_assigned = is_assigned_patient(request, report.patient_id)
+        
+        if not is_assigned:
+            return Response({
+                'error': 'Access denied'
+            }, status=status.HTTP_403_FORBIDDEN)
+    
+    if size not in PREVIEW_SIZES:
+        return Response({
+            'error': 'size must be one of: ' + ', '.join(PREVIEW_SIZES)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    response = None
+    if report.report_file:
+        response = serve_file(
+            request,
+            report.report_file.storage,
+            preview_name(report.report_file.name, size),
+            f"{report.test_name} {report.test_date:%Y-%m-%d} {size}.webp",
+            as_attachment=False
+        )
+    
+    if response is None:
+        return Response({
+            'error': 'No preview available for this report'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def reports_by_patient(request, patient_id):
@@ -138,12 +259,7 @@ def reports_by_patient(request, patient_id):
         }, status=status.HTTP_403_FORBIDDEN)
     
     if request.user.role == 'DOCTOR':
-        from doctors.models import DoctorPatientAssignment
-        is_assigned = DoctorPatientAssignment.objects.filter(
-            doctor=request.user,
-            patient_id=patient_id,
-            is_active=True
-        ).exists()
+        is_assigned = is_assigned_patient(request, patient_id)
         
         if not is_assigned:
             return Response({
@@ -151,8 +267,10 @@ def reports_by_patient(request, patient_id):
             }, status=status.HTTP_403_FORBIDDEN)
     
     reports = LabReport.objects.filter(patient_id=patient_id)
-    serializer = LabReportSerializer(reports, many=True)
-    return Response(serializer.data)
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(with_relations(reports, LabReportSerializer), request)
+    serializer = LabReportSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['GET'])
@@ -168,12 +286,7 @@ def visualize_parameter_trend(request, patient_id):
         }, status=status.HTTP_403_FORBIDDEN)
     
     if request.user.role == 'DOCTOR':
-        from doctors.models import DoctorPatientAssignment
-        is_assigned = DoctorPatientAssignment.objects.filter(
-            doctor=request.user,
-            patient_id=patient_id,
-            is_active=True
-        ).exists()
+        is_assigned = is_assigned_patient(request, patient_id)
         
         if not is_assigned:
             return Response({
@@ -186,7 +299,12 @@ def visualize_parameter_trend(request, patient_id):
             'error': 'parameter query parameter is required'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    chart_image = generate_parameter_trend_chart(patient_id, parameter_name)
+    try:
+        chart_image = cached_parameter_trend_chart(patient_id, parameter_name)
+    except ChartRenderError as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
     
     if not chart_image:
         return Response({
@@ -195,7 +313,72 @@ def visualize_parameter_trend(request, patient_id):
     
     return Response({
         'parameter': parameter_name,
-        'chart': f'data:image/png;base64,{chart_image}'
+        'chart': f'data:image/png;base64,{base64.b64encode(chart_image).decode()}'
+    })
+
+
+MAX_CHART_PANELS = 16
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def visualize_multiple_parameters(request, patient_id):
+    """
+    Generate one chart with a panel per parameter
+    Query params: parameter (repeatable), date_from, date_to
+    """
+    # Check permissions
+    if request.user.role == 'PATIENT' and request.user.id != patient_id:
+        return Response({
+            'error': 'Access denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    if request.user.role == 'DOCTOR':
+        is_assigned = is_assigned_patient(request, patient_id)
+        
+        if not is_assigned:
+            return Response({
+                'error': 'Access denied'
+            }, status=status.HTTP_403_FORBIDDEN)
+    
+    parameter_names = list(dict.fromkeys(request.query_params.getlist('parameter')))
+    if not parameter_names:
+        return Response({
+            'error': 'parameter query parameter is required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if len(parameter_names) > MAX_CHART_PANELS:
+        return Response({
+            'error': f'At most {MAX_CHART_PANELS} parameters can be charted together'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        date_from, date_to = _date_range(request)
+    except ValueError:
+        return Response({
+            'error': DATE_RANGE_ERROR
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        chart_image = cached_multiple_parameters_chart(
+            patient_id,
+            parameter_names,
+            date_from=date_from,
+            date_to=date_to
+        )
+    except ChartRenderError as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    
+    if not chart_image:
+        return Response({
+            'error': 'No data available for these parameters'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'parameters': parameter_names,
+        'chart': f'data:image/png;base64,{base64.b64encode(chart_image).decode()}'
     })
 
 
@@ -214,19 +397,19 @@ def visualize_report(request, report_id):
         }, status=status.HTTP_403_FORBIDDEN)
     
     if request.user.role == 'DOCTOR':
-        from doctors.models import DoctorPatientAssignment
-        is_assigned = DoctorPatientAssignment.objects.filter(
-            doctor=request.user,
-            patient=report.patient,
-            is_active=True
-        ).exists()
+        is_assigned = is_assigned_patient(request, report.patient_id)
         
         if not is_assigned:
             return Response({
                 'error': 'Access denied'
             }, status=status.HTTP_403_FORBIDDEN)
     
-    chart_image = generate_latest_report_chart(report_id)
+    try:
+        chart_image = cached_report_chart(report)
+    except ChartRenderError as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
     
     if not chart_image:
         return Response({
@@ -236,7 +419,207 @@ def visualize_report(request, report_id):
     return Response({
         'report_id': report_id,
         'test_name': report.test_name,
-        'chart': f'data:image/png;base64,{chart_image}'
+        'chart': f'data:image/png;base64,{base64.b64encode(chart_image).decode()}'
+    })
+
+
+def _chart_image_response(request, etag, image_format, render):
+    """
+    Binary chart response with a strong ETag
+    Returns 304 for a matching If-None-Match without rendering
+    """
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is None:
+        try:
+            chart_image = render()
+        except ChartRenderError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+        if not chart_image:
+            return Response({
+                'error': 'No data available for this chart'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        response = HttpResponse(chart_image, content_type=IMAGE_CONTENT_TYPES[image_format])
+    else:
+        response = not_modified
+    
+    response['ETag'] = etag
+    # Lab charts are patient data: browsers may keep them but must revalidate
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _image_format(request):
+    image_format = request.query_params.get('image_format', 'png').lower()
+    return image_format if image_format in IMAGE_CONTENT_TYPES else None
+
+
+@api_view(['GET'])
+@renderer_classes([JSONRenderer, ChartImageRenderer])
+@permission_classes([IsAuthenticated])
+def parameter_trend_image(request, patient_id):
+    """
+    Trend chart for a parameter as an image (png, svg or webp)
+    """
+    # Check permissions
+    if request.user.role == 'PATIENT' and request.user.id != patient_id:
+        return Response({
+            'error': 'Access denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    if request.user.role == 'DOCTOR':
+        is_assigned = is_assigned_patient(request, patient_id)
+        
+        if not is_assigned:
+            return Response({
+                'error': 'Access denied'
+            }, status=status.HTTP_403_FORBIDDEN)
+    
+    parameter_name = request.query_params.get('parameter')
+    if not parameter_name:
+        return Response({
+            'error': 'parameter query parameter is required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    image_format = _image_format(request)
+    if not image_format:
+        return Response({
+            'error': 'image_format must be one of: ' + ', '.join(IMAGE_CONTENT_TYPES)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    version = parameter_trend_version(patient_id, parameter_name)
+    if version is None:
+        return Response({
+            'error': 'No data available for this parameter'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return _chart_image_response(
+        request,
+        chart_etag('trend', patient_id, parameter_name, version, image_format),
+        image_format,
+        lambda: cached_parameter_trend_chart(patient_id, parameter_name, image_format, version)
+    )
+
+
+@api_view(['GET'])
+@renderer_classes([JSONRenderer, ChartImageRenderer])
+@permission_classes([IsAuthenticated])
+def report_image(request, report_id):
+    """
+    Bar chart for a lab report as an image (png, svg or webp)
+    """
+    report = get_object_or_404(LabReport, id=report_id)
+    
+    # Check permissions
+    if request.user.role == 'PATIENT' and report.patient_id != request.user.id:
+        return Response({
+            'error': 'Access denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    if request.user.role == 'DOCTOR':
+        is_assigned = is_assigned_patient(request, report.patient_id)
+        
+        if not is_assigned:
+            return Response({
+                'error': 'Access denied'
+            }, status=status.HTTP_403_FORBIDDEN)
+    
+    image_format = _image_format(request)
+    if not image_format:
+        return Response({
+            'error': 'image_format must be one of: ' + ', '.join(IMAGE_CONTENT_TYPES)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    return _chart_image_response(
+        request,
+        chart_etag('report', report.patient_id, report.id, report_version(report), image_format),
+        image_format,
+        lambda: cached_report_chart(report, image_format)
+    )
+
+
+def _date_range(request):
+    """
+    date_from and date_to query params as dates, None when absent
+    Raises ValueError when one is not a YYYY-MM-DD date
+    """
+    return tuple(
+        date.fromisoformat(value) if value else None
+        for value in (request.query_params.get('date_from'), request.query_params.get('date_to'))
+    )
+
+
+DATE_RANGE_ERROR = 'date_from and date_to must be dates as YYYY-MM-DD'
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def parameter_trend_data(request, patient_id):
+    """
+    Raw time series for one or more parameters, for client-side charts
+    Query params: parameter (repeatable), max_points, date_from, date_to
+    """
+    # Check permissions
+    if request.user.role == 'PATIENT' and request.user.id != patient_id:
+        return Response({
+            'error': 'Access denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    if request.user.role == 'DOCTOR':
+        is_assigned = is_assigned_patient(request, patient_id)
+        
+        if not is_assigned:
+            return Response({
+                'error': 'Access denied'
+            }, status=status.HTTP_403_FORBIDDEN)
+    
+    parameter_names = list(dict.fromkeys(request.query_params.getlist('parameter')))
+    if not parameter_names:
+        return Response({
+            'error': 'parameter query parameter is required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    max_points = request.query_params.get('max_points')
+    if max_points is not None:
+        try:
+            max_points = int(max_points)
+        except ValueError:
+            max_points = 0
+        if max_points < 3:
+            return Response({
+                'error': 'max_points must be an integer of at least 3'
+            }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        date_from, date_to = _date_range(request)
+    except ValueError:
+        return Response({
+            'error': DATE_RANGE_ERROR
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    series = get_parameter_series(
+        patient_id,
+        parameter_names,
+        date_from=date_from,
+        date_to=date_to
+    )
+    
+    for item in series:
+        item['total_points'] = len(item['values'])
+        if max_points and item['total_points'] > max_points:
+            keep = lttb_indices(
+                [d.toordinal() for d in item['dates']], item['values'], max_points
+            )
+            item['dates'] = [item['dates'][i] for i in keep]
+            item['values'] = [item['values'][i] for i in keep]
+    
+    serializer = LabReportVisualizationSerializer(series, many=True)
+    return Response({
+        'patient_id': patient_id,
+        'series': serializer.data
     })
 
 
@@ -253,12 +636,7 @@ def parameter_statistics(request, patient_id):
         }, status=status.HTTP_403_FORBIDDEN)
     
     if request.user.role == 'DOCTOR':
-        from doctors.models import DoctorPatientAssignment
-        is_assigned = DoctorPatientAssignment.objects.filter(
-            doctor=request.user,
-            patient_id=patient_id,
-            is_active=True
-        ).exists()
+        is_assigned = is_assigned_patient(request, patient_id)
         
         if not is_assigned:
             return Response({
@@ -286,6 +664,7 @@ def parameter_statistics(request, patient_id):
 def available_parameters(request, patient_id):
     """
     Get list of all available parameters for a patient
+    Served from the maintained parameter catalog
     """
     # Check permissions
     if request.user.role == 'PATIENT' and request.user.id != patient_id:
@@ -294,23 +673,18 @@ def available_parameters(request, patient_id):
         }, status=status.HTTP_403_FORBIDDEN)
     
     if request.user.role == 'DOCTOR':
-        from doctors.models import DoctorPatientAssignment
-        is_assigned = DoctorPatientAssignment.objects.filter(
-            doctor=request.user,
-            patient_id=patient_id,
-            is_active=True
-        ).exists()
+        is_assigned = is_assigned_patient(request, patient_id)
         
         if not is_assigned:
             return Response({
                 'error': 'Access denied'
             }, status=status.HTTP_403_FORBIDDEN)
     
-    parameters = LabTestParameter.objects.filter(
-        lab_report__patient_id=patient_id
-    ).values_list('parameter_name', flat=True).distinct()
+    summaries = PatientParameterSummary.objects.filter(patient_id=patient_id)
+    serializer = PatientParameterSummarySerializer(summaries, many=True)
     
     return Response({
         'patient_id': patient_id,
-        'parameters': list(parameters)
+        'parameters': [summary['parameter_name'] for summary in serializer.data],
+        'summary': serializer.data
     })
\ No newline at end of file
@@ -1,65 +1,123 @@
 """
 Visualization Utilities for Lab Reports
-Uses Matplotlib to generate charts
+Collects chart data and hands it to the Matplotlib rendering service
 """
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-import io
 import base64
-from datetime import datetime
+from itertools import groupby
+
+import numpy as np
+from django.db.models import Avg, Count, Max, Min, OuterRef, Q, StdDev, Subquery
+
 from .models import LabReport, LabTestParameter
+from .rendering import get_renderer
+from .units import canonical_unit
 
 
-def generate_parameter_trend_chart(patient_id, parameter_name):
+def _encode(image_bytes):
+    return base64.b64encode(image_bytes).decode()
+
+
+def _as_float(value):
+    return float(value) if value is not None else None
+
+
+def _canonical_range(parameter_name, unit, normal_min, normal_max):
+    """A result's normal range converted like its value"""
+    _, factor = canonical_unit(parameter_name, unit)
+    return (
+        float(normal_min) * factor if normal_min is not None else None,
+        float(normal_max) * factor if normal_max is not None else None,
+    )
+
+
+def get_parameter_series(patient_id, parameter_names, date_from=None, date_to=None):
     """
-    Generate a line chart showing parameter trends over time
-    Returns base64 encoded image
+    Time series for several parameters of a patient in a single query
+    Values are in each parameter's canonical unit. Returns a list of dicts
+    ordered like parameter_names; parameters without data are left out
     """
-    # Get all lab reports with this parameter
-    parameters = LabTestParameter.objects.filter(
+    rows = LabTestParameter.objects.filter(
         lab_report__patient_id=patient_id,
-        parameter_name=parameter_name
-    ).select_related('lab_report').order_by('lab_report__test_date')
+        parameter_name__in=parameter_names
+    )
+    if date_from:
+        rows = rows.filter(lab_report__test_date__gte=date_from)
+    if date_to:
+        rows = rows.filter(lab_report__test_date__lte=date_to)
+    
+    rows = rows.order_by('parameter_name', 'lab_report__test_date', 'id').values_list(
+        'parameter_name', 'lab_report__test_date', 'canonical_value', 'canonical_unit',
+        'unit', 'normal_min', 'normal_max'
+    )
+    
+    series = {}
+    for name, group in groupby(rows, key=lambda row: row[0]):
+        # Unit and normal range come from the latest result; results whose
+        # unit could not be converted to the same canonical unit are left out
+        group = list(group)
+        _, _, _, unit, reported_unit, normal_min, normal_max = group[-1]
+        group = [row for row in group if row[3] == unit]
+        normal_min, normal_max = _canonical_range(name, reported_unit, normal_min, normal_max)
+        series[name] = {
+            'parameter_name': name,
+            'unit': unit,
+            'dates': [row[1] for row in group],
+            'values': [float(row[2]) for row in group],
+            'normal_min': normal_min,
+            'normal_max': normal_max,
+        }
+    
+    return [series[name] for name in parameter_names if name in series]
+
+
+def render_parameter_trend_chart(patient_id, parameter_name, image_format='png'):
+    """
+    Render a line chart showing parameter trends over time
+    Returns image bytes in the requested format
+    """
+    series = get_parameter_series(patient_id, [parameter_name])
     
-    if not parameters.exists():
+    if not series:
         return None
     
-    # Extract data
-    dates = [p.lab_report.test_date for p in parameters]
-    values = [float(p.value) for p in parameters]
-    
-    # Get normal range if available
-    normal_min = float(parameters.first().normal_min) if parameters.first().normal_min else None
-    normal_max = float(parameters.first().normal_max) if parameters.first().normal_max else None
-    unit = parameters.first().unit
-    
-    # Create plot
-    plt.figure(figsize=(10, 6))
-    plt.plot(dates, values, marker='o', linewidth=2, markersize=8, label=parameter_name)
-    
-    # Add normal range
-    if normal_min and normal_max:
-        plt.axhline(y=normal_min, color='green', linestyle='--', alpha=0.5, label='Normal Min')
-        plt.axhline(y=normal_max, color='green', linestyle='--', alpha=0.5, label='Normal Max')
-        plt.fill_between(range(len(dates)), normal_min, normal_max, alpha=0.1, color='green')
+    series = series[0]
+    return get_renderer().render(
+        'trend',
+        dates=[d.toordinal() for d in series['dates']],
+        values=series['values'],
+        parameter_name=parameter_name,
+        unit=series['unit'],
+        normal_min=series['normal_min'],
+        normal_max=series['normal_max'],
+        image_format=image_format,
+    )
+
+
+def generate_parameter_trend_chart(patient_id, parameter_name):
+    """
+    Generate a line chart showing parameter trends over time
+    Returns base64 encoded image
+    """
+    image = render_parameter_trend_chart(patient_id, parameter_name)
+    return _encode(image) if image else None
+
+
+def render_multiple_parameters_chart(patient_id, parameter_names, date_from=None,
+                                     date_to=None, image_format='png'):
+    """
+    Render one figure with a panel per parameter
+    All parameters are fetched with a single query
+    Returns image bytes in the requested format
+    """
+    series = get_parameter_series(patient_id, parameter_names, date_from, date_to)
     
-    plt.xlabel('Date', fontsize=12)
-    plt.ylabel(f'{parameter_name} ({unit})', fontsize=12)
-    plt.title(f'{parameter_name} Trend Over Time', fontsize=14, fontweight='bold')
-    plt.legend()
-    plt.grid(True, alpha=0.3)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+    if not series:
+        return None
     
-    # Convert to base64
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-    buffer.seek(0)
-    image_base64 = base64.b64encode(buffer.read()).decode()
-    plt.close()
+    for item in series:
+        item['dates'] = [d.toordinal() for d in item['dates']]
     
-    return image_base64
+    return get_renderer().render('multi_trend', series=series, image_format=image_format)
 
 
 def generate_multiple_parameters_chart(patient_id, parameter_names):
@@ -67,38 +125,29 @@ def generate_multiple_parameters_chart(patient_id, parameter_names):
     Generate chart comparing multiple parameters
     Returns base64 encoded image
     """
-    fig, axes = plt.subplots(len(parameter_names), 1, figsize=(12, 4*len(parameter_names)))
-    
-    if len(parameter_names) == 1:
-        axes = [axes]
-    
-    for idx, param_name in enumerate(parameter_names):
-        parameters = LabTestParameter.objects.filter(
-            lab_report__patient_id=patient_id,
-            parameter_name=param_name
-        ).select_related('lab_report').order_by('lab_report__test_date')
-        
-        if parameters.exists():
-            dates = [p.lab_report.test_date for p in parameters]
-            values = [float(p.value) for p in parameters]
-            unit = parameters.first().unit
-            
-            axes[idx].plot(dates, values, marker='o', linewidth=2, markersize=8)
-            axes[idx].set_ylabel(f'{param_name} ({unit})', fontsize=10)
-            axes[idx].set_title(param_name, fontsize=12, fontweight='bold')
-            axes[idx].grid(True, alpha=0.3)
-            axes[idx].tick_params(axis='x', rotation=45)
-    
-    plt.tight_layout()
+    image = render_multiple_parameters_chart(patient_id, parameter_names)
+    return _encode(image) if image else None
+
+
+def render_latest_report_chart(lab_report_id, image_format='png'):
+    """
+    Render a bar chart for a lab report's parameters
+    Returns image bytes in the requested format
+    """
+    rows = list(LabTestParameter.objects.filter(
+        lab_report_id=lab_report_id
+    ).values_list('parameter_name', 'value', 'is_abnormal'))
     
-    # Convert to base64
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-    buffer.seek(0)
-    image_base64 = base64.b64encode(buffer.read()).decode()
-    plt.close()
+    if not rows:
+        return None
     
-    return image_base64
+    return get_renderer().render(
+        'report',
+        names=[row[0] for row in rows],
+        values=[float(row[1]) for row in rows],
+        abnormal=[row[2] for row in rows],
+        image_format=image_format,
+    )
 
 
 def generate_latest_report_chart(lab_report_id):
@@ -106,64 +155,82 @@ def generate_latest_report_chart(lab_report_id):
     Generate a bar chart for latest lab report parameters
     Returns base64 encoded image
     """
-    parameters = LabTestParameter.objects.filter(lab_report_id=lab_report_id)
-    
-    if not parameters.exists():
-        return None
-    
-    param_names = [p.parameter_name for p in parameters]
-    values = [float(p.value) for p in parameters]
-    colors = ['red' if p.is_abnormal else 'green' for p in parameters]
-    
-    plt.figure(figsize=(12, 6))
-    bars = plt.bar(param_names, values, color=colors, alpha=0.7)
-    
-    # Add value labels on bars
-    for bar, value in zip(bars, values):
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2., height,
-                f'{value:.2f}',
-                ha='center', va='bottom', fontsize=10)
-    
-    plt.xlabel('Parameters', fontsize=12)
-    plt.ylabel('Values', fontsize=12)
-    plt.title('Lab Test Results', fontsize=14, fontweight='bold')
-    plt.xticks(rotation=45, ha='right')
-    plt.grid(True, alpha=0.3, axis='y')
-    plt.tight_layout()
-    
-    # Convert to base64
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-    buffer.seek(0)
-    image_base64 = base64.b64encode(buffer.read()).decode()
-    plt.close()
-    
-    return image_base64
+    image = render_latest_report_chart(lab_report_id)
+    return _encode(image) if image else None
 
 
 def get_parameter_statistics(patient_id, parameter_name):
     """
     Get statistical analysis of a parameter
+    Runs two queries: database aggregates with a latest-result subquery,
+    then the value history for percentiles and slope computed with NumPy
     """
     parameters = LabTestParameter.objects.filter(
         lab_report__patient_id=patient_id,
         parameter_name=parameter_name
-    ).order_by('lab_report__test_date')
-    
-    if not parameters.exists():
+    )
+    latest = parameters.filter(
+        parameter_name=OuterRef('parameter_name'),
+        canonical_unit=OuterRef('canonical_unit')
+    ).order_by('-lab_report__test_date', '-id')
+    
+    # Values are compared in canonical units. If some results could not be
+    # converted, the unit with the most recent results wins; normal range
+    # comes from the latest result
+    stats = parameters.values('parameter_name', 'canonical_unit').annotate(
+        count=Count('id'),
+        min_value=Min('canonical_value'),
+        max_value=Max('canonical_value'),
+        average=Avg('canonical_value'),
+        std_dev=StdDev('canonical_value'),
+        abnormal_count=Count('id', filter=Q(is_abnormal=True)),
+        first_test_date=Min('lab_report__test_date'),
+        latest_test_date=Max('lab_report__test_date'),
+        latest_value=Subquery(latest.values('canonical_value')[:1]),
+        latest_unit=Subquery(latest.values('unit')[:1]),
+        normal_min=Subquery(latest.values('normal_min')[:1]),
+        normal_max=Subquery(latest.values('normal_max')[:1]),
+    ).order_by('-latest_test_date', '-count').first()
+    
+    if not stats:
         return None
     
-    values = [float(p.value) for p in parameters]
+    normal_min, normal_max = _canonical_range(
+        parameter_name, stats['latest_unit'], stats['normal_min'], stats['normal_max']
+    )
+    history = parameters.filter(canonical_unit=stats['canonical_unit']).order_by().values_list(
+        'lab_report__test_date', 'canonical_value'
+    )
+    dates, values = zip(*history)
+    values = np.array(values, dtype=float)
+    days = np.array([d.toordinal() for d in dates], dtype=float)
+    p5, p25, p50, p75, p95 = np.percentile(values, [5, 25, 50, 75, 95])
+    
+    # Least-squares slope needs at least two distinct test dates
+    slope = None
+    if np.ptp(days) > 0:
+        slope = float(np.polyfit(days, values, 1)[0])
     
     return {
         'parameter_name': parameter_name,
-        'unit': parameters.first().unit,
-        'count': len(values),
-        'latest_value': values[-1],
-        'min_value': min(values),
-        'max_value': max(values),
-        'average': sum(values) / len(values),
-        'normal_min': float(parameters.first().normal_min) if parameters.first().normal_min else None,
-        'normal_max': float(parameters.first().normal_max) if parameters.first().normal_max else None,
-    }
\ No newline at end of file
+        'unit': stats['canonical_unit'],
+        'count': stats['count'],
+        'latest_value': float(stats['latest_value']),
+        'min_value': float(stats['min_value']),
+        'max_value': float(stats['max_value']),
+        'average': float(stats['average']),
+        'normal_min': normal_min,
+        'normal_max': normal_max,
+        'std_dev': _as_float(stats['std_dev']),
+        'percentiles': {
+            'p5': float(p5),
+            'p25': float(p25),
+            'p50': float(p50),
+            'p75': float(p75),
+            'p95': float(p95),
+        },
+        'slope_per_day': slope,
+        'fraction_abnormal': stats['abnormal_count'] / stats['count'],
+        'first_test_date': stats['first_test_date'],
+        'latest_test_date': stats['latest_test_date'],
+    }
@@ -104,4 +104,7 @@ class MedicalHistory(models.Model):
     class Meta:
         verbose_name = "Medical History Entry"
         verbose_name_plural = "Medical History Entries"
-        ordering = ['-date']
\ No newline at end of file
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['patient', 'date'], name='history_patient_date_idx'),
+        ]
\ No newline at end of file
@@ -4,6 +4,8 @@ Implements role-based access control
 """
 from rest_framework import permissions
 
+from doctors.access import is_assigned_patient
+
 class IsDoctor(permissions.BasePermission):
     """
     Permission class to check if user is a doctor
@@ -47,12 +49,7 @@ class IsOwnerOrDoctor(permissions.BasePermission):
         if request.user.role == 'DOCTOR':
             if hasattr(obj, 'patient'):
                 # Check if doctor is assigned to this patient
-                from doctors.models import DoctorPatientAssignment
-                is_assigned = DoctorPatientAssignment.objects.filter(
-                    doctor=request.user,
-                    patient=obj.patient,
-                    is_active=True
-                ).exists()
+                is_assigned = is_assigned_patient(request, obj.patient_id)
                 return is_assigned
         
         return False
@@ -71,12 +68,7 @@ class CanAccessMedicalHistory(permissions.BasePermission):
         
         # Doctor viewing assigned patient's history
         if request.user.role == 'DOCTOR':
-            from doctors.models import DoctorPatientAssignment
-            is_assigned = DoctorPatientAssignment.objects.filter(
-                doctor=request.user,
-                patient=obj.patient,
-                is_active=True
-            ).exists()
+            is_assigned = is_assigned_patient(request, obj.patient_id)
             return is_assigned
         
         return False
@@ -2,6 +2,7 @@
 Serializers for Patient Profile and Medical History
 """
 from rest_framework import serializers
+from healthcare_backend.downloads import ProtectedFileField
 from .models import PatientProfile, MedicalHistory
 from django.contrib.auth import get_user_model
 
@@ -22,6 +23,7 @@ class PatientProfileSerializer(serializers.ModelSerializer):
             'current_medications', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+        select_related = ['user']
     
     def get_user_details(self, obj):
         """Get basic user information"""
@@ -40,6 +42,7 @@ class MedicalHistorySerializer(serializers.ModelSerializer):
     """
     patient_name = serializers.CharField(source='patient.get_full_name', read_only=True)
     doctor_name = serializers.CharField(source='doctor.get_full_name', read_only=True)
+    attachments = ProtectedFileField('medical-history-attachment', required=False, allow_null=True)
     
     class Meta:
         model = MedicalHistory
@@ -49,12 +52,15 @@ class MedicalHistorySerializer(serializers.ModelSerializer):
             'created_at'
         ]
         read_only_fields = ['id', 'created_at']
+        select_related = ['patient', 'doctor']
 
 
 class MedicalHistoryCreateSerializer(serializers.ModelSerializer):
     """
     Serializer for creating medical history entries
     """
+    attachments = ProtectedFileField('medical-history-attachment', required=False, allow_null=True)
+    
     class Meta:
         model = MedicalHistory
         fields = [
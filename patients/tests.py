@@ -1,3 +1,52 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from doctors.models import DoctorPatientAssignment
+from .models import MedicalHistory
+
+User = get_user_model()
+
+
+class ListQueryTests(TestCase):
+    """Each list costs the same number of queries for one row and for many"""
+
+    def setUp(self):
+        self.doctor = User.objects.create_user('doc', password='pw', role='DOCTOR')
+        self.patient = User.objects.create_user('pat', password='pw', role='PATIENT')
+        DoctorPatientAssignment.objects.create(doctor=self.doctor, patient=self.patient)
+        self.client = APIClient()
+        self.rows = 0
+
+    def seed(self, count):
+        for _ in range(self.rows, count):
+            MedicalHistory.objects.create(
+                patient=self.patient,
+                doctor=self.doctor,
+                entry_type='APPOINTMENT',
+                title='Checkup',
+                description='',
+                date=timezone.now()
+            )
+        self.rows = count
+
+    def assertListQueries(self, url, user, expected):
+        self.client.force_authenticate(user)
+        for count in (1, 5):
+            self.seed(count)
+            with self.assertNumQueries(expected):
+                response = self.client.get(url, {'page_size': count})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), count)
+
+    def test_patient_list(self):
+        self.assertListQueries(reverse('medical-history-list'), self.patient, 1)
+
+    def test_doctor_list(self):
+        self.assertListQueries(reverse('medical-history-list'), self.doctor, 1)
+
+    def test_by_patient(self):
+        url = reverse('medical-history-by-patient', args=[self.patient.id])
+        self.assertListQueries(url, self.doctor, 2)
@@ -14,5 +14,6 @@ urlpatterns = [
     path('medical-history/', views.medical_history_list, name='medical-history-list'),
     path('medical-history/create/', views.create_medical_history, name='create-medical-history'),
     path('medical-history/<int:history_id>/', views.medical_history_detail, name='medical-history-detail'),
+    path('medical-history/<int:history_id>/attachment/', views.medical_history_attachment, name='medical-history-attachment'),
     path('medical-history/patient/<int:patient_id>/', views.medical_history_by_patient, name='medical-history-by-patient'),
 ]
\ No newline at end of file
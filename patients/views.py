@@ -2,9 +2,10 @@
 Views for Patient Profile and Medical History
 """
 from rest_framework import status, generics
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from django.shortcuts import get_object_or_404
 
 from .models import PatientProfile, MedicalHistory
@@ -14,6 +15,10 @@ from .serializers import (
     MedicalHistoryCreateSerializer
 )
 from .permissions import IsPatient, IsDoctor, CanAccessMedicalHistory
+from doctors.access import assigned_patients_query, is_assigned_patient
+from healthcare_backend.downloads import FileDownloadRenderer, download_name, serve_file
+from healthcare_backend.pagination import KeysetPagination
+from healthcare_backend.prefetch import with_relations
 
 
 @api_view(['GET', 'POST'])
@@ -74,12 +79,7 @@ def patient_profile_by_id(request, patient_id):
     """
     if request.user.role == 'DOCTOR':
         # Check if patient is assigned to this doctor
-        from doctors.models import DoctorPatientAssignment
-        is_assigned = DoctorPatientAssignment.objects.filter(
-            doctor=request.user,
-            patient_id=patient_id,
-            is_active=True
-        ).exists()
+        is_assigned = is_assigned_patient(request, patient_id)
         
         if not is_assigned:
             return Response({
@@ -107,19 +107,16 @@ def medical_history_list(request):
         history = MedicalHistory.objects.filter(patient=request.user)
     elif request.user.role == 'DOCTOR':
         # Doctors see history of assigned patients
-        from doctors.models import DoctorPatientAssignment
-        assigned_patients = DoctorPatientAssignment.objects.filter(
-            doctor=request.user,
-            is_active=True
-        ).values_list('patient_id', flat=True)
-        history = MedicalHistory.objects.filter(patient_id__in=assigned_patients)
+        history = MedicalHistory.objects.filter(patient_id__in=assigned_patients_query(request.user))
     else:
         return Response({
             'error': 'Invalid user role'
         }, status=status.HTTP_403_FORBIDDEN)
     
-    serializer = MedicalHistorySerializer(history, many=True)
-    return Response(serializer.data)
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(with_relations(history, MedicalHistorySerializer), request)
+    serializer = MedicalHistorySerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['GET'])
@@ -135,12 +132,7 @@ def medical_history_by_patient(request, patient_id):
         }, status=status.HTTP_403_FORBIDDEN)
     
     if request.user.role == 'DOCTOR':
-        from doctors.models import DoctorPatientAssignment
-        is_assigned = DoctorPatientAssignment.objects.filter(
-            doctor=request.user,
-            patient_id=patient_id,
-            is_active=True
-        ).exists()
+        is_assigned = is_assigned_patient(request, patient_id)
         
         if not is_assigned:
             return Response({
@@ -148,8 +140,10 @@ def medical_history_by_patient(request, patient_id):
             }, status=status.HTTP_403_FORBIDDEN)
     
     history = MedicalHistory.objects.filter(patient_id=patient_id)
-    serializer = MedicalHistorySerializer(history, many=True)
-    return Response(serializer.data)
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(with_relations(history, MedicalHistorySerializer), request)
+    serializer = MedicalHistorySerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['POST'])
@@ -161,13 +155,8 @@ def create_medical_history(request):
     serializer = MedicalHistoryCreateSerializer(data=request.data)
     if serializer.is_valid():
         # Verify doctor is assigned to patient
-        from doctors.models import DoctorPatientAssignment
         patient_id = serializer.validated_data['patient'].id
-        is_assigned = DoctorPatientAssignment.objects.filter(
-            doctor=request.user,
-            patient_id=patient_id,
-            is_active=True
-        ).exists()
+        is_assigned = is_assigned_patient(request, patient_id)
         
         if not is_assigned:
             return Response({
@@ -195,12 +184,7 @@ def medical_history_detail(request, history_id):
         }, status=status.HTTP_403_FORBIDDEN)
     
     if request.user.role == 'DOCTOR':
-        from doctors.models import DoctorPatientAssignment
-        is_assigned = DoctorPatientAssignment.objects.filter(
-            doctor=request.user,
-            patient=history.patient,
-            is_active=True
-        ).exists()
+        is_assigned = is_assigned_patient(request, history.patient_id)
         
         if not is_assigned:
             return Response({
@@ -208,4 +192,40 @@ def medical_history_detail(request, history_id):
             }, status=status.HTTP_403_FORBIDDEN)
     
     serializer = MedicalHistorySerializer(history)
-    return Response(serializer.data)
\ No newline at end of file
+    return Response(serializer.data)
+
+
+@api_view(['GET'])
+@renderer_classes([JSONRenderer, FileDownloadRenderer])
+@permission_classes([IsAuthenticated])
+def medical_history_attachment(request, history_id):
+    """
+    Download a medical history attachment, streamed in chunks with Range support
+    """
+    history = get_object_or_404(MedicalHistory, id=history_id)
+    
+    # Check permissions
+    if request.user.role == 'PATIENT' and history.patient_id != request.user.id:
+        return Response({
+            'error': 'Access denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    if request.user.role == 'DOCTOR':
+        is_assigned = is_assigned_patient(request, history.patient_id)
+        
+        if not is_assigned:
+            return Response({
+                'error': 'Access denied'
+            }, status=status.HTTP_403_FORBIDDEN)
+    
+    response = None
+    if history.attachments:
+        filename = download_name(history.attachments, f"{history.title} {history.date:%Y-%m-%d}")
+        response = serve_file(request, history.attachments.storage, history.attachments.name, filename)
+    
+    if response is None:
+        return Response({
+            'error': 'This entry has no attachment'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return response
@@ -38,6 +38,10 @@ class Prescription(models.Model):
         verbose_name = "Prescription"
         verbose_name_plural = "Prescriptions"
         ordering = ['-prescription_date']
+        indexes = [
+            models.Index(fields=['patient', 'prescription_date'], name='rx_patient_date_idx'),
+            models.Index(fields=['doctor', 'prescription_date'], name='rx_doctor_date_idx'),
+        ]
 
 
 class Medicine(models.Model):
@@ -34,6 +34,7 @@ class PrescriptionSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'prescription_date', 'created_at', 'updated_at']
+        select_related = ['patient', 'doctor']
 
 
 class PrescriptionCreateSerializer(serializers.ModelSerializer):
@@ -69,4 +70,5 @@ class MedicineReminderSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'medicine_name', 'dosage', 'frequency', 'instructions',
             'reminder_times', 'prescription_diagnosis'
-        ]
\ No newline at end of file
+        ]
+        select_related = ['prescription']
\ No newline at end of file
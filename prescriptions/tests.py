@@ -1,3 +1,58 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from doctors.models import DoctorPatientAssignment
+from .models import Medicine, Prescription
+
+User = get_user_model()
+
+
+class ListQueryTests(TestCase):
+    """Each list costs the same number of queries for one row and for many"""
+
+    def setUp(self):
+        self.doctor = User.objects.create_user('doc', password='pw', role='DOCTOR')
+        self.patient = User.objects.create_user('pat', password='pw', role='PATIENT')
+        DoctorPatientAssignment.objects.create(doctor=self.doctor, patient=self.patient)
+        self.client = APIClient()
+        self.rows = 0
+
+    def seed(self, count):
+        for _ in range(self.rows, count):
+            prescription = Prescription.objects.create(
+                patient=self.patient,
+                doctor=self.doctor,
+                diagnosis='Flu'
+            )
+            Medicine.objects.bulk_create([
+                Medicine(prescription=prescription, medicine_name=f'Medicine {n}',
+                         dosage='500mg', frequency='ONCE_DAILY', duration_days=30)
+                for n in range(2)
+            ])
+        self.rows = count
+
+    def assertListQueries(self, url, user, expected, per_row=1):
+        self.client.force_authenticate(user)
+        for count in (1, 5):
+            self.seed(count)
+            with self.assertNumQueries(expected):
+                response = self.client.get(url, {'page_size': count})
+            self.assertEqual(response.status_code, 200)
+            rows = response.data if isinstance(response.data, list) else response.data['results']
+            self.assertEqual(len(rows), count * per_row)
+
+    def test_patient_list(self):
+        self.assertListQueries(reverse('prescription-list'), self.patient, 2)
+
+    def test_doctor_list(self):
+        self.assertListQueries(reverse('prescription-list'), self.doctor, 2)
+
+    def test_by_patient(self):
+        url = reverse('prescriptions-by-patient', args=[self.patient.id])
+        self.assertListQueries(url, self.doctor, 3)
+
+    def test_reminders(self):
+        # Two medicines per prescription
+        self.assertListQueries(reverse('medicine-reminders'), self.patient, 1, per_row=2)
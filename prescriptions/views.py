@@ -14,8 +14,11 @@ from .serializers import (
     MedicineSerializer,
     MedicineReminderSerializer
 )
+from doctors.access import is_assigned_patient
 from doctors.permissions import IsDoctor
 from patients.permissions import CanCreatePrescription
+from healthcare_backend.pagination import KeysetPagination
+from healthcare_backend.prefetch import with_relations
 
 
 
@@ -34,8 +37,10 @@ def prescription_list(request):
             'error': 'Invalid user role'
         }, status=status.HTTP_403_FORBIDDEN)
     
-    serializer = PrescriptionSerializer(prescriptions, many=True)
-    return Response(serializer.data)
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(with_relations(prescriptions, PrescriptionSerializer), request)
+    serializer = PrescriptionSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['POST'])
@@ -45,19 +50,13 @@ def create_prescription(request):
     Create a new prescription with medicines (doctors only)
     """
     # Verify doctor is assigned to patient
-    from doctors.models import DoctorPatientAssignment
-    
     patient_id = request.data.get('patient')
     if not patient_id:
         return Response({
             'error': 'patient is required'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    is_assigned = DoctorPatientAssignment.objects.filter(
-        doctor=request.user,
-        patient_id=patient_id,
-        is_active=True
-    ).exists()
+    is_assigned = is_assigned_patient(request, patient_id)
     
     if not is_assigned:
         return Response({
@@ -102,12 +101,7 @@ def prescriptions_by_patient(request, patient_id):
         }, status=status.HTTP_403_FORBIDDEN)
     
     if request.user.role == 'DOCTOR':
-        from doctors.models import DoctorPatientAssignment
-        is_assigned = DoctorPatientAssignment.objects.filter(
-            doctor=request.user,
-            patient_id=patient_id,
-            is_active=True
-        ).exists()
+        is_assigned = is_assigned_patient(request, patient_id)
         
         if not is_assigned:
             return Response({
@@ -115,8 +109,10 @@ def prescriptions_by_patient(request, patient_id):
             }, status=status.HTTP_403_FORBIDDEN)
     
     prescriptions = Prescription.objects.filter(patient_id=patient_id)
-    serializer = PrescriptionSerializer(prescriptions, many=True)
-    return Response(serializer.data)
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(with_relations(prescriptions, PrescriptionSerializer), request)
+    serializer = PrescriptionSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['GET'])
@@ -135,11 +131,11 @@ def medicine_reminders(request):
     # Get prescriptions from last 30 days
     date_threshold = date.today() - timedelta(days=30)
     
-    medicines = Medicine.objects.filter(
+    medicines = with_relations(Medicine.objects.filter(
         prescription__patient=request.user,
         prescription__prescription_date__gte=date_threshold,
         reminder_enabled=True
-    ).select_related('prescription')
+    ), MedicineReminderSerializer)
     
     # Filter medicines that are still active (duration not exceeded)
     active_medicines = []